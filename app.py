@@ -3,7 +3,9 @@ import pandas as pd
 import urllib.parse
 from datetime import date, datetime
 import hashlib
-from utils.processing import load_data, process_data
+from utils.processing import refresh_aging, aging_is_stale
+import utils.incremental as pipeline
+from utils.stage_report import StageReport
 from utils.excel_export import generate_excel
 
 # --- FULLSCREEN VIEW DETECTION (ANTES de set_page_config) ---
@@ -18,6 +20,7 @@ import utils.helpers as helpers
 import utils.image_processor as img_proc
 import utils.db_manager as dbm
 import utils.state_manager as state_mgr # Persistence
+import utils.report_views as report_views # Vistas memoizadas del Reporte General
 import utils.ui.styles as styles        # Antay Design System
 import utils.ui.sidebar as ui_sidebar   # New Wizard Sidebar
 import utils.ui.report_view as ui_report # New Report Table
@@ -53,6 +56,10 @@ else:
 # --- INYECTAR ENTERPRISE CSS ---
 styles.load_css()
 
+# --- OPERADOR: las sesiones guardadas se separan por operador y ciclo (?operador=... lo fija desde la URL) ---
+if 'operator' not in st.session_state:
+    st.session_state['operator'] = query_params.get("operador") or state_mgr.DEFAULT_OPERATOR
+
 # --- FULLSCREEN VIEW RENDERING ---
 if is_fullscreen_view:
     # Vista dedicada de pantalla completa
@@ -78,10 +85,13 @@ if is_fullscreen_view:
     </style>
     """, unsafe_allow_html=True)
     
+    # Volver a la vista normal conservando el operador (la sesión nueva restaura su último ciclo)
+    home_link = "/?" + urllib.parse.urlencode({"operador": st.session_state['operator']})
+    
     # Breadcrumb con navegación
-    st.markdown("""
+    st.markdown(f"""
     <div style="margin-bottom: 10px; font-size: 14px; color: #666;">
-        <a href="/" style="color: #2E86AB; text-decoration: none;">🏠 Inicio</a> / 
+        <a href="{home_link}" style="color: #2E86AB; text-decoration: none;">🏠 Inicio</a> / 
         <span style="color: #666;">Reporte General</span> / 
         <span style="color: #333; font-weight: 500;">Pantalla Completa</span>
     </div>
@@ -93,8 +103,8 @@ if is_fullscreen_view:
         st.markdown("### 📊 Reporte General — Vista Completa (Pantalla Completa)")
     with col_h2:
         # Link para volver a vista normal (NO usar st.switch_page)
-        st.markdown("""
-        <a href="/" target="_self" style="
+        st.markdown(f"""
+        <a href="{home_link}" target="_self" style="
             display: inline-block;
             padding: 8px 16px;
             background-color: #dc3545;
@@ -112,36 +122,47 @@ if is_fullscreen_view:
     
     # Intentar cargar datos desde session state o desde persistencia
     df_final = None
+    # Filtro de empresa de la vista normal (?empresa=...&empresa=...) y ciclo abierto en ella (?ciclo=...)
+    empresas_filtro = query_params.get_all("empresa")
+    ciclo_vista = query_params.get("ciclo")
     
     # Opción 1: Datos ya en session state de esta pestaña
     if 'df_final' in st.session_state and st.session_state.get('data_ready', False):
         df_final = st.session_state['df_final']
+        if empresas_filtro:
+            df_final = df_final[df_final['EMPRESA'].astype(str).isin(empresas_filtro)]
     
     # Opción 2: Intentar cargar desde persistencia (sesión guardada)
-    elif state_mgr.has_valid_session()[0]:
+    # Con filtro de empresa solo se leen los row groups que la contienen (sin cargar df_final completo)
+    elif state_mgr.has_valid_session(cycle_id=ciclo_vista, operator=st.session_state['operator'])[0]:
         try:
-            df_loaded, meta_loaded, cache_ts_loaded = state_mgr.load_session()
+            filters = {'EMPRESA': empresas_filtro} if empresas_filtro else None
+            df_loaded, meta_loaded, cache_ts_loaded = state_mgr.query_session(
+                filters=filters, cycle_id=ciclo_vista, operator=st.session_state['operator']
+            )
             if df_loaded is not None:
                 df_final = df_loaded
-                st.session_state['df_final'] = df_loaded
-                st.session_state['data_ready'] = True
-                st.session_state['session_start_ts'] = cache_ts_loaded
+                if not empresas_filtro:
+                    st.session_state['df_final'] = df_loaded
+                    st.session_state['data_ready'] = True
+                    st.session_state['session_start_ts'] = cache_ts_loaded
+                    st.session_state['cycle_id'] = ciclo_vista or state_mgr.current_cycle(st.session_state['operator'])
         except Exception as e:
             pass  # Silenciar error, mostrar mensaje abajo
     
     # Renderizar tabla o mensaje de error
     if df_final is not None:
-        # Aplicar los mismos filtros que en la vista normal
-        # (Por simplicidad, mostrar todo; idealmente pasar filtros via query params)
-        df_filtered = df_final.copy()
+        # Filtro de empresa ya aplicado arriba (el resto de filtros de la vista normal no viaja);
+        # render_report_fullscreen no modifica el frame: no hace falta copiarlo
+        df_filtered = df_final
         
         # Renderizar tabla en modo fullscreen
         ui_report.render_report_fullscreen(df_filtered)
         
     else:
         st.warning("⚠️ No hay datos cargados. Por favor, vuelve a la vista principal y carga los archivos.")
-        st.markdown("""
-        <a href="/" target="_self" style="
+        st.markdown(f"""
+        <a href="{home_link}" target="_self" style="
             display: inline-block;
             padding: 10px 20px;
             background-color: #2E86AB;
@@ -239,17 +260,22 @@ st.markdown("""
 # Si no hay datos en session_state pero existe sesión persistida válida,
 # auto-restaurar silenciosamente para preservar continuidad al volver de fullscreen
 # IMPORTANTE: NO auto-restaurar si el usuario está en proceso de cargar nuevos archivos
+# Sesión guardada: se consulta una sola vez por rerun (la reutilizan los bloques del sidebar)
+session_probe = (state_mgr.has_valid_session(operator=st.session_state['operator'])
+                 if not st.session_state.get('data_ready', False) else (False, None, None))
 if (not st.session_state.get('data_ready', False) and 
     not st.session_state.get('loading_new_files', False)):  # FIX: No auto-restaurar si usuario está cargando archivos
-    has_session, cache_time, cache_meta = state_mgr.has_valid_session()
+    has_session, cache_time, cache_meta = session_probe
     if has_session:
         try:
-            df_loaded, meta_loaded, cache_ts_loaded = state_mgr.load_session()
+            # Último ciclo usado por este operador
+            df_loaded, meta_loaded, cache_ts_loaded = state_mgr.load_session(operator=st.session_state['operator'])
             if df_loaded is not None and not df_loaded.empty:
                 # Auto-restaurar sesión sin requerir click del usuario
                 st.session_state['df_final'] = df_loaded
                 st.session_state['data_ready'] = True
                 st.session_state['session_start_ts'] = cache_ts_loaded
+                st.session_state['cycle_id'] = state_mgr.current_cycle(st.session_state['operator'])
                 st.session_state['uploaded_files'] = meta_loaded.get('uploaded_files', [])
                 st.session_state['fresh_load'] = False
                 # Silencioso: no mostrar mensaje, solo restaurar estado
@@ -270,22 +296,46 @@ with st.sidebar:
 
     st.markdown("---")
     
+    # --- Operador y ciclos recientes: reabrir cualquier ciclo guardado sin reprocesar ---
+    st.text_input("👤 Operador", key='operator', help="Cada operador guarda y reabre sus propios ciclos de carga")
+    recent_cycles = state_mgr.list_cycles(st.session_state['operator'] or state_mgr.DEFAULT_OPERATOR)
+    if recent_cycles:
+        with st.expander(f"🗂️ Ciclos recientes ({len(recent_cycles)})"):
+            for cycle in recent_cycles[:10]:
+                is_open = st.session_state.get('data_ready', False) and cycle['cycle_id'] == st.session_state.get('cycle_id')
+                label = f"{'▶ ' if is_open else ''}{cycle['saved_at'].strftime('%d/%m %H:%M')} · {cycle['rows']:,} docs"
+                if st.button(label, key=f"reopen_{cycle['cycle_id']}", help=cycle['meta'] or cycle['cycle_id'],
+                             disabled=is_open, use_container_width=True):
+                    df_loaded, meta_loaded, cache_ts_loaded = state_mgr.load_session(
+                        cycle_id=cycle['cycle_id'], operator=st.session_state['operator']
+                    )
+                    if df_loaded is not None:
+                        st.session_state['df_final'] = df_loaded
+                        st.session_state['data_ready'] = True
+                        st.session_state['session_start_ts'] = cache_ts_loaded
+                        st.session_state['cycle_id'] = cycle['cycle_id']
+                        st.session_state['fresh_load'] = False
+                        st.rerun()
+                    else:
+                        st.error("❌ No se pudo abrir el ciclo")
+    
     # --- RC-FEAT-PERSISTENCE: Session Recovery ---
     # Mostrar opción de continuar trabajo anterior SOLO si:
     # 1. No hay datos cargados actualmente (data_ready=False)
     # 2. Existe sesión persistida válida
     # (Si ya se auto-restauró arriba, esto no se mostrará)
     if not st.session_state.get('data_ready', False):
-        has_session, cache_time, cache_meta = state_mgr.has_valid_session()
+        has_session, cache_time, cache_meta = session_probe
         if has_session:
             st.info(f"📂 Sesión previa encontrada ({cache_time.strftime('%d/%m %H:%M') if cache_time else 'N/A'})")
             if st.button("🔄 Continuar Trabajo Anterior", use_container_width=True):
                 with st.spinner("Recuperando sesión..."):
-                    df_loaded, meta_loaded, cache_ts_loaded = state_mgr.load_session()
+                    df_loaded, meta_loaded, cache_ts_loaded = state_mgr.load_session(operator=st.session_state['operator'])
                     if df_loaded is not None and not df_loaded.empty:
                         st.session_state['df_final'] = df_loaded
                         st.session_state['data_ready'] = True
                         st.session_state['session_start_ts'] = cache_ts_loaded
+                        st.session_state['cycle_id'] = state_mgr.current_cycle(st.session_state['operator'])
                         st.session_state['uploaded_files'] = meta_loaded.get('uploaded_files', [])
                         st.session_state['fresh_load'] = False
                         st.success("✅ Sesión recuperada exitosamente")
@@ -297,15 +347,16 @@ with st.sidebar:
     # --- WIZARD DE CARGA (solo si no hay datos) ---
     if not st.session_state.get('data_ready', False):
         # --- RC-FEAT-PERSISTENCE: Session Recovery ---
-        has_cache, cache_time, cache_meta = state_mgr.has_valid_session()
+        has_cache, cache_time, cache_meta = session_probe
         
         if has_cache and not st.session_state.get('data_ready', False):
             st.info(f"📂 Sesión previa encontrada: {cache_time.strftime('%d/%m %H:%M')}")
             if st.button("🔄 Continuar Trabajo Anterior", type="primary", help="Cargar datos procesados previamente sin subir archivos"):
                 try:
-                    df_loaded, meta_loaded, cache_ts_loaded = state_mgr.load_session()
+                    df_loaded, meta_loaded, cache_ts_loaded = state_mgr.load_session(operator=st.session_state['operator'])
                     if df_loaded is not None:
                         st.session_state['df_filtered'] = df_loaded
+                        st.session_state['cycle_id'] = state_mgr.current_cycle(st.session_state['operator'])
                         st.session_state['data_ready'] = True
                         st.session_state['df_final'] = df_loaded 
                         
@@ -336,8 +387,11 @@ if 'uploaded_files' not in st.session_state:
     }
 
 # --- PHASE 7: ENTERPRISE UI ---
-if 'config_fecha_corte' not in st.session_state:
+# Fecha de corte por defecto = hoy. Si el operador no la cambió y la sesión sigue abierta
+# pasada la medianoche, avanza con el día (la mora se refresca sin reprocesar).
+if st.session_state.get('config_fecha_corte') in (None, st.session_state.get('config_fecha_corte_default')):
     st.session_state['config_fecha_corte'] = date.today()
+st.session_state['config_fecha_corte_default'] = date.today()
 
 # Render Sidebar Wizard
 wizard_action = ui_sidebar.render_sidebar()
@@ -351,22 +405,38 @@ if wizard_action == "PROCESS_TRIGGERED":
     
     if file_ctas and file_cobranza and file_cartera:
         with st.spinner("🚀 Procesando Motor de Datos..."):
-            # Reuse EXACT Core Logic
-            df_ctas_raw, df_cartera_raw, df_cobranza_raw, error = load_data(file_ctas, file_cartera, file_cobranza)
+            # Reuse EXACT Core Logic (incremental: solo se recalcula lo que cambió desde la última carga)
+            stage_report = StageReport()
+            try:
+                df_final, pipeline_info = pipeline.process_files_incremental(
+                    file_ctas, file_cartera, file_cobranza,
+                    fecha_corte=st.session_state['config_fecha_corte'],
+                    report=stage_report
+                )
+                error = None
+            except Exception as e:
+                df_final, pipeline_info, error = None, None, str(e)
+            
+            # Instrumentación por etapa (también si falló: muestra hasta dónde llegó)
+            stage_report.log()
+            st.session_state['stage_report'] = {
+                # Sin medición de memoria (tracemalloc apagado: no distorsiona los tiempos)
+                'stages': stage_report.to_frame().drop(columns='peak_mb'),
+                'warnings': stage_report.warnings(),
+                'total_s': stage_report.total_seconds(),
+                'mode': pipeline_info['mode'] if pipeline_info else None,
+                'reused': pipeline_info['reused'] if pipeline_info else None,
+                'touched_keys': pipeline_info['touched_keys'] if pipeline_info else None,
+            }
             
             if error:
-                st.error(f"❌ Error de Carga: {error}")
+                st.error(f"❌ Error de Procesamiento: {error}")
                 st.session_state['data_ready'] = False
             else:
                 try:
-                    df_final = process_data(df_ctas_raw, df_cartera_raw, df_cobranza_raw)
-                    
-                    # --- CYCLE_ID: Generar ID único para este ciclo ---
-                    import uuid
+                    # --- CYCLE_ID: Generar ID único para este ciclo (también clave de la sesión guardada) ---
                     from datetime import datetime
-                    cycle_timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                    cycle_uuid = str(uuid.uuid4())[:8]
-                    cycle_id = f"{cycle_timestamp}_{cycle_uuid}"
+                    cycle_id = state_mgr.new_cycle_id()
                     
                     st.session_state['df_final'] = df_final
                     st.session_state['data_ready'] = True
@@ -381,13 +451,10 @@ if wizard_action == "PROCESS_TRIGGERED":
                     # --- LIMPIEZA TTL: Purgar bloqueos del ciclo anterior ---
                     # Limpiar DB SQLite de bloqueos TTL antiguos
                     try:
-                        import sqlite3
-                        conn = sqlite3.connect('email_ledger.db')
-                        c = conn.cursor()
+                        conn = dbm.get_connection()
                         # Eliminar registros de ledger_last_send (TTL state)
-                        c.execute("DELETE FROM ledger_last_send")
+                        conn.execute("DELETE FROM ledger_last_send")
                         conn.commit()
-                        conn.close()
                         print(f"DEBUG: TTL DB limpiada para nuevo ciclo {cycle_id}")
                     except Exception as e:
                         print(f"WARNING: No se pudo limpiar TTL DB: {e}")
@@ -395,7 +462,8 @@ if wizard_action == "PROCESS_TRIGGERED":
                     # Persistence & Session Logic
                     try:
                         meta_info = f"Archivos cargados: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-                        ok, msg = state_mgr.save_session(df_final, meta_info)
+                        ok, msg = state_mgr.save_session(df_final, meta_info, cycle_id=cycle_id,
+                                                         operator=st.session_state['operator'])
                         if ok: st.toast("💾 Sesión guardada autom.", icon="✅")
                         else: st.warning(f"⚠️ No se pudo guardar sesión: {msg}")
                     except Exception as e:
@@ -429,7 +497,22 @@ if wizard_action == "PROCESS_TRIGGERED":
 
 # --- PASO 2: VISUALIZACIÓN Y FILTROS ---
 if st.session_state['data_ready']:
+    # Aging a la fecha de corte vigente (cambio de fecha o sesión restaurada de otro día):
+    # solo recalcula DÍAS MORA / ESTADO DEUDA sobre el df_final en memoria
+    if aging_is_stale(st.session_state['df_final'], st.session_state['config_fecha_corte']):
+        st.session_state['df_final'] = refresh_aging(st.session_state['df_final'], st.session_state['config_fecha_corte'])
     df_final = st.session_state['df_final']
+
+    # Detalle de etapas del último "🚀 Procesar y Validar" (tiempos y filas)
+    stage_info = st.session_state.get('stage_report')
+    if stage_info is not None:
+        with st.expander(f"⏱️ Detalle de Procesamiento ({stage_info['total_s']:.2f} s, modo: {stage_info['mode']})", expanded=False):
+            if stage_info['mode'] not in (None, 'full'):
+                reused = ", ".join(stage_info.get('reused') or []) or "—"
+                st.caption(f"Reutilizado: {reused} | Claves recalculadas: {stage_info.get('touched_keys')}")
+            for alert in stage_info['warnings']:
+                st.warning(f"⚠️ {alert}")
+            st.dataframe(stage_info['stages'], use_container_width=True, hide_index=True)
     # RC-FIX-SCOPE: Initialize df_filtered safely to avoid NameError if df_final is empty
     df_filtered = pd.DataFrame()
     
@@ -468,7 +551,11 @@ if st.session_state['data_ready']:
             # Fila 1: Filtro Principal (Empresa) - Full Width para evitar desalineación visual
             # Esto permite que el multiselect crezca hacia abajo sin romper la fila de selectbox
             st.markdown("###### 🏢 Filtro Principal")
-            empresas = sorted(df_final['EMPRESA'].astype(str).unique().tolist())
+            # Vistas derivadas memoizadas por sesión (opciones, vista filtrada, KPIs): un rerun con los
+            # mismos filtros no vuelve a copiar ni filtrar df_final
+            view_cache = st.session_state.setdefault('view_cache', report_views.ViewCache())
+            options = view_cache.get(df_final, ('options',), lambda: report_views.filter_options(df_final))
+            empresas = options['EMPRESA']
             sel_empresa = st.multiselect(
                 "Seleccione Empresa(s)", 
                 empresas, 
@@ -481,11 +568,11 @@ if st.session_state['data_ready']:
             col_f1, col_f2, col_f3 = st.columns(3)
             
             # Filtro Estado Detraccion
-            estados_dt = ["Todos"] + sorted(df_final['ESTADO DETRACCION'].astype(str).unique().tolist())
+            estados_dt = ["Todos"] + options['ESTADO DETRACCION']
             sel_estado = col_f1.selectbox("Estado Detracción", estados_dt)
             
             # Filtro Moneda
-            monedas = ["Todos"] + sorted(df_final['MONEDA'].astype(str).unique().tolist())
+            monedas = ["Todos"] + options['MONEDA']
             sel_moneda = col_f2.selectbox("Moneda", monedas)
             
             # Buscador Global
@@ -496,30 +583,6 @@ if st.session_state['data_ready']:
             filter_has_email = col_b1.checkbox("☑️ Solo con Correo", value=False)
             filter_has_phone = col_b2.checkbox("☑️ Solo con Teléfono", value=False)
             
-            # Aplicar filtros
-            df_filtered = df_final.copy()
-            
-            if sel_empresa:
-                df_filtered = df_filtered[df_filtered['EMPRESA'].astype(str).isin(sel_empresa)]
-
-            if sel_estado != "Todos":
-                df_filtered = df_filtered[df_filtered['ESTADO DETRACCION'].astype(str) == sel_estado]
-            if sel_moneda != "Todos":
-                df_filtered = df_filtered[df_filtered['MONEDA'].astype(str) == sel_moneda]
-                
-            if search_term:
-                mask = df_filtered.astype(str).apply(lambda x: x.str.contains(search_term, case=False, na=False)).any(axis=1)
-                df_filtered = df_filtered[mask]
-            
-            # --- RC-FEAT-FILTERS: Email/Phone Availability ---
-            if filter_has_email:
-                # Filtrar donde CORREO no sea nulo ni vacio y no sea 'SIN DATOS'
-                df_filtered = df_filtered[df_filtered['CORREO'].notna() & (df_filtered['CORREO'].str.strip() != '')]
-                
-            if filter_has_phone:
-                # Filtrar donde TELEFONO no sea nulo ni vacio
-                 df_filtered = df_filtered[df_filtered['TELÉFONO'].notna() & (df_filtered['TELÉFONO'].astype(str).str.strip() != '')]
-            
             # --- FILTROS AVANZADOS (Tipo Pedido & Saldo & Enviar Email) ---
             with st.expander("⚙️ Filtros Avanzados (Tipo Pedido, Saldo Real & Enviar Email)", expanded=False):
                 # Layout interno del expander
@@ -527,7 +590,7 @@ if st.session_state['data_ready']:
                 
                 with c_adv1:
                     # Filtro TIPO PEDIDO
-                    tipos_pedido = sorted(df_final['TIPO PEDIDO'].astype(str).unique().tolist())
+                    tipos_pedido = options['TIPO PEDIDO']
                     default_tipos = [t for t in tipos_pedido if t not in ['PAV', 'DSP']]
                     sel_tipo_pedido = st.multiselect("Tipo Pedido", tipos_pedido, default=default_tipos)
                 
@@ -541,8 +604,8 @@ if st.session_state['data_ready']:
                     monto_ref = st.number_input("Monto Referencia", value=0.0, step=10.0)
                 
                 # Filtro ENVIAR EMAIL (nueva fila)
-                if 'Enviar Email' in df_final.columns:
-                    valores_enviar = sorted(df_final['Enviar Email'].astype(str).unique().tolist())
+                if 'Enviar Email' in options:
+                    valores_enviar = options['Enviar Email']
                     # Por defecto: excluir "NO" y "SIN CONFIGURAR"
                     default_enviar = [v for v in valores_enviar if v.upper() not in ['NO', 'SIN CONFIGURAR']]
                     sel_enviar_email = st.multiselect(
@@ -553,49 +616,30 @@ if st.session_state['data_ready']:
                     )
                 else:
                     sel_enviar_email = None
-                
-                # Aplicar Filtros Avanzados
-                if sel_tipo_pedido:
-                    df_filtered = df_filtered[df_filtered['TIPO PEDIDO'].astype(str).isin(sel_tipo_pedido)]
-                
-                # Aplicar filtro Saldo Real (con redondeo a 2 decimales para consistencia con Excel)
-                if opcion_saldo == "Mayor que":
-                    df_filtered = df_filtered[df_filtered['SALDO REAL'].round(2) > monto_ref]
-                elif opcion_saldo == "Mayor o igual que":
-                    df_filtered = df_filtered[df_filtered['SALDO REAL'].round(2) >= monto_ref]
-                elif opcion_saldo == "Menor que":
-                    df_filtered = df_filtered[df_filtered['SALDO REAL'].round(2) < monto_ref]
-                elif opcion_saldo == "Menor o igual que":
-                    df_filtered = df_filtered[df_filtered['SALDO REAL'].round(2) <= monto_ref]
-                elif opcion_saldo == "Igual a":
-                    df_filtered = df_filtered[df_filtered['SALDO REAL'].round(2) == monto_ref]
-                
-                # Aplicar filtro Enviar Email
-                if sel_enviar_email and 'Enviar Email' in df_filtered.columns:
-                    df_filtered = df_filtered[df_filtered['Enviar Email'].astype(str).isin(sel_enviar_email)]
-            
-            # --- KPI DASHBOARD (Separación de Monedas & Conteo) ---
-            # Calcular totales separados
-            def safe_sum(df, col): return df[col].sum() if col in df.columns else 0.0
             
-            # FIX v4.3.1: Usar startswith para evitar que 'US$' (contiene S) caiga en Soles
-            df_sol = df_filtered[df_filtered['MONEDA'].astype(str).str.startswith('S', na=False)]
-            # Para Dolares asumimos el resto o que contiene U/$.
-            df_dol = df_filtered[~df_filtered['MONEDA'].astype(str).str.startswith('S', na=False)]
+            # Aplicar filtros (vista y KPIs memoizados por estado de filtros)
+            report_filters = {
+                'empresas': sel_empresa,
+                'estado': sel_estado,
+                'moneda': sel_moneda,
+                'search': search_term,
+                'has_email': filter_has_email,
+                'has_phone': filter_has_phone,
+                'tipos_pedido': sel_tipo_pedido,
+                'saldo_op': opcion_saldo,
+                'saldo_ref': monto_ref,
+                'enviar_email': sel_enviar_email,
+            }
+            filter_key = report_views.filters_key(report_filters)
+            df_filtered = view_cache.get(df_final, ('filtered', filter_key),
+                                         lambda: report_views.apply_filters(df_final, report_filters))
             
-            # Totales Soles
-            t_sal_s = safe_sum(df_sol, 'SALDO')
+            # --- KPI DASHBOARD (Separación de Monedas & Conteo) ---
+            kpis = view_cache.get(df_final, ('kpis', filter_key), lambda: report_views.kpi_totals(df_filtered))
+            t_sal_s, t_real_s, count_s = kpis['t_sal_s'], kpis['t_real_s'], kpis['count_s']
+            t_sal_d, t_real_d, count_d = kpis['t_sal_d'], kpis['t_real_d'], kpis['count_d']
             # REGLA DE NEGOCIO: Detracciones SIEMPRE suman en Soles, sin importar moneda del doc.
-            # Agrupamos todas las detracciones del filtro actual.
-            t_detru_global_s = safe_sum(df_filtered, 'DETRACCIÓN') 
-            t_real_s = safe_sum(df_sol, 'SALDO REAL')
-            count_s = len(df_sol)
-            
-            # Totales Dólares
-            t_sal_d = safe_sum(df_dol, 'SALDO')
-            # t_det_d = safe_sum(df_dol, 'DETRACCIÓN') # Eliminado: Detracción NO existe en Dólares
-            t_real_d = safe_sum(df_dol, 'SALDO REAL')
-            count_d = len(df_dol)
+            t_detru_global_s = kpis['t_detru_global_s']
             
             # Renderizar KPIs Custom
             kpi1, kpi2, kpi3, kpi4 = st.columns(4)
@@ -697,16 +741,27 @@ if st.session_state['data_ready']:
                         if not email: return ""
                         st_info = status_map.get(email, {})
                         if field == 'ts':
-                            return st_info.get('ts_raw', '')
+                            # Hora local (mismo formato que escribe el envío en FECHA_ULTIMO_ENVIO)
+                            return st_info.get('ts_local', '')
                         if field == 'st_text':
                             return st_info.get('status', 'PENDIENTE')
                         return ""
 
                     # Update the SSOT (df_final) tracking columns from database
+                    # (solo si cambiaron: reescribirlas invalida las vistas memoizadas)
+                    tracking_changed = False
                     if 'ESTADO_EMAIL' in df_final.columns:
-                        df_final['ESTADO_EMAIL'] = df_final['CORREO'].apply(get_email_status_icon)
+                        new_estado = df_final['CORREO'].apply(get_email_status_icon)
+                        if not new_estado.equals(df_final['ESTADO_EMAIL']):
+                            df_final['ESTADO_EMAIL'] = new_estado
+                            tracking_changed = True
                     if 'FECHA_ULTIMO_ENVIO' in df_final.columns:
-                        df_final['FECHA_ULTIMO_ENVIO'] = df_final['CORREO'].apply(lambda x: get_rich_status(x, 'ts'))
+                        new_fecha = df_final['CORREO'].apply(lambda x: get_rich_status(x, 'ts'))
+                        if not new_fecha.equals(df_final['FECHA_ULTIMO_ENVIO']):
+                            df_final['FECHA_ULTIMO_ENVIO'] = new_fecha
+                            tracking_changed = True
+                    if tracking_changed:
+                        view_cache.invalidate()
                     
                     # Update session state with the updated SSOT
                     st.session_state['df_final'] = df_final
@@ -728,11 +783,11 @@ if st.session_state['data_ready']:
                 'FECH EMIS', 'FECH VENC',
                 'DÍAS MORA', 'ESTADO DEUDA', # Critical Analysis
                 'MONEDA', 'TIPO CAMBIO',
-                'MONT EMIT_DISPLAY', 
-                'DETRACCIÓN_DISPLAY', 'ESTADO DETRACCION',
+                'MONT EMIT', 
+                'DETRACCIÓN', 'ESTADO DETRACCION',
                 'AMORTIZACIONES',
-                'SALDO_DISPLAY', 
-                'SALDO REAL_DISPLAY', # Key Result (Moved here)
+                'SALDO', 
+                'SALDO REAL', # Key Result (Moved here)
                 'MATCH_KEY'
             ]
             
@@ -741,7 +796,7 @@ if st.session_state['data_ready']:
             
             # --- RC-UX-PREMIUM: ENTERPRISE REPORT TABLE ---
             # Delegamos visualización a ui_report (Maneja Toggles y Estilos)
-            ui_report.render_report(df_filtered)
+            ui_report.render_report(df_filtered, empresas=sel_empresa)
             
             # --- DEBUG TOGGLE (QA Only) ---
             with st.expander("🔧 Debug: Tracking Stats (QA)", expanded=False):
@@ -945,24 +1000,8 @@ if st.session_state['data_ready']:
                         empresa = docs_cli['EMPRESA'].iloc[0]
                         telefono = docs_cli['TELÉFONO'].iloc[0]
 
-                        # 1. Totales por Moneda
-                        currency_stats = docs_cli.groupby('MONEDA')['SALDO REAL'].agg(['count', 'sum'])
-                        
-                        total_parts = []
-                        
-                        for curr, stats in currency_stats.iterrows():
-                            count = int(stats['count'])
-                            amount = stats['sum']
-                            symbol = "S/" if str(curr).upper().startswith("S") else "$"
-                            
-                            # Formato solicitado: S/ 138.08 (03 documentos)
-                            total_parts.append(f"{symbol} {amount:,.2f} ({count:02d} documentos)")
-                        
-                        # Unir con " y "
-                        if total_parts:
-                            total_real_str = " y ".join(total_parts)
-                        else:
-                            total_real_str = "0.00"
+                        # 1. Totales por Moneda (formato: S/ 138.08 (03 documentos) y ...)
+                        total_real_str = report_views.currency_totals_text(docs_cli)
                         
                         total_orig_val = docs_cli['SALDO'].sum()
 
@@ -1794,7 +1833,7 @@ if st.session_state['data_ready']:
                             # Enviar Batch con Logo
                             with st.spinner(f"Enviando con Business Lock (Fecha: {fecha_corte})..."):
                                 # Obtener cycle_id del session_state
-                                current_cycle_id = st.session_state.get('cycle_id', 'default_cycle')
+                                current_cycle_id = st.session_state.get('cycle_id') or state_mgr.DEFAULT_CYCLE
                                 
                                 results = es.send_email_batch(
                                     smtp_cfg, 
@@ -1816,6 +1855,7 @@ if st.session_state['data_ready']:
                                  if 'details' in results and results['details']:
                                      now_timestamp = datetime.now()
                                      updated_match_keys = []
+                                     tracking_updates = []
                                      
                                      # Crear mapeo de msg_id -> mensaje para lookup rápido
                                      msg_lookup = {m.get('msg_id'): m for m in messages_to_send if m.get('msg_id')}
@@ -1849,6 +1889,23 @@ if st.session_state['data_ready']:
                                                         if 'ESTADO_ENVIO_TEXTO' in st.session_state['df_final'].columns:
                                                             st.session_state['df_final'].loc[mask, 'ESTADO_ENVIO_TEXTO'] = f"ENVIADO ({now_timestamp.strftime('%H:%M')})"
                                                         updated_match_keys.append(mk)
+                                                        tracking_updates.append({
+                                                            'MATCH_KEY': mk,
+                                                            'COD CLIENTE': cod_cliente_msg,
+                                                            'ESTADO_EMAIL': "ENVIADO",
+                                                            'FECHA_ULTIMO_ENVIO': now_timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                                                        })
+                                     
+                                     # Persistir el tracking en el log append-only de la sesión (sin reescribir el snapshot)
+                                     try:
+                                         state_mgr.append_tracking(tracking_updates, cycle_id=current_cycle_id,
+                                                                   operator=st.session_state['operator'])
+                                     except Exception as e:
+                                         print(f"WARNING: No se pudo registrar tracking en la sesión: {e}")
+                                     
+                                     # df_final cambió en el lugar: las vistas memoizadas ya no valen
+                                     if 'view_cache' in st.session_state:
+                                         st.session_state['view_cache'].invalidate()
                                      
                                      # Recalcular df_filtered desde df_final actualizado
                                      # (Aplicar los mismos filtros que están actualmente activos)
@@ -2189,6 +2246,15 @@ if st.session_state['data_ready']:
                                     reset_details.append("FECHA_ULTIMO_ENVIO: limpiado")
                                 
                                 st.session_state['df_final'] = df
+                                if 'view_cache' in st.session_state:
+                                    st.session_state['view_cache'].invalidate()  # df_final cambió en el lugar
+                                
+                                # Nueva generación de la sesión: el reinicio no debe revertirse al restaurar
+                                ok, msg = state_mgr.save_session(df, f"Ciclo reiniciado: {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+                                                                 cycle_id=st.session_state.get('cycle_id'),
+                                                                 operator=st.session_state['operator'])
+                                if not ok:
+                                    st.warning(f"⚠️ No se pudo guardar sesión: {msg}")
                             
                             # Store reset details for display after rerun
                             st.session_state['reset_complete'] = True
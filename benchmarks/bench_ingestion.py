@@ -0,0 +1,78 @@
+"""
+Benchmark: ingesta de los 3 Excel (ruta actual vs lectura podada / paralela / motor rápido).
+Genera libros sintéticos "anchos" (las columnas del pipeline + relleno hasta --width columnas,
+como los exportes del ERP) y mide:
+  - legacy: pd.read_excel de cada archivo completo, en secuencia
+  - podado: solo columnas mapeadas con dtype explícito (secuencial / paralelo, por motor)
+
+Uso:
+    python benchmarks/bench_ingestion.py --rows 50000 --width 60
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import utils.processing as proc
+from benchmarks.bench_parallel import make_inputs
+
+KINDS = ('ctas', 'cartera', 'cobranza')
+
+
+def write_workbooks(num_docs, width, folder):
+    """Escribe los 3 xlsx sintéticos con columnas de relleno hasta `width`."""
+    rng = np.random.default_rng(0)
+    paths = {}
+    for kind, df in zip(KINDS, make_inputs(num_docs)):
+        for i in range(max(width - df.shape[1], 0)):
+            df[f"erp_{i:02d}"] = rng.integers(0, 1000, len(df)) if i % 2 else f"valor_{i}"
+        paths[kind] = os.path.join(folder, f"{kind}.xlsx")
+        df.to_excel(paths[kind], index=False)
+    return paths
+
+
+def _timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--width', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    engines = ['openpyxl'] + (['calamine'] if proc.importlib.util.find_spec("python_calamine") else [])
+
+    with tempfile.TemporaryDirectory() as folder:
+        print(f"Escribiendo libros sintéticos: {args.rows:,} documentos x {args.width} columnas...")
+        paths = write_workbooks(args.rows, args.width, folder)
+        sizes = sum(os.path.getsize(p) for p in paths.values()) / 1e6
+        print(f"Tamaño total: {sizes:.1f} MB | núcleos: {os.cpu_count()}")
+
+        base = _timed(lambda: [pd.read_excel(paths[k]) for k in KINDS], args.repeat)
+        print(f"{'modo':<34}{'tiempo (s)':>12}{'speedup':>10}")
+        print(f"{'legacy (completo, secuencial)':<34}{base:>12.2f}{1.0:>10.2f}")
+
+        for engine in engines:
+            proc.EXCEL_ENGINE = engine
+            for parallel in (False, True):
+                label = f"podado {engine} {'paralelo' if parallel else 'secuencial'}"
+                elapsed = _timed(lambda: proc.read_input_files(paths, parallel=parallel), args.repeat)
+                print(f"{label:<34}{elapsed:>12.2f}{base / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
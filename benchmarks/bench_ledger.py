@@ -0,0 +1,151 @@
+"""
+Benchmark: consultas de estado del ledger (get_status_map) con lectores concurrentes y un escritor.
+Simula la app durante un envío masivo: varias sesiones de Streamlit consultan el estado de sus
+clientes en cada rerun mientras send_email_batch registra intentos.
+  - legacy: conexión nueva por consulta, journal DELETE, SQL armado por cantidad de correos, sin índices
+  - pool:   conexión reutilizada por hilo (db_manager.get_connection), WAL + synchronous=NORMAL,
+            esquema migrado a la última versión (rango sobre el índice recipient + instante epoch).
+            Los hilos del benchmark viven toda la corrida (como un envío masivo); en la app cada rerun
+            corre en un hilo nuevo y abre su conexión, así que la reutilización es menor.
+El historial se reparte en --days días (como el ledger tras semanas de uso); cada consulta pide el día de hoy.
+
+Uso:
+    python benchmarks/bench_ledger.py --readers 4 --seconds 5 --attempts 50000 --batch 200 --days 30
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, time as dtime, timedelta, timezone
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import utils.db_manager as dbm
+
+
+def _utc_text(moment):
+    """Texto del ledger: UTC sin zona, como lo escribe send_email_batch."""
+    return str(moment.astimezone(timezone.utc).replace(tzinfo=None))
+
+
+def make_ledger(path, num_attempts, num_emails, journal_mode, days=1, schema_version=None, seed=0):
+    """
+    Ledger sintético: intentos repartidos entre num_emails destinatarios y los últimos `days` días
+    (de 8:00 a 18:00 hora local).
+    schema_version: migración hasta la que se crea el esquema (1 = tablas sin índices, como antes).
+    """
+    rng = random.Random(seed)
+    first_day = datetime.combine(date.today() - timedelta(days=days - 1), dtime(8)).astimezone()
+    per_day = -(-num_attempts // days)
+    step = timedelta(hours=10) / per_day
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    dbm.migrate_ledger(conn, target_version=schema_version)
+    rows = [
+        (f"att{i}", f"key{i}", f"cliente{rng.randrange(num_emails)}@empresa.pe",
+         rng.choice(['SENT', 'SENT', 'FAILED', 'BLOCKED']), "",
+         _utc_text(first_day + timedelta(days=i // per_day) + (i % per_day) * step), "bench")
+        for i in range(num_attempts)
+    ]
+    conn.executemany("INSERT INTO send_attempts VALUES(?,?,?,?,?,?,?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def legacy_status_map(path, email_list, target_date_str):
+    """Consulta como antes del pool: conexión por llamada + IN dinámico + read_sql_query + iterrows."""
+    conn = sqlite3.connect(path)
+    query = f"""
+        SELECT recipient, status, timestamp FROM send_attempts
+        WHERE recipient IN ({','.join(['?'] * len(email_list))}) AND timestamp LIKE ?
+        ORDER BY timestamp ASC
+    """
+    df = pd.read_sql_query(query, conn, params=email_list + [f"{target_date_str}%"])
+    conn.close()
+    priority_map = {'SENT': 3, 'BLOCKED': 2, 'FAILED': 1, 'PENDING': 0}
+    status_map = {}
+    for _, row in df.iterrows():
+        current = status_map.get(row['recipient'], {'status': 'PENDING'})
+        if priority_map.get(row['status'], 0) >= priority_map.get(current['status'], 0):
+            status_map[row['recipient']] = {'status': row['status'], 'ts_raw': row['timestamp']}
+    return status_map
+
+
+def run(lookup, connect_writer, readers, seconds, num_emails, batch):
+    """Lectores en bucle durante `seconds` + un escritor que registra un intento cada ~5 ms."""
+    today = datetime.now().strftime("%Y-%m-%d")
+    stop = threading.Event()
+    counts, errors, writes = [0] * readers, [0] * readers, [0]
+
+    def reader(i):
+        rng = random.Random(i)
+        while not stop.is_set():
+            emails = [f"cliente{rng.randrange(num_emails)}@empresa.pe" for _ in range(batch)]
+            try:
+                lookup(emails, today)
+                counts[i] += 1
+            except sqlite3.Error:
+                errors[i] += 1
+
+    def writer():
+        conn = connect_writer()
+        n = 0
+        while not stop.is_set():
+            n += 1
+            conn.execute("INSERT INTO send_attempts VALUES(?,?,?,?,?,?,?)",
+                         (f"w{n}-{time.time_ns()}", "k", f"cliente{n % num_emails}@empresa.pe", "SENT", "",
+                          _utc_text(datetime.now(timezone.utc)), "bench"))
+            conn.commit()
+            writes[0] += 1
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)] + [threading.Thread(target=writer)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    return sum(counts) / seconds, sum(errors), writes[0] / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--attempts', type=int, default=50_000)
+    parser.add_argument('--emails', type=int, default=5_000)
+    parser.add_argument('--batch', type=int, default=200, help="Correos por consulta (clientes de la vista filtrada)")
+    parser.add_argument('--days', type=int, default=30, help="Días de historial en el ledger")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        legacy_path = os.path.join(folder, "legacy.db")
+        make_ledger(legacy_path, args.attempts, args.emails, "DELETE", days=args.days, schema_version=1)
+        legacy = run(lambda emails, day: legacy_status_map(legacy_path, emails, day),
+                     lambda: sqlite3.connect(legacy_path, check_same_thread=False),
+                     args.readers, args.seconds, args.emails, args.batch)
+
+        dbm.DB_NAME = os.path.join(folder, "pool.db")
+        make_ledger(dbm.DB_NAME, args.attempts, args.emails, "WAL", days=args.days)
+        pooled = run(lambda emails, day: dbm.get_status_map(emails, target_date_str=day),
+                     dbm.get_connection,
+                     args.readers, args.seconds, args.emails, args.batch)
+
+    print(f"{args.readers} lectores + 1 escritor | {args.attempts:,} intentos en {args.days} días | "
+          f"{args.batch} correos por consulta")
+    print(f"{'modo':<10}{'consultas/s':>14}{'errores':>10}{'escrituras/s':>15}")
+    for label, (qps, errors, wps) in (("legacy", legacy), ("pool", pooled)):
+        print(f"{label:<10}{qps:>14.1f}{errors:>10}{wps:>15.1f}")
+    print(f"speedup consultas: {pooled[0] / legacy[0]:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
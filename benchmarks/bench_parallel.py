@@ -0,0 +1,104 @@
+"""
+Benchmark: process_data vs process_data_parallel según cantidad de núcleos.
+Genera entradas sintéticas (por defecto 1M documentos) con la forma de los Excel del ERP.
+
+Uso:
+    python benchmarks/bench_parallel.py --rows 1000000 --workers 1 2 4 8 16
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.processing import process_data
+from utils.parallel import process_data_parallel
+
+
+def make_inputs(num_docs, num_clients=None, seed=42):
+    """CtasxCobrar, Cartera y Cobranza sintéticos (vectorizado, apto para millones de filas)."""
+    rng = np.random.default_rng(seed)
+    num_clients = num_clients or max(num_docs // 25, 1)
+    idx = np.arange(num_docs)
+    codcli = rng.integers(1, num_clients + 1, num_docs)
+    es_usd = idx % 3 == 0
+    sersun = np.array(["F001", "F002", "E001"])[idx % 3]
+    numsun = 1_000_000 + idx
+    hoy = pd.Timestamp.today().normalize()
+
+    df_ctas = pd.DataFrame({
+        'codcli': codcli,
+        'nomcli': pd.Series(codcli).map(lambda c: f"Empresa {c}"),
+        'coddoc': "01",
+        'sersun': sersun,
+        'numsun': numsun,
+        'fecdoc': hoy - pd.to_timedelta(rng.integers(0, 365, num_docs), unit='D'),
+        'fecvct': hoy + pd.to_timedelta(rng.integers(-90, 30, num_docs), unit='D'),
+        'codmnd': np.where(es_usd, "US$", "S/"),
+        'tipcam': np.where(es_usd, 3.75, 1.0),
+        'mododo': rng.uniform(100, 20_000, num_docs).round(2),
+        'mondoc': rng.uniform(100, 20_000, num_docs).round(2),
+        'sldacl': rng.uniform(0, 20_000, num_docs).round(2),
+        'tipped': np.where(idx % 6 == 0, "PAV", "VEN"),
+    })
+
+    clientes = np.arange(1, num_clients + 1)
+    df_cartera = pd.DataFrame({
+        'codigo_cliente': clientes,
+        'telefono': 900_000_000 + clientes,
+        'email': [f"cliente{c}@mail.com" for c in clientes],
+        'nota': "",
+        'Enviar Email': np.where(clientes % 5 == 0, "NO", "SI"),
+    })
+
+    pagados = idx[idx % 2 == 0]
+    df_cobranza = pd.DataFrame({
+        'coddoc': "01",
+        'numsun': pd.Series(sersun[pagados]) + pd.Series(numsun[pagados]).astype(str).str.zfill(8),
+        'forpag': np.where(pagados % 4 == 0, "DT", "TR"),
+        'monpag': rng.uniform(50, 900, len(pagados)).round(2),
+        'mondoc': rng.uniform(100, 5_000, len(pagados)).round(2),
+        'fecpro': hoy - pd.to_timedelta(rng.integers(0, 60, len(pagados)), unit='D'),
+        'nombco': "BCP",
+        'codbco': "002",
+        'nudopa': pd.Series(pagados).map(lambda i: f"OP{i:07d}"),
+    })
+    return df_ctas, df_cartera, df_cobranza
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--workers', type=int, nargs='+', default=None)
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    workers_list = args.workers or sorted({w for w in (1, 2, 4, 8, 16, cpus) if w <= cpus})
+
+    print(f"Generando {args.rows:,} documentos sintéticos ({cpus} núcleos disponibles)...")
+    df_ctas, df_cartera, df_cobranza = make_inputs(args.rows)
+
+    base, expected = _timed(lambda: process_data(df_ctas.copy(), df_cartera.copy(), df_cobranza.copy()))
+    print(f"{'modo':<22}{'tiempo (s)':>12}{'speedup':>10}")
+    print(f"{'process_data':<22}{base:>12.2f}{1.0:>10.2f}")
+
+    for workers in workers_list:
+        elapsed, result = _timed(lambda: process_data_parallel(
+            df_ctas, df_cartera, df_cobranza, workers=workers, min_rows=0))
+        assert len(result) == len(expected)
+        print(f"{f'parallel x{workers}':<22}{elapsed:>12.2f}{base / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
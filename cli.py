@@ -0,0 +1,138 @@
+"""
+Procesamiento por Lotes sin Streamlit (CLI)
+Procesa CtasxCobrar, Cartera y Cobranza y deja el resultado listo antes del horario de oficina:
+- df_final en Parquet y/o Excel
+- la sesión guardada en .cache como un ciclo nuevo del operador (la app la abre con
+  "🔄 Continuar Trabajo Anterior" o desde "Ciclos recientes")
+- opcionalmente, el cuerpo HTML del correo de cada cliente
+
+Uso (p. ej. desde cron a las 6:00):
+    python cli.py --ctas CtasxCobrar.xlsx --cartera Cartera.xlsx --cobranza Cobranza.xlsx \\
+        --output salida/df_final.parquet --output salida/reporte.xlsx --emails salida/correos
+
+Códigos de salida: 0 = OK, 1 = error de procesamiento, 2 = archivos de entrada inválidos.
+"""
+
+import argparse
+import logging
+import os
+import sys
+from datetime import date, datetime
+
+import pandas as pd
+
+import utils.incremental as pipeline
+import utils.settings_manager as sm
+import utils.state_manager as state_mgr
+from utils.excel_export import generate_excel
+from utils.helpers import sanitize_filename
+from utils.processing import preflight_check
+from utils.stage_report import StageReport
+
+
+def write_output(df_final, path):
+    """Escribe df_final según la extensión: .parquet o .xlsx (mismo formato que la exportación de la app)."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if path.lower().endswith('.parquet'):
+        df_final.to_parquet(path, index=False)
+    elif path.lower().endswith('.xlsx'):
+        with open(path, 'wb') as f:
+            f.write(generate_excel(df_final))
+    else:
+        raise ValueError(f"Formato de salida no soportado: {path} (usar .parquet o .xlsx)")
+
+
+def render_email_bodies(df_final, output_dir, config):
+    """
+    Pre-genera el HTML del correo de cada cliente (mismos totales por moneda que el envío de la app).
+    Escribe <COD CLIENTE>.html por cliente y un index.csv (cliente, empresa, correo, archivo).
+    """
+    import utils.email_sender as es
+
+    os.makedirs(output_dir, exist_ok=True)
+    index = []
+    for cod_cli, d_cli in df_final.groupby('COD CLIENTE', observed=True, sort=False):
+        empresa = d_cli['EMPRESA'].iloc[0]
+        mask_soles = d_cli['MONEDA'].astype(str).str.strip().str.upper().str.startswith('S', na=False)
+        t_s = d_cli[mask_soles]['SALDO REAL'].sum()
+        t_d = d_cli[~mask_soles]['SALDO REAL'].sum()
+        str_s = f"S/ {t_s:,.2f}" if t_s > 0 else ""
+        str_d = f"$ {t_d:,.2f}" if t_d > 0 else ""
+
+        body = es.generate_premium_email_body_cid(empresa, d_cli, str_s, str_d, config)
+        filename = f"{sanitize_filename(str(cod_cli), 'cliente')}.html"
+        with open(os.path.join(output_dir, filename), 'w', encoding='utf-8') as f:
+            f.write(body)
+        index.append({'COD CLIENTE': cod_cli, 'EMPRESA': empresa, 'CORREO': d_cli['CORREO'].iloc[0], 'ARCHIVO': filename})
+
+    pd.DataFrame(index, columns=['COD CLIENTE', 'EMPRESA', 'CORREO', 'ARCHIVO']).to_csv(
+        os.path.join(output_dir, 'index.csv'), index=False, encoding='utf-8'
+    )
+    return len(index)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ctas", required=True, help="Archivo CtasxCobrar (xlsx, csv o parquet)")
+    parser.add_argument("--cartera", required=True, help="Archivo Cartera")
+    parser.add_argument("--cobranza", required=True, help="Archivo Cobranza")
+    parser.add_argument("--fecha-corte", type=date.fromisoformat, default=None,
+                        help="Fecha de corte AAAA-MM-DD para la mora (por defecto, hoy)")
+    parser.add_argument("--output", action="append", default=[],
+                        help="Salida de df_final (.parquet o .xlsx); se puede repetir")
+    parser.add_argument("--emails", default=None, help="Directorio donde pre-generar los correos HTML por cliente")
+    parser.add_argument("--no-session", action="store_true", help="No guardar la sesión para la app")
+    parser.add_argument("--operador", default=state_mgr.DEFAULT_OPERATOR,
+                        help="Operador dueño de la sesión guardada (el mismo que se indica en la app)")
+    parser.add_argument("--perfil-memoria", action="store_true",
+                        help="Medir el pico de memoria por etapa (tracemalloc; el procesamiento es ~3x más lento)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    files = {'ctas': args.ctas, 'cartera': args.cartera, 'cobranza': args.cobranza}
+    problems = preflight_check(files)
+    if problems:
+        for problem in problems:
+            print(f"ERROR: {problem}", file=sys.stderr)
+        return 2
+
+    fecha_corte = args.fecha_corte or date.today()
+    report = StageReport(track_memory=args.perfil_memoria)
+    try:
+        df_final, info = pipeline.process_files_incremental(
+            args.ctas, args.cartera, args.cobranza, fecha_corte=fecha_corte, report=report
+        )
+    except Exception as e:
+        report.log()
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 1
+
+    print(report.to_frame().to_string(index=False))
+    for alert in report.warnings():
+        print(f"AVISO: {alert}")
+    print(f"Modo: {info['mode']} | Documentos: {len(df_final):,} | Total: {report.total_seconds():.2f}s")
+
+    for path in args.output:
+        write_output(df_final, path)
+        print(f"Escrito: {path}")
+
+    if args.emails:
+        n = render_email_bodies(df_final, args.emails, sm.load_settings())
+        print(f"Correos generados: {n} en {args.emails}")
+
+    if not args.no_session:
+        meta_info = f"Archivos cargados: {datetime.now().strftime('%Y-%m-%d %H:%M')} (CLI, corte {fecha_corte})"
+        cycle_id = state_mgr.new_cycle_id()
+        ok, msg = state_mgr.save_session(df_final, meta_info, cycle_id=cycle_id, operator=args.operador)
+        print(f"{msg} (ciclo {cycle_id}, operador {args.operador})")
+        if not ok:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -33,7 +33,7 @@ class TestEmailIdempotency(unittest.TestCase):
     # we patch smtplib.SMTP globally or we ensure we patch what it uses.
     # The safest is patching 'smtplib.SMTP' if we can.
     @patch('smtplib.SMTP')
-    @patch('utils.email_sender.sqlite3')
+    @patch('utils.email_sender.dbm.get_connection')
     def test_send_success_fresh(self, mock_sqlite, mock_smtp_cls):
         """Test sending a fresh email works and updates ledger."""
         
@@ -44,7 +44,7 @@ class TestEmailIdempotency(unittest.TestCase):
         # Setup Mock DB
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_sqlite.connect.return_value = mock_conn
+        mock_sqlite.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         
         # Check Ledger -> Returns None (Not found)
@@ -66,19 +66,19 @@ class TestEmailIdempotency(unittest.TestCase):
 
 
     @patch('smtplib.SMTP')
-    @patch('utils.email_sender.sqlite3')
+    @patch('utils.email_sender.dbm.get_connection')
     def test_block_ttl(self, mock_sqlite, mock_smtp_cls):
         """Test immediate resend is blocked by TTL."""
         
-        from datetime import datetime
+        import time
         
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_sqlite.connect.return_value = mock_conn
+        mock_sqlite.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         
-        # Ledger returns a RECENT timestamp (1 min ago)
-        recent_ts = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+        # Ledger returns a RECENT send (epoch ms, just now)
+        recent_ts = int(time.time() * 1000)  # last_sent_epoch_ms
         mock_cursor.fetchone.return_value = (recent_ts,)
         
         stats = send_email_batch(self.smtp_config, self.messages)
@@ -95,22 +95,22 @@ class TestEmailIdempotency(unittest.TestCase):
 
 
     @patch('smtplib.SMTP')
-    @patch('utils.email_sender.sqlite3')
+    @patch('utils.email_sender.dbm.get_connection')
     def test_force_resend(self, mock_sqlite, mock_smtp_cls):
         """Test force_resend bypasses TTL."""
         
-        from datetime import datetime
+        import time
         
         mock_server_instance = MagicMock()
         mock_smtp_cls.return_value = mock_server_instance
         
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_sqlite.connect.return_value = mock_conn
+        mock_sqlite.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         
         # Ledger returns a RECENT timestamp
-        recent_ts = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+        recent_ts = int(time.time() * 1000)  # last_sent_epoch_ms
         mock_cursor.fetchone.return_value = (recent_ts,)
         
         # Force Resend = True
@@ -122,7 +122,7 @@ class TestEmailIdempotency(unittest.TestCase):
 
 
     @patch('smtplib.SMTP')
-    @patch('utils.email_sender.sqlite3')
+    @patch('utils.email_sender.dbm.get_connection')
     def test_multi_client_same_email(self, mock_sqlite, mock_smtp_cls):
         """Test RC-BUG-016: Multiple clients with same email should trigger distinct sends."""
         
@@ -136,7 +136,7 @@ class TestEmailIdempotency(unittest.TestCase):
         
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
-        mock_sqlite.connect.return_value = mock_conn
+        mock_sqlite.return_value = mock_conn
         mock_conn.cursor.return_value = mock_cursor
         mock_cursor.fetchone.return_value = None # No prev sends
         
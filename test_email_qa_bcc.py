@@ -32,7 +32,7 @@ class TestEmailLogic(unittest.TestCase):
         }
 
     @patch('utils.email_sender.smtplib.SMTP')
-    @patch('utils.email_sender.sqlite3.connect')
+    @patch('utils.email_sender.dbm.get_connection')
     def test_qa_mode_enabled(self, mock_sqlite, mock_smtp_cls):
         """
         Test that QA Mode overrides recipients, subject and headers, 
@@ -130,7 +130,7 @@ class TestEmailLogic(unittest.TestCase):
         print("\n✅ Test QA Mode: PASSED")
 
     @patch('utils.email_sender.smtplib.SMTP')
-    @patch('utils.email_sender.sqlite3.connect')
+    @patch('utils.email_sender.dbm.get_connection')
     def test_production_mode_copies(self, mock_sqlite, mock_smtp_cls):
         """
         Test that Production Mode respects Internal Copies (CC/BCC).
@@ -0,0 +1,14 @@
+"""
+Configuración común de pytest: la caché de archivos parseados se redirige a un directorio
+temporal para que los tests no lean ni escriban en .cache/ del repositorio.
+"""
+
+import pytest
+
+from utils import parse_cache
+
+
+@pytest.fixture(autouse=True)
+def isolated_parse_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(parse_cache, "CACHE_DIR", str(tmp_path / "parsed"))
+    return tmp_path / "parsed"
@@ -159,3 +159,73 @@ def fixture_with_duplicates():
 def fixture_mixed_debt():
     """Fixture: Mix de clientes con/sin deuda y detracciones"""
     return create_synthetic_df_final(num_records=25, with_emails=True, with_duplicates=False)
+
+
+def create_synthetic_raw_inputs(num_docs=60, seed=7):
+    """
+    Crea los 3 DataFrames crudos (CtasxCobrar, Cartera, Cobranza) tal como llegan de los Excel del ERP.
+    Incluye casos borde: códigos numéricos/texto/nulos, numsun con guiones, montos alrededor de 700,
+    US$ con tipo de cambio 0/nulo, fechas nulas, pagos DT y amortizaciones repetidas por documento.
+
+    Returns:
+        (df_ctas, df_cartera, df_cobranza)
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+
+    codcli_pool = [101, 102.0, "103", " 104", None, "ABC", 105, 106, 107, 108]
+    ctas = []
+    for i in range(num_docs):
+        codmnd = "US$" if i % 3 == 0 else "S/"
+        mondoc = [500.0, 700.0, 700.01, 1500.0, 12345.67, 0.0, None][i % 7]
+        ctas.append({
+            'codcli': codcli_pool[i % len(codcli_pool)],
+            'nomcli': f"Empresa {i % len(codcli_pool)}",
+            'coddoc': "01" if i % 4 else "0-7",
+            'sersun': [" F001", "F002 ", "E001", None][i % 4],
+            'numsun': [1000 + i, f"{2000 + i}", f"AB-{i}", 12345678 + i, float(3000 + i)][i % 5],
+            'fecdoc': pd.Timestamp("2025-01-01") + pd.Timedelta(days=i),
+            'fecvct': None if i % 11 == 0 else pd.Timestamp.today().normalize() + pd.Timedelta(days=int(rng.integers(-60, 20))),
+            'codmnd': codmnd,
+            'tipcam': [3.75, 0.0, None][(i // 3) % 3] if codmnd == "US$" else 1.0,
+            'mododo': mondoc if mondoc is not None else 0.0,
+            'mondoc': mondoc,
+            'sldacl': float(rng.integers(0, 5000)) + 0.5,
+            'tipped': "PAV" if i % 6 == 0 else "VEN",
+        })
+    df_ctas = pd.DataFrame(ctas)
+
+    df_cartera = pd.DataFrame({
+        'codigo_cliente': [101, "102", 103.0, 104, "ABC", 105, 105, 107],
+        'telefono': ["942841923", "51942841924", "(01) 555-1234", None, "", 987654321, "+51 999 888 777", "123"],
+        ' Correo ': ["A@Mail.com ", None, "c@mail.com", "d@mail.com", "NaN", "e@mail.com", "e2@mail.com", ""],
+        'nota': ["VIP", None, "", "x", "y", "z", "z2", "w"],
+        'Enviar Email': ["SI", "NO", None, "SI", "SI", "NO", "SI", "SI"],
+    })
+
+    cobranza = []
+    for i in range(0, num_docs, 2):
+        # En Cobranza el numsun ya trae la serie (clave: coddoc + numsun)
+        sersun = str(ctas[i]['sersun']).strip()
+        try:
+            numero = str(int(float(ctas[i]['numsun']))).zfill(8)
+        except ValueError:
+            numero = str(ctas[i]['numsun'])
+        forpag = ["DT", "EF", "DET", "TR", "DT"][(i // 2) % 5]
+        cobranza.append({
+            'coddoc': ctas[i]['coddoc'],
+            'numsun': f"{sersun}{numero}" if i % 8 else f"{sersun}-{numero}",
+            'forpag': forpag,
+            'monpag': float(rng.integers(50, 900)),
+            'mondoc': float(rng.integers(100, 5000)) if i % 6 else "N/D",
+            'fecpro': None if i % 8 == 0 else pd.Timestamp("2025-02-01") + pd.Timedelta(days=i),
+            'nombco': "BCP",
+            'codbco': "002",
+            'nudopa': f"OP{i:05d}",
+        })
+        if i % 10 == 0:
+            # Pago repetido (parcial) sobre el mismo documento
+            cobranza.append(dict(cobranza[-1], monpag=12.5, nudopa=f"OP{i:05d}-B"))
+    df_cobranza = pd.DataFrame(cobranza)
+
+    return df_ctas, df_cartera, df_cobranza
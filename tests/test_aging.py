@@ -0,0 +1,68 @@
+"""
+Tests del Motor de Aging por Fecha de Corte
+Valida los tramos de ESTADO DEUDA y el refresco sobre un df_final existente
+sin volver a ejecutar los cruces.
+"""
+
+import os
+import sys
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.processing import process_data, calc_aging, refresh_aging, aging_is_stale, AGING_BUCKETS
+from tests.fixtures.synthetic_data import create_synthetic_raw_inputs
+
+
+def test_aging_buckets_at_cut_off_date():
+    corte = date(2025, 3, 31)
+    venc = pd.Series([corte + timedelta(days=5), corte, corte - timedelta(days=8),
+                      corte - timedelta(days=9), corte - timedelta(days=30), corte - timedelta(days=31), None])
+    dias, estado = calc_aging(venc, corte)
+
+    assert dias.tolist() == [-5, 0, 8, 9, 30, 31, 0]
+    assert estado.tolist() == [
+        "🟢 Por Vencer", "🟡 Gestión Preventiva", "🟡 Gestión Preventiva",
+        "🟠 Gestión Administrativa", "🟠 Gestión Administrativa", "🔴 Gestión Pre-Legal", "Indeterminado",
+    ]
+
+
+def test_process_data_uses_fecha_corte():
+    inputs = create_synthetic_raw_inputs(num_docs=40)
+    corte = date(2024, 1, 15)
+    df_final = process_data(*[df.copy() for df in inputs], fecha_corte=corte)
+
+    expected = (pd.Timestamp(corte) - pd.to_datetime(df_final['FECH VENC'])).dt.days.fillna(0)
+    assert df_final['DÍAS MORA'].tolist() == expected.astype('int64').tolist()
+    assert df_final.attrs['fecha_corte'] == "2024-01-15"
+
+
+def test_refresh_matches_full_reprocess():
+    """Refrescar la mora de un df_final equivale a reprocesar con la nueva fecha de corte"""
+    inputs = create_synthetic_raw_inputs(num_docs=40)
+    df_final = process_data(*[df.copy() for df in inputs], fecha_corte=date(2024, 1, 15))
+    nueva = date(2024, 2, 20)
+
+    refreshed = refresh_aging(df_final, nueva)
+    reprocessed = process_data(*[df.copy() for df in inputs], fecha_corte=nueva)
+    pd.testing.assert_frame_equal(refreshed, reprocessed)
+    assert list(refreshed['ESTADO DEUDA'].cat.categories) == AGING_BUCKETS
+    # El df_final original no se modifica
+    assert df_final.attrs['fecha_corte'] == "2024-01-15"
+
+
+def test_aging_is_stale():
+    df_final = process_data(*create_synthetic_raw_inputs(num_docs=10), fecha_corte=date(2024, 1, 15))
+    assert not aging_is_stale(df_final, date(2024, 1, 15))
+    assert aging_is_stale(df_final, date(2024, 1, 16))
+
+    # Sesiones sin fecha de corte registrada siempre se refrescan
+    df_final.attrs.clear()
+    assert aging_is_stale(df_final, date(2024, 1, 15))
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,85 @@
+"""
+Tests del Procesamiento por Lotes (cli.py)
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import cli
+import utils.incremental as inc
+import utils.state_manager as state_mgr
+from utils.processing import apply_output_schema, process_data, read_input_file
+from tests.fixtures.synthetic_data import create_synthetic_raw_inputs
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.setattr(inc, "PIPELINE_DIR", str(tmp_path / "pipeline"))
+    monkeypatch.setattr(inc, "STATE_FILE", str(tmp_path / "pipeline" / "state.json"))
+    monkeypatch.setattr(state_mgr, "CACHE_DIR", str(tmp_path / "session"))
+    paths = {}
+    for name, df in zip(('ctas', 'cartera', 'cobranza'), create_synthetic_raw_inputs(num_docs=30)):
+        paths[name] = str(tmp_path / f"{name}.xlsx")
+        df.to_excel(paths[name], index=False)
+    return tmp_path, paths
+
+
+def _args(paths, *extra):
+    return ["--ctas", paths['ctas'], "--cartera", paths['cartera'], "--cobranza", paths['cobranza'],
+            "--fecha-corte", "2025-03-31", *extra]
+
+
+def test_cli_writes_outputs_and_session(workdir, capsys):
+    tmp_path, paths = workdir
+    parquet_out, excel_out = str(tmp_path / "out" / "df_final.parquet"), str(tmp_path / "out" / "reporte.xlsx")
+
+    assert cli.main(_args(paths, "--output", parquet_out, "--output", excel_out)) == 0
+
+    expected = process_data(*(read_input_file(paths[k], k) for k in ('ctas', 'cartera', 'cobranza')),
+                            fecha_corte=pd.Timestamp("2025-03-31").date())
+    pd.testing.assert_frame_equal(apply_output_schema(pd.read_parquet(parquet_out)), expected)
+    assert os.path.getsize(excel_out) > 0
+
+    df_session, meta, _ = state_mgr.load_session()
+    assert len(df_session) == len(expected) and "CLI" in meta
+    assert [c['operator'] for c in state_mgr.list_cycles()] == [state_mgr.DEFAULT_OPERATOR]
+    assert "enriquecer_documentos" in capsys.readouterr().out
+
+
+def test_cli_memory_profile_flag(workdir, capsys):
+    tmp_path, paths = workdir
+    assert cli.main(_args(paths, "--no-session")) == 0
+    assert "NaN" in capsys.readouterr().out  # peak_mb sin medir por defecto
+    assert cli.main(_args(paths, "--no-session", "--perfil-memoria")) == 0
+    assert "NaN" not in capsys.readouterr().out
+
+
+def test_cli_renders_email_bodies(workdir):
+    tmp_path, paths = workdir
+    emails_dir = tmp_path / "correos"
+
+    assert cli.main(_args(paths, "--emails", str(emails_dir), "--no-session")) == 0
+
+    index = pd.read_csv(emails_dir / "index.csv", dtype=str)
+    assert len(index) > 0
+    assert all((emails_dir / name).read_text(encoding='utf-8').lstrip().startswith('<') for name in index['ARCHIVO'])
+    assert state_mgr.list_sessions() == []
+
+
+def test_cli_rejects_invalid_inputs(workdir, capsys):
+    _, paths = workdir
+    swapped = dict(paths, ctas=paths['cobranza'], cobranza=paths['ctas'])
+
+    assert cli.main(_args(swapped, "--no-session")) == 2
+    err = capsys.readouterr().err
+    assert "CtasxCobrar: el archivo parece ser Cobranza" in err
+    assert "Cobranza: el archivo parece ser CtasxCobrar" in err
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,101 @@
+"""
+Cobranza Lookups Tests
+Valida la agregación de Cobranza por MATCH_KEY (DT y amortizaciones) usada en el cruce con Ctas.
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.processing import build_cobranza_lookups, process_data, format_payment_info, format_payment_info_series
+from tests.fixtures.synthetic_data import create_synthetic_raw_inputs
+
+
+def _pago(numsun, forpag, monpag, nudopa):
+    return {
+        'coddoc': '01', 'numsun': numsun, 'forpag': forpag, 'monpag': monpag, 'mondoc': 1000.0,
+        'fecpro': pd.Timestamp('2025-03-10'), 'nombco': 'BCP', 'codbco': '002', 'nudopa': nudopa,
+    }
+
+
+def test_one_row_per_match_key():
+    """Pagos múltiples del mismo documento se agregan en una sola fila (suma DT y texto concatenado)"""
+    df_cob = pd.DataFrame([
+        _pago('F00100000001', 'DT', 100.0, 'OP1'),
+        _pago('F00100000001', 'DT', 20.0, 'OP2'),
+        _pago('F00100000001', 'EF', 500.0, 'OP3'),
+        _pago('F00100000002', 'DET', 50.0, 'OP4'),
+    ])
+    lookups = build_cobranza_lookups(df_cob)
+
+    assert lookups.index.is_unique
+    assert list(lookups.index) == ['01F00100000001']
+    row = lookups.loc['01F00100000001']
+    assert row['DT_MONTO'] == 120.0
+    assert row['DT_INFO'].count("\n---\n") == 1
+    assert "Oper: OP1" in row['DT_INFO'] and "Oper: OP2" in row['DT_INFO']
+    assert "Oper: OP3" in row['AMORT_INFO']
+
+
+def test_no_dt_payments_still_builds_amortizations():
+    """Sin pagos DT, las amortizaciones se siguen calculando (antes fallaba por format_dt_info)"""
+    df_ctas, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=30)
+    df_cobranza = df_cobranza[df_cobranza['forpag'] != 'DT']
+
+    df_final = process_data(df_ctas, df_cartera, df_cobranza)
+
+    assert not df_final['ESTADO DETRACCION'].str.startswith('Banco').any()
+    assert (df_final['AMORTIZACIONES'] != '-').any()
+
+
+def test_join_preserves_ctas_rows():
+    """El left join con los lookups no cambia la cantidad ni el orden de documentos"""
+    df_ctas, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=40)
+
+    con_cobranza = process_data(df_ctas.copy(), df_cartera.copy(), df_cobranza)
+    sin_cobranza = process_data(df_ctas.copy(), df_cartera.copy(), pd.DataFrame())
+
+    assert con_cobranza['MATCH_KEY'].tolist() == sin_cobranza['MATCH_KEY'].tolist()
+    assert con_cobranza['COD CLIENTE'].tolist() == sin_cobranza['COD CLIENTE'].tolist()
+
+
+def test_empty_cobranza():
+    """Cobranza vacía: sin detalle DT ni amortizaciones"""
+    df_ctas, df_cartera, _ = create_synthetic_raw_inputs(num_docs=10)
+    df_final = process_data(df_ctas, df_cartera, pd.DataFrame())
+
+    assert (df_final['AMORTIZACIONES'] == '-').all()
+    assert set(df_final['ESTADO DETRACCION']) <= {'No Aplica', 'Pendiente', '-'}
+
+
+
+@pytest.mark.parametrize("fecpro", [
+    [pd.Timestamp('2025-03-10'), pd.NaT, pd.Timestamp('2024-12-31'), pd.NaT, pd.Timestamp('2025-01-02')],
+    ['2025-03-10', None, pd.Timestamp('2024-12-31'), float('nan'), '2025-01-02 10:30'],
+])
+def test_payment_text_matches_row_wise(fecpro):
+    """El texto armado por columnas es idéntico al de format_payment_info fila a fila"""
+    df = pd.DataFrame({
+        'nombco': ['BCP', None, 'BBVA', float('nan'), 'BCP'],
+        'codbco': ['002', 11, None, '002', 2.0],
+        'fecpro': fecpro,
+        'mondoc': [1234.5, 'N/D', None, 0, '99'],
+        'monpag': [100.0, 50.0, float('nan'), 1_000_000.125, 3],
+        'forpag': ['DT', 'EF', 'TR', 'DT', None],
+        'nudopa': ['OP1', 7, None, 'OP4', 'OP5'],
+    })
+    expected = df.apply(format_payment_info, axis=1)
+    assert format_payment_info_series(df).tolist() == expected.tolist()
+
+
+def test_payment_text_missing_columns():
+    df = pd.DataFrame({'monpag': [10.0, 'x'], 'forpag': ['DT', 'EF']})
+    assert format_payment_info_series(df).tolist() == df.apply(format_payment_info, axis=1).tolist()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -8,11 +8,13 @@ import shutil
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from utils.email_sender import send_email_batch
+import utils.db_manager as dbm
 
 class TestEmailGates(unittest.TestCase):
     
     def setUp(self):
-        # Clean DB before each test
+        # Clean DB before each test (cerrando antes la conexión compartida del ledger)
+        dbm.close_connections()
         if os.path.exists("email_ledger.db"):
             os.remove("email_ledger.db")
             
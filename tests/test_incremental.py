@@ -0,0 +1,104 @@
+"""
+Incremental Pipeline Tests
+Valida que el reproceso incremental (solo Cobranza cambia) produzca exactamente
+el mismo df_final que un proceso completo desde cero.
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import utils.incremental as inc
+from utils.processing import process_data, read_input_file
+from tests.fixtures.synthetic_data import create_synthetic_raw_inputs
+
+
+@pytest.fixture
+def pipeline_dir(tmp_path, monkeypatch):
+    cache = tmp_path / "pipeline"
+    monkeypatch.setattr(inc, "PIPELINE_DIR", str(cache))
+    monkeypatch.setattr(inc, "STATE_FILE", str(cache / "state.json"))
+    return cache
+
+
+@pytest.fixture
+def input_files(tmp_path):
+    df_ctas, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=40)
+    paths = {}
+    for name, df in (('ctas', df_ctas), ('cartera', df_cartera), ('cobranza', df_cobranza)):
+        paths[name] = tmp_path / f"{name}.xlsx"
+        df.to_excel(paths[name], index=False)
+    return paths
+
+
+def _full_process(paths):
+    return process_data(
+        read_input_file(paths['ctas'], 'ctas'),
+        read_input_file(paths['cartera'], 'cartera'),
+        read_input_file(paths['cobranza'], 'cobranza'),
+    )
+
+
+def _run(paths):
+    return inc.process_files_incremental(str(paths['ctas']), str(paths['cartera']), str(paths['cobranza']))
+
+
+def test_first_run_is_full(pipeline_dir, input_files):
+    df_final, info = _run(input_files)
+
+    assert info['mode'] == 'full'
+    pd.testing.assert_frame_equal(df_final, _full_process(input_files))
+
+
+def test_same_files_reuse_cached_result(pipeline_dir, input_files):
+    _run(input_files)
+    df_final, info = _run(input_files)
+
+    assert info['mode'] == 'cached'
+    assert set(info['reused']) == {'ctas', 'cartera', 'cobranza'}
+    pd.testing.assert_frame_equal(df_final, _full_process(input_files))
+
+
+def test_new_cobranza_recomputes_only_touched_keys(pipeline_dir, input_files):
+    _run(input_files)
+
+    # Pago nuevo sobre un documento, un pago eliminado y el resto igual
+    df_cob = read_input_file(input_files['cobranza'], 'cobranza')
+    nuevo = df_cob.iloc[[1]].assign(forpag='DT', monpag=333.0, nudopa='OP-NEW')
+    df_cob = pd.concat([df_cob.drop(index=5), nuevo], ignore_index=True)
+    df_cob.to_excel(input_files['cobranza'], index=False)
+
+    df_final, info = _run(input_files)
+
+    assert info['mode'] == 'incremental'
+    assert info['reused'] == ['ctas', 'cartera']
+    assert 0 < info['touched_keys'] <= 2
+    pd.testing.assert_frame_equal(df_final, _full_process(input_files))
+
+
+def test_changed_ctas_triggers_full_enrichment(pipeline_dir, input_files):
+    _run(input_files)
+
+    df_ctas = read_input_file(input_files['ctas'], 'ctas')
+    df_ctas.loc[0, 'sldacl'] = 99999.0
+    df_ctas.to_excel(input_files['ctas'], index=False)
+
+    df_final, info = _run(input_files)
+
+    assert info['mode'] == 'full'
+    assert 'cobranza' in info['reused']
+    pd.testing.assert_frame_equal(df_final, _full_process(input_files))
+
+
+def test_file_content_hash_sources_agree(input_files):
+    path = input_files['ctas']
+    data = path.read_bytes()
+    assert inc.file_content_hash(str(path)) == inc.file_content_hash(data)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,128 @@
+"""
+Tests de Ingesta de Archivos (load_data / read_input_files)
+Lectura paralela, poda de columnas, motor xlsx opcional y entradas CSV / Parquet.
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import utils.processing as proc
+from utils.processing import load_data, read_input_files, read_input_file, iter_input_chunks, process_data
+from utils.streaming import process_data_streaming, load_streaming_result
+from tests.fixtures.synthetic_data import create_synthetic_raw_inputs
+
+KINDS = ('ctas', 'cartera', 'cobranza')
+
+
+@pytest.fixture
+def workbooks(tmp_path):
+    paths = {}
+    for kind, df in zip(KINDS, create_synthetic_raw_inputs(num_docs=40)):
+        # Columnas que el pipeline no usa (los exportes del ERP traen 60+)
+        for i in range(5):
+            df[f"erp_col_{i}"] = i
+        paths[kind] = str(tmp_path / f"{kind}.xlsx")
+        df.to_excel(paths[kind], index=False)
+    return paths
+
+
+def test_parallel_and_sequential_reads_match(workbooks):
+    sequential = read_input_files(workbooks, parallel=False)
+    parallel = read_input_files(workbooks, parallel=True)
+    for kind in KINDS:
+        pd.testing.assert_frame_equal(parallel[kind], sequential[kind])
+        assert not [c for c in parallel[kind].columns if c.startswith('erp_col_')]
+
+
+def test_load_data_accepts_uploaded_buffers(workbooks):
+    from io import BytesIO
+    buffers = [BytesIO(open(workbooks[k], 'rb').read()) for k in KINDS]
+    df_ctas, df_cartera, df_cobranza, error = load_data(*buffers, parallel=True)
+
+    assert error is None
+    assert len(df_ctas) == 40
+    assert 'codcli' in df_ctas.columns and 'codigo_cliente' in df_cartera.columns
+
+
+def test_load_data_reports_schema_error(workbooks, tmp_path):
+    bad = str(tmp_path / "bad.xlsx")
+    pd.read_excel(workbooks['cobranza']).drop(columns=['forpag']).to_excel(bad, index=False)
+
+    _, _, _, error = load_data(workbooks['ctas'], workbooks['cartera'], bad, parallel=True)
+    assert "forpag" in error
+
+
+def test_engine_override(workbooks, monkeypatch):
+    monkeypatch.setattr(proc, "EXCEL_ENGINE", "openpyxl")
+    assert proc.preferred_excel_engine() == "openpyxl"
+    assert len(read_input_files({'ctas': workbooks['ctas']})['ctas']) == 40
+
+
+@pytest.mark.skipif(proc.importlib.util.find_spec("python_calamine") is None, reason="python-calamine no instalado")
+def test_calamine_matches_openpyxl(workbooks, monkeypatch):
+    frames = {}
+    for engine in ("openpyxl", "calamine"):
+        monkeypatch.setattr(proc, "EXCEL_ENGINE", engine)
+        frames[engine] = read_input_files(workbooks, parallel=False)
+    for kind in KINDS:
+        pd.testing.assert_frame_equal(frames["calamine"][kind], frames["openpyxl"][kind], check_dtype=False)
+
+
+def _write_as(df, path, fmt):
+    """Exporta como lo haría el ERP: CSV con ';', Latin-1 y fechas dd/mm/aaaa; Parquet con texto tipado."""
+    if fmt == 'csv':
+        df.to_csv(path, index=False, sep=';', encoding='latin-1', date_format='%d/%m/%Y')
+    else:
+        df = df.copy()
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].map(lambda v: str(v) if pd.notna(v) else None)
+        df.to_parquet(path, index=False)
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_csv_and_parquet_match_xlsx(workbooks, tmp_path, fmt):
+    paths = {}
+    for kind, df in zip(KINDS, create_synthetic_raw_inputs(num_docs=40)):
+        df["erp_col_0"] = 0
+        paths[kind] = str(tmp_path / f"{kind}.{fmt}")
+        _write_as(df, paths[kind], fmt)
+
+    frames = read_input_files(paths, parallel=False)
+    expected = read_input_files(workbooks, parallel=False)
+    assert 'erp_col_0' not in frames['ctas'].columns
+    pd.testing.assert_frame_equal(
+        process_data(*(frames[k] for k in KINDS)),
+        process_data(*(expected[k] for k in KINDS)),
+    )
+
+
+def test_csv_schema_error_before_parse(tmp_path):
+    path = tmp_path / "cobranza.csv"
+    path.write_text("numsun;monpag\n1000;10.5\n", encoding='utf-8')
+    with pytest.raises(proc.schema_resolver.SchemaError, match="forpag"):
+        read_input_file(str(path), 'cobranza')
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_chunked_ctas_feeds_streaming_mode(workbooks, tmp_path, fmt):
+    path = str(tmp_path / f"ctas.{fmt}")
+    _write_as(create_synthetic_raw_inputs(num_docs=40)[0], path, fmt)
+    chunks = list(iter_input_chunks(path, 'ctas', chunksize=15))
+    assert [len(c) for c in chunks] == [15, 15, 10]
+
+    df_cartera = read_input_file(workbooks['cartera'], 'cartera')
+    df_cobranza = read_input_file(workbooks['cobranza'], 'cobranza')
+    process_data_streaming(iter(chunks), df_cartera, df_cobranza, str(tmp_path / "out"), chunk_size=10)
+    pd.testing.assert_frame_equal(
+        load_streaming_result(str(tmp_path / "out")),
+        process_data(read_input_file(path, 'ctas'), df_cartera, df_cobranza),
+    )
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,117 @@
+"""
+Tests de Conexiones del Ledger (utils/db_manager.py)
+Conexión reutilizada por hilo, WAL + synchronous=NORMAL + busy timeout, reapertura si el
+archivo cambia, consultas de estado con SQL fijo y escrituras del envío sin transacciones abiertas.
+"""
+
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from unittest import mock
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import utils.db_manager as dbm
+from utils.email_sender import send_email_batch
+
+
+@pytest.fixture
+def ledger(tmp_path, monkeypatch):
+    monkeypatch.setattr(dbm, "DB_NAME", str(tmp_path / "ledger.db"))
+    monkeypatch.setattr(dbm, "LOCAL_TZ", timezone.utc)  # Horas del operador = texto UTC guardado
+    conn = dbm.get_connection()
+    yield conn
+    dbm.close_connections()
+
+
+def _attempt(conn, recipient, status, ts):
+    conn.execute("INSERT INTO send_attempts VALUES(?,?,?,?,?,?,?)",
+                 (f"{recipient}-{ts}", "key", recipient, status, "", ts, "run"))
+    conn.commit()
+
+
+def test_connection_is_reused_per_thread(ledger):
+    assert dbm.get_connection() is ledger
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(dbm.get_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not ledger
+
+
+def test_pragmas(ledger):
+    assert ledger.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert ledger.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert ledger.execute("PRAGMA busy_timeout").fetchone()[0] == dbm.BUSY_TIMEOUT_MS
+
+
+def test_reconnects_after_close_or_file_removed(ledger):
+    ledger.close()
+    conn = dbm.get_connection()
+    assert conn is not ledger
+    conn.execute("SELECT 1")
+
+    dbm.close_connections()
+    os.remove(dbm.DB_NAME)
+    conn = dbm.get_connection()
+    assert conn.execute("SELECT COUNT(*) FROM send_attempts").fetchone()[0] == 0
+
+
+def test_readers_not_blocked_by_open_write(ledger):
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    _attempt(ledger, "a@x.pe", "SENT", f"{today} 09:00:00")
+
+    # Escritura en curso (sin commit) en otro hilo: con WAL la lectura sigue viendo lo confirmado
+    started, release = threading.Event(), threading.Event()
+
+    def writer():
+        conn = dbm.get_connection()
+        conn.execute("INSERT INTO send_attempts VALUES('w','k','a@x.pe','FAILED','',?, 'r')", (f"{today} 10:00:00",))
+        started.set()
+        release.wait(5)
+        conn.commit()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    started.wait(5)
+    status = dbm.get_status_map(["a@x.pe"])
+    release.set()
+    thread.join()
+
+    assert status["a@x.pe"]["status"] == "SENT"
+
+
+def test_status_map_large_list(ledger):
+    emails = [f"c{i}@x.pe" for i in range(5000)]
+    _attempt(ledger, emails[-1], "FAILED", "2025-03-01 08:00:00")
+    _attempt(ledger, emails[-1], "SENT", "2025-03-01 09:30:00")
+
+    status = dbm.get_status_map(emails, target_date_str="2025-03-01")
+    assert status == {emails[-1]: {'status': 'SENT', 'time': '09:30', 'ts_raw': '2025-03-01 09:30:00',
+                                   'ts_local': '2025-03-01 09:30:00'}}
+    assert dbm.get_status_map(emails, min_timestamp="2025-03-01 09:00:00")[emails[-1]]['status'] == 'SENT'
+    assert dbm.get_status_map([]) == {}
+
+
+def test_failed_ledger_write_is_rolled_back(ledger):
+    """Una escritura fallida del envío se revierte completa: la conexión compartida queda sin transacción"""
+    messages = [{'email': f"c{i}@x.pe", 'subject': 'S', 'html_body': '<p>B</p>', 'client_name': f"C{i}",
+                 'notification_key': f"K{i}"} for i in range(2)]
+    smtp_config = {'server': 'smtp.test', 'port': 587, 'user': 'u', 'password': 'p'}
+    # Mismo id de intento para todos: el segundo INSERT en send_attempts viola la PK
+    with mock.patch('smtplib.SMTP'), mock.patch('utils.email_sender.uuid.uuid4', return_value="fijo"):
+        stats = send_email_batch(smtp_config, messages)
+
+    assert any("Ledger Write Error" in line for line in stats['log'])
+    assert not ledger.in_transaction
+    # El estado TTL del segundo envío se revirtió junto con su auditoría
+    assert ledger.execute("SELECT COUNT(*) FROM ledger_last_send").fetchone()[0] == 1
+    assert ledger.execute("SELECT COUNT(*) FROM send_attempts").fetchone()[0] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,135 @@
+"""
+Tests de Migraciones del Ledger (utils/db_manager.py)
+schema_version, índices de consulta, actualización de un ledger existente, reversión
+de una migración fallida y consultas por rango epoch con la zona horaria del operador.
+"""
+
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import utils.db_manager as dbm
+
+
+@pytest.fixture
+def db_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "ledger.db")
+    monkeypatch.setattr(dbm, "DB_NAME", path)
+    yield path
+    dbm.close_connections()
+
+
+def _indexes(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index' AND name LIKE 'idx_%'")}
+
+
+def test_new_ledger_is_created_at_latest_version(db_path):
+    conn = dbm.get_connection()
+    assert dbm.schema_version(conn) == dbm.LEDGER_SCHEMA_VERSION
+    assert _indexes(conn) == {'idx_send_attempts_recipient_epoch', 'idx_send_attempts_ledger_key',
+                              'idx_send_attempts_epoch', 'idx_ledger_last_send_epoch'}
+
+
+def test_existing_ledger_is_upgraded_keeping_rows(db_path):
+    # Ledger creado por versiones anteriores (tablas sin índices ni schema_version)
+    old = sqlite3.connect(db_path)
+    old.execute("CREATE TABLE send_attempts (id TEXT PRIMARY KEY, ledger_key TEXT, recipient TEXT, status TEXT, "
+                "reason TEXT, timestamp TIMESTAMP, run_id TEXT)")
+    old.execute("INSERT INTO send_attempts VALUES ('1','k','a@x.pe','SENT','','2025-03-01 09:00:00','r')")
+    old.commit()
+    old.close()
+
+    conn = dbm.get_connection()
+    assert dbm.schema_version(conn) == dbm.LEDGER_SCHEMA_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM send_attempts").fetchone()[0] == 1
+    # Instante epoch de las filas anteriores: el texto guardado es UTC
+    assert conn.execute("SELECT ts_epoch_ms FROM send_attempts").fetchone()[0] == \
+        dbm.to_epoch_ms(datetime(2025, 3, 1, 9, tzinfo=timezone.utc))
+    assert conn.execute("SELECT COUNT(*) FROM ledger_last_send").fetchone()[0] == 0
+    assert dbm.migrate_ledger(conn) == dbm.LEDGER_SCHEMA_VERSION  # idempotente
+    assert conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0] == len(dbm.LEDGER_MIGRATIONS)
+
+
+def test_queries_use_indexes(db_path):
+    conn = dbm.get_connection()
+    plans = {
+        'status': conn.execute("EXPLAIN QUERY PLAN " + dbm._STATUS_RANGE_SQL, ('["a@x.pe"]', 0, 1)).fetchall(),
+        'ttl': conn.execute("EXPLAIN QUERY PLAN SELECT * FROM send_attempts WHERE ledger_key=?", ("k",)).fetchall(),
+        'today': conn.execute("EXPLAIN QUERY PLAN SELECT status, COUNT(*) FROM send_attempts "
+                              "WHERE ts_epoch_ms >= ? AND ts_epoch_ms < ? GROUP BY status", (0, 1)).fetchall(),
+        'reset': conn.execute("EXPLAIN QUERY PLAN DELETE FROM ledger_last_send "
+                              "WHERE last_sent_epoch_ms >= ? AND last_sent_epoch_ms < ?", (0, 1)).fetchall(),
+    }
+    for name, plan in plans.items():
+        detail = " ".join(row[-1] for row in plan)
+        assert "USING INDEX" in detail or "USING COVERING INDEX" in detail, (name, detail)
+
+
+def test_failed_migration_is_rolled_back(db_path, monkeypatch):
+    conn = sqlite3.connect(db_path)
+    dbm.migrate_ledger(conn)
+    monkeypatch.setattr(dbm, "LEDGER_MIGRATIONS", dbm.LEDGER_MIGRATIONS + [
+        (99, "rota", ["CREATE TABLE nueva (x INTEGER)", "CREATE INDEX idx_roto ON no_existe (x)"]),
+    ])
+
+    with pytest.raises(sqlite3.OperationalError):
+        dbm.migrate_ledger(conn, target_version=99)
+    assert dbm.schema_version(conn) == dbm.LEDGER_SCHEMA_VERSION
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name='nueva'").fetchone() is None
+    conn.close()
+
+
+def test_positional_inserts_get_epoch(db_path):
+    # El envío y otros escritores insertan 7 valores posicionales: la columna calculada no los rompe
+    conn = dbm.get_connection()
+    conn.execute("INSERT INTO send_attempts VALUES('1','k','a@x.pe','SENT','','2025-03-01 09:00:00.250000','r')")
+    conn.execute("INSERT INTO ledger_last_send (ledger_key, last_sent_at, last_msg_id, send_count) "
+                 "VALUES ('k', '2025-03-01 09:00:00', 'm', 1)")
+    expected = dbm.to_epoch_ms(datetime(2025, 3, 1, 9, tzinfo=timezone.utc))
+    assert conn.execute("SELECT ts_epoch_ms FROM send_attempts").fetchone()[0] == expected + 250
+    assert conn.execute("SELECT last_sent_epoch_ms FROM ledger_last_send").fetchone()[0] == expected
+
+
+def test_day_and_session_ranges_use_operator_timezone(db_path, monkeypatch):
+    monkeypatch.setattr(dbm, "LOCAL_TZ", timezone(timedelta(hours=-5)))  # Lima
+    conn = dbm.get_connection()
+    # 03:00 UTC del 2 de marzo = 22:00 del 1 de marzo en Lima
+    conn.execute("INSERT INTO send_attempts VALUES('1','k','a@x.pe','SENT','','2025-03-02 03:00:00','r')")
+    conn.commit()
+
+    status = dbm.get_status_map(["a@x.pe"], target_date_str="2025-03-01")
+    assert status == {"a@x.pe": {'status': 'SENT', 'time': '22:00', 'ts_raw': '2025-03-02 03:00:00',
+                                 'ts_local': '2025-03-01 22:00:00'}}
+    assert dbm.get_status_map(["a@x.pe"], target_date_str="2025-03-02") == {}
+    # Inicio de sesión sin zona = hora local
+    assert "a@x.pe" in dbm.get_status_map(["a@x.pe"], min_timestamp=datetime(2025, 3, 1, 21, 59))
+    assert dbm.get_status_map(["a@x.pe"], min_timestamp="2025-03-01 22:01:00") == {}
+
+
+def test_today_stats_and_reset_by_local_day(db_path, monkeypatch):
+    monkeypatch.setattr(dbm, "LOCAL_TZ", timezone(timedelta(hours=-5)))
+    conn = dbm.get_connection()
+    start_ms, _ = dbm.day_range_ms()
+    today_utc = datetime.fromtimestamp(start_ms / 1000, tz=timezone.utc) + timedelta(hours=1)
+    yesterday_utc = today_utc - timedelta(hours=2)
+    for att_id, ts in (("hoy", today_utc), ("ayer", yesterday_utc)):
+        text = ts.strftime("%Y-%m-%d %H:%M:%S")
+        conn.execute("INSERT INTO send_attempts VALUES(?,?,'a@x.pe','SENT','',?,'r')", (att_id, att_id, text))
+        conn.execute("INSERT INTO ledger_last_send (ledger_key, last_sent_at, last_msg_id, send_count) "
+                     "VALUES (?, ?, 'm', 1)", (att_id, text))
+    conn.commit()
+
+    assert dbm.get_today_stats()['SENT'] == 1
+    ok, _ = dbm.reset_today_stats()
+    assert ok
+    assert [r[0] for r in conn.execute("SELECT id FROM send_attempts")] == ["ayer"]
+    assert [r[0] for r in conn.execute("SELECT ledger_key FROM ledger_last_send")] == ["ayer"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
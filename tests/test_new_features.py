@@ -3,7 +3,7 @@ import pandas as pd
 import os
 import shutil
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timezone
 import sys
 
 # Add root to path
@@ -34,6 +34,7 @@ class TestNewFeatures(unittest.TestCase):
         # Cleanup
         if os.path.exists(self.test_cache_dir):
             shutil.rmtree(self.test_cache_dir)
+        dbm.close_connections()  # Conexiones compartidas del ledger (WAL): cerrar antes de borrar el archivo
         if os.path.exists(self.test_db):
             os.remove(self.test_db)
 
@@ -54,7 +55,7 @@ class TestNewFeatures(unittest.TestCase):
         # Insert Data
         conn = sqlite3.connect(self.test_db)
         c = conn.cursor()
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")  # El ledger guarda texto UTC
         c.execute("INSERT INTO send_attempts VALUES (?,?,?,?,?,?,?)", 
                   ("1", "key1", "test@dacta.pe", "SENT", "OK", now, "run1"))
         c.execute("INSERT INTO send_attempts VALUES (?,?,?,?,?,?,?)", 
@@ -0,0 +1,67 @@
+"""
+Normalizadores por Serie
+Valida que las versiones memoizadas por valor único devuelvan exactamente
+lo mismo que las funciones escalares aplicadas fila por fila.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import processing as proc
+
+MIXED_VALUES = [1, 1.0, "1", " 1 ", True, None, np.nan, "", "AB-12", "F001 ", 12345678, 123.9, "0042", "-", "(01) 555-1234", "51942841923"]
+
+SCALAR_TO_SERIES = [
+    (proc.format_client_code, proc.format_client_code_series),
+    (proc.format_phone, proc.format_phone_series),
+    (proc.clean_numsun, proc.clean_numsun_series),
+    (proc.pad_numsun, proc.pad_numsun_series),
+    (proc.clean_key_part, proc.clean_key_part_series),
+]
+
+
+@pytest.mark.parametrize("scalar_fn,series_fn", SCALAR_TO_SERIES)
+def test_series_matches_scalar_on_mixed_object_column(scalar_fn, series_fn):
+    """Columna object mixta (como viene de Excel): 1, 1.0, True, None y NaN no deben colisionar"""
+    s = pd.Series(MIXED_VALUES * 3, dtype=object)
+    expected = [scalar_fn(v) for v in s]
+    assert series_fn(s).tolist() == expected
+
+
+@pytest.mark.parametrize("scalar_fn,series_fn", SCALAR_TO_SERIES)
+def test_series_matches_scalar_on_float_column(scalar_fn, series_fn):
+    """Columna float con nulos (dtype numérico, ruta factorize directa)"""
+    s = pd.Series([101.0, np.nan, 102.0, 101.0, 942841923.0, np.nan])
+    expected = [scalar_fn(v) for v in s]
+    assert series_fn(s).tolist() == expected
+
+
+def test_map_unique_values_calls_function_once_per_unique():
+    """Cada valor único se normaliza una sola vez y el resultado conserva el índice"""
+    calls = []
+
+    def spy(v):
+        calls.append(v)
+        return f"<{v}>"
+
+    s = pd.Series(["a", "b", "a", "a", "b"], index=[10, 11, 12, 13, 14])
+    result = proc.map_unique_values(s, spy)
+
+    assert sorted(calls) == ["a", "b"]
+    assert result.tolist() == ["<a>", "<b>", "<a>", "<a>", "<b>"]
+    assert list(result.index) == [10, 11, 12, 13, 14]
+
+
+def test_map_unique_values_empty_series():
+    """Serie vacía devuelve Serie vacía"""
+    assert proc.map_unique_values(pd.Series([], dtype=object), str).empty
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,89 @@
+"""
+Tests del Esquema Tipado de df_final
+- Dtypes compactos (texto Arrow, category, float64, date32)
+- Round-trip sin pérdidas por save_session / load_session (Parquet), también con los estados
+  de envío que escribe la app
+- Exportación Excel con nulos Arrow
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import utils.state_manager as sm
+from utils.processing import process_data, apply_output_schema, OUTPUT_SCHEMA, TEXT_DTYPE
+from utils.excel_export import generate_excel
+from tests.fixtures.synthetic_data import create_synthetic_raw_inputs
+
+
+@pytest.fixture
+def df_final():
+    return process_data(*create_synthetic_raw_inputs(num_docs=60))
+
+
+@pytest.fixture
+def session_paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(sm, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(sm, "SESSION_FILE", str(tmp_path / "session.parquet"))
+    monkeypatch.setattr(sm, "META_FILE", str(tmp_path / "meta.txt"))
+
+
+def test_schema_dtypes(df_final):
+    """Cada columna de df_final tiene el dtype declarado en OUTPUT_SCHEMA"""
+    assert set(df_final.columns) <= set(OUTPUT_SCHEMA)
+    assert isinstance(df_final['MONEDA'].dtype, pd.CategoricalDtype)
+    assert isinstance(df_final['ESTADO DEUDA'].dtype, pd.CategoricalDtype)
+    assert df_final['ESTADO_EMAIL'].dtype == TEXT_DTYPE
+    assert df_final['ESTADO DETRACCION'].dtype == TEXT_DTYPE
+    assert df_final['SALDO REAL'].dtype == 'float64'
+    assert df_final['DÍAS MORA'].dtype == 'int64'
+    assert str(df_final['FECH VENC'].dtype) == 'date32[day][pyarrow]'
+    assert isinstance(df_final['MATCH_KEY'].dtype, pd.StringDtype)
+
+
+def test_schema_reduces_memory(df_final):
+    """El esquema tipado ocupa menos memoria que la representación object"""
+    as_object = df_final.astype(object)
+    assert df_final.memory_usage(deep=True).sum() < as_object.memory_usage(deep=True).sum()
+
+
+def test_schema_is_idempotent(df_final):
+    again = apply_output_schema(df_final)
+    pd.testing.assert_frame_equal(again, df_final)
+
+
+def test_session_round_trip_is_lossless(df_final, session_paths):
+    """save_session + load_session devuelve el mismo df_final (valores y dtypes)"""
+    ok, _ = sm.save_session(df_final, "Meta")
+    assert ok
+
+    loaded, meta, _ = sm.load_session()
+    assert meta == "Meta"
+    pd.testing.assert_frame_equal(loaded, df_final.reset_index(drop=True))
+
+
+def test_tracking_values_survive_round_trip(df_final, session_paths):
+    """Los estados que escribe la app (hora de envío, bloqueos, reset) no se pierden al recargar"""
+    app_values = ["ENVIADO (09:30)", "BLOQUEADO (09:31)", "SIN DATOS", "", "FALLIDO"]
+    df_final.loc[df_final.index[:len(app_values)], 'ESTADO_EMAIL'] = app_values
+    assert df_final['ESTADO_EMAIL'].dtype == TEXT_DTYPE
+
+    ok, _ = sm.save_session(apply_output_schema(df_final), "Meta")
+    assert ok
+    loaded, _, _ = sm.load_session()
+    assert loaded['ESTADO_EMAIL'].iloc[:len(app_values)].tolist() == app_values
+    assert loaded['ESTADO_EMAIL'].iloc[len(app_values):].eq("PENDIENTE").all()
+
+
+def test_excel_export_with_null_dates(df_final):
+    df_final.loc[df_final.index[0], 'FECH VENC'] = None
+    assert df_final['FECH VENC'].isna().any()
+    assert generate_excel(df_final)[:2] == b"PK"
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
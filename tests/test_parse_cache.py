@@ -0,0 +1,101 @@
+"""
+Tests de la Caché de Archivos Parseados (utils/parse_cache.py)
+Acierto por contenido, fidelidad del DataFrame, expulsión LRU y reuso en el pipeline.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import utils.incremental as inc
+import utils.processing as proc
+from utils import parse_cache
+from tests.fixtures.synthetic_data import create_synthetic_raw_inputs
+
+
+@pytest.fixture
+def input_files(tmp_path):
+    df_ctas, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=40)
+    paths = {}
+    for name, df in (('ctas', df_ctas), ('cartera', df_cartera), ('cobranza', df_cobranza)):
+        paths[name] = tmp_path / f"{name}.xlsx"
+        df.to_excel(paths[name], index=False)
+    return paths
+
+
+def test_store_and_load_roundtrip_parquet():
+    df = pd.DataFrame({'codcli': ['002', np.nan, '15'], 'sldacl': [1.5, 2.0, np.nan]})
+    parse_cache.store("parsed_ctas", "abc123", df)
+
+    loaded = parse_cache.load("parsed_ctas", "abc123")
+    assert any(name.endswith('.parquet') for name in os.listdir(parse_cache.CACHE_DIR))
+    pd.testing.assert_frame_equal(loaded, df)
+    assert parse_cache.load("parsed_ctas", "otro") is None
+
+
+def test_mixed_columns_fall_back_to_pickle():
+    df = pd.DataFrame({'codcli': [2, 'A15', np.nan]})
+    parse_cache.store("parsed_cartera", "mix", df)
+
+    assert any(name.endswith('.pkl') for name in os.listdir(parse_cache.CACHE_DIR))
+    pd.testing.assert_frame_equal(parse_cache.load("parsed_cartera", "mix"), df)
+
+
+def test_eviction_keeps_recently_used_entries(monkeypatch):
+    df = pd.DataFrame({'x': np.arange(2_000, dtype='float64')})
+    for i, key in enumerate(('a', 'b', 'c')):
+        parse_cache.store("ns", key, df)
+        path = [p for _, _, p in parse_cache._entries() if f"_{key}." in p][0]
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+
+    # 'a' es la más antigua pero se vuelve a usar: la expulsada debe ser 'b'
+    assert parse_cache.load("ns", "a") is not None
+    entry_size = max(size for _, size, _ in parse_cache._entries())
+    parse_cache.evict(max_bytes=2 * entry_size)
+
+    assert parse_cache.load("ns", "b") is None
+    assert parse_cache.load("ns", "a") is not None
+    assert parse_cache.load("ns", "c") is not None
+
+
+def test_read_input_files_skips_parse_on_same_content(input_files, monkeypatch):
+    files = {kind: str(path) for kind, path in input_files.items()}
+    first = proc.read_input_files(files, parallel=False)
+
+    calls = []
+    original = proc.read_input_file
+    monkeypatch.setattr(proc, "read_input_file", lambda *a, **k: calls.append(a) or original(*a, **k))
+    second = proc.read_input_files(files, parallel=False)
+
+    assert calls == []
+    for kind in files:
+        pd.testing.assert_frame_equal(second[kind], first[kind])
+
+
+def test_incremental_reuses_older_cartera(tmp_path, input_files, monkeypatch):
+    monkeypatch.setattr(inc, "PIPELINE_DIR", str(tmp_path / "pipeline"))
+    monkeypatch.setattr(inc, "STATE_FILE", str(tmp_path / "pipeline" / "state.json"))
+    run = lambda cartera: inc.process_files_incremental(
+        str(input_files['ctas']), str(cartera), str(input_files['cobranza']))
+
+    # Cartera A → Cartera B → Cartera A de nuevo
+    cartera_b = tmp_path / "cartera_b.xlsx"
+    df_cartera = proc.read_input_file(input_files['cartera'], 'cartera')
+    df_cartera.assign(nota='Nota B').to_excel(cartera_b, index=False)
+
+    df_a, _ = run(input_files['cartera'])
+    run(cartera_b)
+    df_a2, info = run(input_files['cartera'])
+
+    assert 'cartera' in info['reused']
+    pd.testing.assert_frame_equal(df_a2, df_a)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
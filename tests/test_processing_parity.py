@@ -0,0 +1,89 @@
+"""
+Parity Tests: Motor Columnar vs Implementación Fila-a-Fila
+Valida celda por celda que process_data (vectorizado) produce exactamente
+el mismo df_final que la implementación legacy basada en apply(axis=1).
+Las columnas *_DISPLAY del legacy se comparan contra format_display_columns.
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.processing import process_data, format_display_columns, DISPLAY_CURRENCY_COLS
+from tests.fixtures import legacy_processing
+from tests.fixtures.synthetic_data import create_synthetic_raw_inputs
+
+
+def _run_both(df_ctas, df_cartera, df_cobranza):
+    expected = legacy_processing.process_data(df_ctas.copy(), df_cartera.copy(), df_cobranza.copy())
+    actual = process_data(df_ctas.copy(), df_cartera.copy(), df_cobranza.copy())
+    return expected.reset_index(drop=True), actual.reset_index(drop=True)
+
+
+def _assert_cell_parity(expected, actual):
+    # Los *_DISPLAY ya no se materializan en df_final: se comparan contra la capa de presentación
+    display = format_display_columns(actual)
+    for col in DISPLAY_CURRENCY_COLS:
+        assert display[col].tolist() == expected.pop(f"{col}_DISPLAY").tolist(), f"Formato distinto en {col}"
+
+    assert list(actual.columns) == list(expected.columns), "Columnas finales deben coincidir en nombre y orden"
+    assert len(actual) == len(expected), "Cantidad de filas debe coincidir"
+
+    for col in expected.columns:
+        for idx, (exp, act) in enumerate(zip(expected[col].tolist(), actual[col].tolist())):
+            if not isinstance(exp, str) and pd.isna(exp):
+                assert pd.isna(act), f"[{col}] fila {idx}: esperado NaN/NaT, obtenido {act!r}"
+            else:
+                assert exp == act, f"[{col}] fila {idx}: esperado {exp!r}, obtenido {act!r}"
+
+
+@pytest.mark.parametrize("seed", [7, 11, 23])
+def test_parity_synthetic_inputs(seed):
+    """El motor columnar replica exactamente la salida legacy en datos sintéticos con casos borde"""
+    expected, actual = _run_both(*create_synthetic_raw_inputs(num_docs=80, seed=seed))
+    _assert_cell_parity(expected, actual)
+
+
+def test_parity_numeric_dtypes():
+    """Las columnas numéricas mantienen el mismo dtype que la versión fila-a-fila"""
+    expected, actual = _run_both(*create_synthetic_raw_inputs())
+    for col in ['DETRACCIÓN', 'SALDO REAL', 'DÍAS MORA']:
+        assert actual[col].dtype == expected[col].dtype, f"dtype distinto en {col}"
+
+
+def test_parity_without_optional_columns():
+    """Sin tipped/mondoc en Ctas y sin telefono/email/nota en Cartera, la salida sigue siendo idéntica"""
+    df_ctas, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=30)
+    df_ctas = df_ctas.drop(columns=['tipped', 'mondoc'])
+    df_cartera = df_cartera[['codigo_cliente']]
+
+    expected, actual = _run_both(df_ctas, df_cartera, df_cobranza)
+    _assert_cell_parity(expected, actual)
+
+
+def test_parity_without_matching_dt_payments():
+    """Si ningún pago DT cruza con Ctas, todas las detracciones se calculan por regla de negocio"""
+    df_ctas, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=30)
+    df_cobranza.loc[df_cobranza['forpag'] == 'DT', 'coddoc'] = "99"
+
+    expected, actual = _run_both(df_ctas, df_cartera, df_cobranza)
+    _assert_cell_parity(expected, actual)
+
+
+def test_display_columns_are_lazy():
+    """df_final no guarda *_DISPLAY; el formato se genera bajo demanda sin modificar el SSOT"""
+    df_final = process_data(*create_synthetic_raw_inputs(num_docs=20))
+    assert not [c for c in df_final.columns if c.endswith('_DISPLAY')]
+
+    subset = df_final.head(5)
+    display = format_display_columns(subset)
+    assert display['SALDO'].str.match(r'^(S/|\$) [\d,]+\.\d{2}$|^-$').all()
+    assert df_final['SALDO'].dtype == float
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,105 @@
+"""
+Tests de Vistas del Reporte General (utils/report_views.py)
+Filtros, KPIs por moneda y memoización por sesión (ViewCache).
+"""
+
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import utils.report_views as rv
+from utils.processing import process_data
+from tests.fixtures.synthetic_data import create_synthetic_raw_inputs
+
+
+@pytest.fixture(scope="module")
+def df_final():
+    return process_data(*create_synthetic_raw_inputs(num_docs=80))
+
+
+def test_no_filters_returns_own_copy(df_final):
+    df = rv.apply_filters(df_final, {'estado': "Todos", 'moneda': "Todos", 'saldo_op': "Todos"})
+    pd.testing.assert_frame_equal(df, df_final)
+    assert df is not df_final
+
+
+def test_filters_combine_with_and(df_final):
+    empresa = df_final['EMPRESA'].astype(str).iloc[0]
+    moneda = df_final['MONEDA'].astype(str).iloc[0]
+    filters = {'empresas': [empresa], 'moneda': moneda, 'saldo_op': "Mayor que", 'saldo_ref': 0.0, 'has_email': True}
+
+    df = rv.apply_filters(df_final, filters)
+
+    expected = df_final[
+        (df_final['EMPRESA'].astype(str) == empresa) & (df_final['MONEDA'].astype(str) == moneda)
+        & (df_final['SALDO REAL'].round(2) > 0) & df_final['CORREO'].notna() & (df_final['CORREO'].str.strip() != '')
+    ]
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_search_matches_comprobante(df_final):
+    row = df_final.iloc[0]
+    df = rv.apply_filters(df_final, {'search': str(row['COMPROBANTE'])})
+    assert row['MATCH_KEY'] in set(df['MATCH_KEY'])
+
+
+def test_search_matches_raw_amounts(df_final):
+    """El monto sin formato ("1500.5") encuentra la fila igual que el formateado ("1,500.50")"""
+    df = df_final.copy()  # El fixture es del módulo: no modificarlo
+    df.loc[df.index[0], 'SALDO'] = 1500.5
+    key = df['MATCH_KEY'].iloc[0]
+    for term in ("1500.5", "1,500.50"):
+        assert key in set(rv.apply_filters(df, {'search': term})['MATCH_KEY'])
+
+
+def test_kpi_totals_split_by_currency(df_final):
+    kpis = rv.kpi_totals(df_final)
+    is_soles = df_final['MONEDA'].astype(str).str.startswith('S')
+    assert kpis['count_s'] + kpis['count_d'] == len(df_final)
+    assert kpis['t_real_s'] == pytest.approx(df_final.loc[is_soles, 'SALDO REAL'].sum())
+    assert kpis['t_detru_global_s'] == pytest.approx(df_final['DETRACCIÓN'].sum())
+
+
+def test_currency_totals_text_single_currency(df_final):
+    """Cliente con documentos en una sola moneda: sin parte en cero para la otra (MONEDA categórica)"""
+    is_soles = df_final['MONEDA'].astype(str).str.startswith('S')
+    docs_cli = df_final[is_soles].head(3)
+    assert isinstance(docs_cli['MONEDA'].dtype, pd.CategoricalDtype)
+
+    text = rv.currency_totals_text(docs_cli)
+    assert text == f"S/ {docs_cli['SALDO REAL'].sum():,.2f} (03 documentos)"
+    assert rv.currency_totals_text(docs_cli.head(0)) == "0.00"
+
+
+def test_view_cache_hits_until_source_changes(df_final):
+    cache = rv.ViewCache(max_entries=2)
+    calls = []
+
+    def compute(tag):
+        calls.append(tag)
+        return tag
+
+    key = rv.filters_key({'empresas': ['A'], 'moneda': "Todos"})
+    assert cache.get(df_final, key, lambda: compute(1)) == 1
+    assert cache.get(df_final, key, lambda: compute(2)) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Otro df_final (nuevo ciclo, mora recalculada): todo se recalcula
+    assert cache.get(df_final.copy(), key, lambda: compute(3)) == 3
+
+    # Modificación en el lugar: la app invalida explícitamente
+    cache.invalidate()
+    other = df_final.copy()
+    cache.get(other, key, lambda: compute(4))
+    cache.get(other, 'b', lambda: compute(5))
+    cache.get(other, 'c', lambda: compute(6))  # expulsa la menos usada (key)
+    cache.get(other, key, lambda: compute(7))
+    assert calls == [1, 3, 4, 5, 6, 7]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
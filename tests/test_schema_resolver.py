@@ -0,0 +1,142 @@
+"""
+Tests del Resolutor de Esquema de Archivos de Entrada
+"""
+
+import os
+import sys
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import schema_resolver as sr
+from utils.processing import read_input_file, build_cartera_dimension, process_data, preflight_check
+from tests.fixtures.synthetic_data import create_synthetic_raw_inputs
+
+
+def _write(tmp_path, name, df):
+    path = tmp_path / f"{name}.xlsx"
+    df.to_excel(path, index=False)
+    return str(path)
+
+
+def test_aliases_and_header_normalization():
+    schema = sr.resolve_columns('cartera', ['CODIGO_CLIENTE', ' Correo ', 'Nota', 'ENVIAR EMAIL', 'extra'])
+    assert schema.mapping == {
+        'codigo_cliente': 'CODIGO_CLIENTE', 'email': ' Correo ', 'nota': 'Nota', 'enviar_email': 'ENVIAR EMAIL',
+    }
+    assert schema.missing == ()
+
+
+def test_candidate_priority():
+    """Clave de Cartera: codcli gana sobre codigo_cliente; email: la primera columna candidata"""
+    schema = sr.resolve_columns('cartera', ['codigo_cliente', 'MAIL', 'codcli', 'email'])
+    assert schema.mapping['codigo_cliente'] == 'codcli'
+    assert schema.mapping['email'] == 'MAIL'
+
+
+def test_resolution_is_cached_by_signature():
+    columns = ['codcli', 'nomcli', 'fecdoc', 'fecvct', 'codmnd', 'tipcam', 'mododo', 'sldacl', 'x_cache']
+    sr.resolve_columns('ctas', columns)
+    hits = sr.cache_info().hits
+    assert sr.resolve_columns('ctas', list(columns)) is sr.resolve_columns('ctas', pd.Index(columns))
+    assert sr.cache_info().hits == hits + 2
+
+
+def test_missing_required_rejected_before_full_parse(tmp_path):
+    df_ctas, _, _ = create_synthetic_raw_inputs(num_docs=10)
+    path = _write(tmp_path, "ctas", df_ctas.drop(columns=['codcli', 'sldacl']))
+
+    with mock.patch("utils.processing.pd.read_excel", wraps=pd.read_excel) as read_excel:
+        with pytest.raises(sr.SchemaError, match="'codcli', 'sldacl'.*CtasxCobrar"):
+            read_input_file(path, 'ctas')
+    assert read_excel.call_count == 1
+    assert read_excel.call_args.kwargs.get('nrows') == 0
+
+
+def test_read_prunes_renames_and_types_columns(tmp_path):
+    _, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=10)
+    df_cobranza['columna_irrelevante'] = 1
+
+    cobranza = read_input_file(_write(tmp_path, "cob", df_cobranza), 'cobranza')
+    assert 'columna_irrelevante' not in cobranza.columns
+    assert cobranza['codbco'].iloc[0] == "002"  # Texto: se conservan ceros a la izquierda
+
+    cartera = read_input_file(_write(tmp_path, "cart", df_cartera), 'cartera')
+    assert list(cartera.columns) == ['codigo_cliente', 'telefono', 'email', 'nota', 'enviar_email']
+
+
+def test_empty_cobranza_sheet_is_accepted(tmp_path):
+    assert read_input_file(_write(tmp_path, "cob", pd.DataFrame()), 'cobranza').empty
+
+
+def test_pipeline_accepts_resolved_files(tmp_path):
+    raw = create_synthetic_raw_inputs(num_docs=30)
+    frames = [read_input_file(_write(tmp_path, k, df), k) for k, df in zip(('ctas', 'cartera', 'cobranza'), raw)]
+    df_final = process_data(*frames)
+    assert len(df_final) > 0
+    assert df_final['CORREO'].str.contains('@').any()
+
+
+def test_cartera_dimension_with_uppercase_headers():
+    _, df_cartera, _ = create_synthetic_raw_inputs()
+    upper = df_cartera.rename(columns=lambda c: c.strip().upper())
+    pd.testing.assert_frame_equal(build_cartera_dimension(upper), build_cartera_dimension(df_cartera.copy()))
+
+
+def _write_inputs(tmp_path, raw):
+    return {k: _write(tmp_path, k, df) for k, df in zip(('ctas', 'cartera', 'cobranza'), raw)}
+
+
+def test_guess_kind_prefers_most_specific_schema():
+    df_ctas, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=5)
+    assert sr.guess_kind(df_ctas.columns) == 'ctas'  # también trae CODCLI (clave de Cartera)
+    assert sr.guess_kind(df_cartera.columns) == 'cartera'
+    assert sr.guess_kind(df_cobranza.columns) == 'cobranza'
+    assert sr.guess_kind(['foo', 'bar']) is None
+
+
+def test_preflight_accepts_valid_files(tmp_path):
+    assert preflight_check(_write_inputs(tmp_path, create_synthetic_raw_inputs(num_docs=10))) == []
+
+
+def test_preflight_reports_all_problems_at_once(tmp_path):
+    df_ctas, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=10)
+    paths = _write_inputs(tmp_path, (df_ctas, df_cartera, df_cobranza))
+    # Cobranza subida en el casillero de CtasxCobrar, Cartera sin clave y Cobranza duplicada en otro casillero
+    files = {
+        'ctas': paths['cobranza'],
+        'cartera': _write(tmp_path, "cart_bad", df_cartera.drop(columns=['codigo_cliente'])),
+        'cobranza': paths['cobranza'],
+    }
+    problems = preflight_check(files)
+
+    assert problems == [
+        "CtasxCobrar: el archivo parece ser Cobranza",
+        "Cartera: faltan las columnas 'codigo_cliente'",
+        "Cobranza: es el mismo archivo subido como CtasxCobrar",
+    ]
+
+
+def test_preflight_checks_sample_types(tmp_path):
+    df_ctas, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=10)
+    df_ctas = df_ctas.assign(sldacl='N/D', fecvct='sin fecha')
+    problems = preflight_check(_write_inputs(tmp_path, (df_ctas, df_cartera, df_cobranza)))
+
+    assert problems == [
+        "CtasxCobrar: la columna 'fecvct' no parece de fechas (ej. 'sin fecha')",
+        "CtasxCobrar: la columna 'sldacl' no parece numérica (ej. 'N/D')",
+    ]
+
+
+def test_preflight_reads_only_a_sample(tmp_path):
+    paths = _write_inputs(tmp_path, create_synthetic_raw_inputs(num_docs=10))
+    with mock.patch("utils.processing.pd.read_excel", wraps=pd.read_excel) as read_excel:
+        preflight_check(paths, sample_rows=5)
+    assert all(call.kwargs.get('nrows') == 5 for call in read_excel.call_args_list)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
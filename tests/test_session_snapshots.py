@@ -0,0 +1,273 @@
+"""
+Tests de Snapshots de Sesión (utils/state_manager.py)
+Escritura atómica, generaciones, metadatos en el footer Parquet, lectura con memory map,
+log de tracking append-only y sesiones por operador y ciclo con expulsión LRU.
+"""
+
+import json
+import os
+import sys
+from unittest import mock
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import utils.state_manager as sm
+from utils.processing import process_data
+from tests.fixtures.synthetic_data import create_synthetic_raw_inputs
+
+
+@pytest.fixture
+def session_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(sm, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(sm, "SESSION_FILE", str(tmp_path / "current_session.parquet"))
+    monkeypatch.setattr(sm, "META_FILE", str(tmp_path / "session_meta.txt"))
+    return tmp_path / "sessions"
+
+
+@pytest.fixture
+def df_final():
+    return process_data(*create_synthetic_raw_inputs(num_docs=40))
+
+
+def test_roundtrip_with_footer_metadata(session_dir, df_final):
+    ok, _ = sm.save_session(df_final, "Archivos cargados")
+    assert ok
+
+    [path] = sm._snapshot_paths()
+    footer = json.loads(pq.read_schema(path).metadata[sm.SESSION_META_KEY])
+    assert footer['schema_version'] == sm.SESSION_SCHEMA_VERSION
+    assert footer['rows'] == len(df_final)
+    assert not os.path.exists(os.path.join(sm.CACHE_DIR, "session_meta.txt"))
+
+    df, meta, saved_at = sm.load_session()
+    pd.testing.assert_frame_equal(df, df_final)
+    assert meta == "Archivos cargados"
+    assert sm.has_valid_session() == (True, saved_at, "Archivos cargados")
+
+
+def test_keeps_configured_generations(session_dir, df_final, monkeypatch):
+    monkeypatch.setattr(sm, "SESSION_GENERATIONS", 2)
+    for i in range(4):
+        sm.save_session(df_final.head(i + 1), f"gen {i}")
+
+    assert [s['meta'] for s in sm.list_sessions()] == ["gen 3", "gen 2"]
+    assert len(sm.load_session(generation=1)[0]) == 3
+
+
+def test_failed_write_keeps_previous_snapshot(session_dir, df_final):
+    sm.save_session(df_final, "bueno")
+    with mock.patch.object(sm.pq, "write_table", side_effect=OSError("disco lleno")):
+        ok, msg = sm.save_session(df_final.head(1), "incompleto")
+
+    assert not ok and "disco lleno" in msg
+    cycle_dir = os.path.dirname(sm._snapshot_paths()[0])
+    assert [f for f in os.listdir(cycle_dir) if f != sm.LAST_USED_FILE] == [os.path.basename(sm._snapshot_paths()[0])]
+    assert sm.load_session()[1] == "bueno"
+
+
+def test_corrupt_snapshot_falls_back_to_previous(session_dir, df_final):
+    sm.save_session(df_final, "anterior")
+    sm.save_session(df_final, "dañado")
+    with open(sm._snapshot_paths()[0], 'wb') as f:
+        f.write(b"no es parquet")
+
+    df, meta, _ = sm.load_session()
+    assert meta == "anterior"
+    assert len(df) == len(df_final)
+
+
+def test_reads_legacy_session(session_dir, df_final):
+    df_final.to_parquet(sm.SESSION_FILE, index=False)
+    with open(sm.META_FILE, 'w', encoding='utf-8') as f:
+        f.write("2025-03-01T08:00:00|Sesión anterior")
+
+    df, meta, saved_at = sm.load_session()
+    pd.testing.assert_frame_equal(df, df_final)
+    assert meta == "Sesión anterior" and saved_at.hour == 8
+
+    assert sm.clear_session()
+    assert sm.has_valid_session() == (False, None, None)
+
+
+def test_snapshot_sorted_in_row_groups(session_dir, df_final, monkeypatch):
+    monkeypatch.setattr(sm, "SESSION_ROW_GROUP_ROWS", 10)
+    sm.save_session(df_final)
+
+    metadata = pq.ParquetFile(sm._snapshot_paths()[0]).metadata
+    empresa = metadata.schema.to_arrow_schema().get_field_index('EMPRESA')
+    bounds = [(metadata.row_group(i).column(empresa).statistics.min,
+               metadata.row_group(i).column(empresa).statistics.max) for i in range(metadata.num_row_groups)]
+    assert metadata.num_row_groups == -(-len(df_final) // 10)
+    assert all(prev[1] <= cur[0] for prev, cur in zip(bounds, bounds[1:]))
+
+    # Sigue siendo el mismo df_final, en el orden original
+    df, _, _ = sm.load_session()
+    pd.testing.assert_frame_equal(df, df_final)
+    assert df.attrs == df_final.attrs
+
+
+def test_query_session_projects_and_filters(session_dir, df_final, monkeypatch):
+    monkeypatch.setattr(sm, "SESSION_ROW_GROUP_ROWS", 10)
+    sm.save_session(df_final, "meta")
+    empresas = list(df_final['EMPRESA'].dropna().unique()[:2])
+
+    df, meta, _ = sm.query_session(columns=['COD CLIENTE', 'SALDO REAL', 'NO_EXISTE'], filters={'EMPRESA': empresas})
+
+    expected = df_final.loc[df_final['EMPRESA'].isin(empresas), ['COD CLIENTE', 'SALDO REAL']].reset_index(drop=True)
+    pd.testing.assert_frame_equal(df, expected)
+    assert meta == "meta"
+
+
+def test_query_session_on_legacy_file(session_dir, df_final):
+    df_final.to_parquet(sm.SESSION_FILE, index=False)
+    with open(sm.META_FILE, 'w', encoding='utf-8') as f:
+        f.write("2025-03-01T08:00:00|Sesión anterior")
+    empresa = df_final['EMPRESA'].iloc[0]
+
+    df, _, _ = sm.query_session(columns=['EMPRESA'], filters={'EMPRESA': empresa})
+    assert len(df) == (df_final['EMPRESA'] == empresa).sum()
+    assert list(df.columns) == ['EMPRESA']
+
+
+def _sent(df_final, rows, ts="2025-03-31 10:00:00"):
+    return [{'MATCH_KEY': df_final.loc[i, 'MATCH_KEY'], 'COD CLIENTE': df_final.loc[i, 'COD CLIENTE'],
+             'ESTADO_EMAIL': "ENVIADO", 'FECHA_ULTIMO_ENVIO': ts} for i in rows]
+
+
+def test_tracking_log_survives_restore(session_dir, df_final):
+    sm.save_session(df_final, "meta")
+    snapshot = sm._snapshot_paths()[0]
+    mtime = os.path.getmtime(snapshot)
+
+    assert sm.append_tracking(_sent(df_final, [0, 3])) == 2
+    assert sm.append_tracking(_sent(df_final, [3], ts="2025-03-31 11:00:00")) == 1
+
+    df, _, _ = sm.load_session()
+    expected = df_final.copy()
+    for i, ts in ((0, "2025-03-31 10:00:00"), (3, "2025-03-31 11:00:00")):
+        mask = (df_final['MATCH_KEY'] == df_final.loc[i, 'MATCH_KEY']) & (df_final['COD CLIENTE'] == df_final.loc[i, 'COD CLIENTE'])
+        expected.loc[mask, 'ESTADO_EMAIL'] = "ENVIADO"
+        expected.loc[mask, 'FECHA_ULTIMO_ENVIO'] = ts
+    pd.testing.assert_frame_equal(df, expected)
+    assert os.path.getmtime(snapshot) == mtime  # el snapshot no se reescribe
+
+    # Lectura proyectada: el log se aplica aunque no se pidan las columnas clave
+    df_cols, _, _ = sm.query_session(columns=['ESTADO_EMAIL'])
+    pd.testing.assert_series_equal(df_cols['ESTADO_EMAIL'], expected['ESTADO_EMAIL'])
+
+
+def test_torn_log_line_is_ignored(session_dir, df_final):
+    sm.save_session(df_final)
+    sm.append_tracking(_sent(df_final, [1]))
+    with open(sm._tracking_log_path(sm._snapshot_paths()[0]), 'a', encoding='utf-8') as f:
+        f.write('"F001-1","00')  # escritura cortada
+
+    df, _, _ = sm.load_session()
+    assert (df['ESTADO_EMAIL'] == "ENVIADO").sum() >= 1
+
+
+def test_compaction_folds_log_into_new_generation(session_dir, df_final, monkeypatch):
+    monkeypatch.setattr(sm, "TRACKING_COMPACT_ENTRIES", 3)
+    sm.save_session(df_final, "meta")
+    _, _, started = sm.load_session()
+
+    sm.append_tracking(_sent(df_final, [0, 1]))
+    assert len(sm._snapshot_paths()) == 1
+    sm.append_tracking(_sent(df_final, [2, 3]))
+
+    newest = sm._snapshot_paths()[0]
+    assert len(sm._snapshot_paths()) == 2
+    assert not os.path.exists(sm._tracking_log_path(newest))
+    df, meta, saved_at = sm.load_session()
+    assert (meta, saved_at) == ("meta", started)
+    assert set(df.loc[[0, 1, 2, 3], 'ESTADO_EMAIL']) == {"ENVIADO"}
+
+
+def test_reopening_same_generation_is_served_from_memory(session_dir, df_final):
+    sm.save_session(df_final, "meta")
+    df_a, _, _ = sm.load_session()
+    with mock.patch.object(sm.pq, "read_table", side_effect=AssertionError("relectura de disco")):
+        df_b, meta, _ = sm.load_session()
+    pd.testing.assert_frame_equal(df_b, df_final)
+    assert meta == "meta"
+
+    # Cada llamador recibe su propia copia
+    df_a.loc[0, 'ESTADO_EMAIL'] = "ENVIADO"
+    assert sm.load_session()[0].loc[0, 'ESTADO_EMAIL'] != "ENVIADO"
+
+    # Un envío registrado en el log es otra generación: se vuelve a leer
+    sm.append_tracking(_sent(df_final, [0]))
+    assert sm.load_session()[0].loc[0, 'ESTADO_EMAIL'] == "ENVIADO"
+
+
+def test_cycles_and_operators_do_not_overwrite(session_dir, df_final):
+    sm.save_session(df_final, "ana ciclo 1", cycle_id="c1", operator="ana")
+    sm.save_session(df_final.head(5), "luis ciclo 1", cycle_id="c1", operator="luis")
+    sm.save_session(df_final.head(3), "ana ciclo 2", cycle_id="c2", operator="ana")
+
+    assert sm.load_session(operator="ana")[1] == "ana ciclo 2"  # el último usado
+    assert len(sm.load_session(cycle_id="c1", operator="ana")[0]) == len(df_final)
+    assert sm.load_session(operator="luis")[1] == "luis ciclo 1"
+    assert sm.load_session(cycle_id="no_existe", operator="ana") == (None, None, None)
+
+    # Abrir un ciclo lo vuelve el más reciente del índice
+    assert [c['cycle_id'] for c in sm.list_cycles("ana")] == ["c1", "c2"]
+    assert sm.current_cycle("ana") == "c1"
+    assert {(c['operator'], c['cycle_id']) for c in sm.list_cycles()} == {("ana", "c1"), ("ana", "c2"), ("luis", "c1")}
+
+    sm.append_tracking(_sent(df_final, [0]), cycle_id="c1", operator="luis")
+    assert sm.load_session(cycle_id="c1", operator="ana")[0].loc[0, 'ESTADO_EMAIL'] != "ENVIADO"
+    assert sm.load_session(cycle_id="c1", operator="luis")[0].loc[0, 'ESTADO_EMAIL'] == "ENVIADO"
+
+
+@pytest.mark.parametrize("name", ["..", ".", "...", ".oculto", "", None])
+def test_unsafe_operator_and_cycle_names_stay_inside_sessions(session_dir, df_final, name):
+    ok, _ = sm.save_session(df_final, "Meta", cycle_id=name, operator=name)
+    assert ok
+    assert [(c['operator'], c['cycle_id']) for c in sm.list_cycles()] == [(sm.DEFAULT_OPERATOR, sm.DEFAULT_CYCLE)]
+
+    # Limpiar el "operador" '..' no borra nada fuera de sessions/
+    (session_dir.parent / "otro.txt").write_text("x")
+    assert sm.clear_session(operator=name)
+    assert (session_dir.parent / "otro.txt").exists()
+    assert sm.list_cycles() == []
+
+
+def test_session_paths_outside_root_are_rejected(session_dir):
+    with pytest.raises(ValueError):
+        sm._inside_sessions(str(session_dir))
+    with pytest.raises(ValueError):
+        sm._inside_sessions(str(session_dir.parent / "parsed"))
+    assert sm._cycle_dir("c1", "ana").startswith(str(session_dir))
+
+
+def test_evicts_least_recently_used_cycles(session_dir, df_final, monkeypatch):
+    for i in range(3):
+        sm.save_session(df_final, f"ciclo {i}", cycle_id=f"c{i}")
+        os.utime(os.path.join(sm._cycle_dir(f"c{i}"), sm.LAST_USED_FILE), (1000 + i, 1000 + i))
+    sm.load_session(cycle_id="c0")  # c0 pasa a ser el más reciente; c1 el más antiguo
+    cycle_bytes = max(c['bytes'] for c in sm.list_cycles())
+
+    monkeypatch.setattr(sm, "MAX_SESSION_BYTES", int(cycle_bytes * 3.5))
+    sm.save_session(df_final, "ciclo 3", cycle_id="c3")
+
+    assert sorted(c['cycle_id'] for c in sm.list_cycles()) == ["c0", "c2", "c3"]
+    assert sm.evict_cycles(max_bytes=0, keep=sm._cycle_dir("c3")) > 0
+    assert [c['cycle_id'] for c in sm.list_cycles()] == ["c3"]
+
+
+def test_flat_layout_moves_to_default_cycle(session_dir, df_final):
+    sm.save_session(df_final, "sin ciclo")
+    path = sm._snapshot_paths()[0]
+    os.replace(path, session_dir / os.path.basename(path))
+
+    assert sm.load_session()[1] == "sin ciclo"
+    assert sm.current_cycle() == sm.DEFAULT_CYCLE
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
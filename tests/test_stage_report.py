@@ -0,0 +1,92 @@
+"""
+Tests de Instrumentación por Etapa (StageReport)
+"""
+
+import os
+import sys
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.processing import process_data, load_data
+from utils.stage_report import StageReport, stage
+from tests.fixtures.synthetic_data import create_synthetic_raw_inputs
+
+
+def _to_xlsx(df):
+    buffer = BytesIO()
+    df.to_excel(buffer, index=False)
+    buffer.seek(0)
+    return buffer
+
+
+def test_process_data_reports_every_stage():
+    report = StageReport(track_memory=True)
+    df_ctas, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=50)
+    df_final = process_data(df_ctas, df_cartera, df_cobranza, report=report)
+
+    frame = report.to_frame()
+    assert frame['etapa'].tolist() == [
+        'normalizar_claves', 'dimension_cartera', 'merge_cartera',
+        'agrupar_cobranza', 'enriquecer_documentos', 'aging',
+    ]
+    assert frame.loc[frame['etapa'] == 'aging', 'nivel'].item() == 1
+    assert frame.loc[frame['etapa'] == 'enriquecer_documentos', 'rows_out'].item() == len(df_final)
+    assert (frame['wall_s'] >= 0).all() and (frame['cpu_s'] >= 0).all()
+    assert frame['peak_mb'].notna().all()
+
+
+def test_merge_fan_out_is_flagged():
+    """Clientes duplicados en Cartera multiplican filas en el merge: se reporta como alerta"""
+    report = StageReport(track_memory=False)
+    process_data(*create_synthetic_raw_inputs(num_docs=50), report=report)
+    assert any(alert.startswith("merge_cartera") for alert in report.warnings())
+
+
+def test_load_data_reports_parse_stages():
+    report = StageReport(track_memory=False)
+    raw = create_synthetic_raw_inputs(num_docs=20)
+    df_ctas, df_cartera, df_cobranza, error = load_data(*[_to_xlsx(df) for df in raw], report=report)
+
+    assert error is None
+    assert report.to_frame()['etapa'].tolist() == ['parse_archivos']
+    assert report.stages[0]['rows_out'] == len(df_ctas) + len(df_cartera) + len(df_cobranza)
+
+
+def test_nested_peak_includes_child():
+    report = StageReport(track_memory=True)
+    with report.stage("padre"):
+        with report.stage("hija"):
+            block = np.ones(2_000_000)  # ~16 MB
+            del block
+    padre, hija = report.stages
+    assert hija['peak_mb'] >= 15
+    assert padre['peak_mb'] >= hija['peak_mb']
+
+
+def test_memory_tracking_is_off_by_default():
+    report = StageReport()
+    process_data(*create_synthetic_raw_inputs(num_docs=10), report=report)
+    assert report.to_frame()['peak_mb'].isna().all()
+
+
+def test_stage_without_report_is_noop():
+    with stage(None, "x", 10) as record:
+        record['rows_out'] = 10
+    df_final = process_data(*create_synthetic_raw_inputs(num_docs=10))
+    assert not df_final.empty
+
+
+def test_report_log(caplog):
+    report = StageReport(track_memory=False)
+    process_data(*create_synthetic_raw_inputs(num_docs=10), report=report)
+    with caplog.at_level("INFO", logger="utils.stage_report"):
+        report.log()
+    assert "stage=normalizar_claves" in caplog.text
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,72 @@
+"""
+Tests del Modo Streaming (process_data_streaming)
+Valida que el dataset Parquet por bloques reproduce process_data y que los bloques
+respetan la partición por cliente.
+"""
+
+import os
+import sys
+from datetime import date
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.processing import process_data, normalize_ctas
+from utils.streaming import process_data_streaming, load_streaming_result, iter_client_chunks
+from tests.fixtures.synthetic_data import create_synthetic_raw_inputs
+
+CORTE = date(2025, 6, 30)
+
+
+@pytest.mark.parametrize("chunk_size", [7, 25, 1000])
+def test_streaming_matches_process_data(tmp_path, chunk_size):
+    df_ctas, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=80)
+    expected = process_data(df_ctas.copy(), df_cartera.copy(), df_cobranza.copy(), fecha_corte=CORTE)
+
+    info = process_data_streaming(df_ctas, df_cartera, df_cobranza, str(tmp_path / "out"),
+                                  chunk_size=chunk_size, fecha_corte=CORTE)
+    assert info['rows'] == len(expected)
+
+    result = load_streaming_result(info['path'])
+    pd.testing.assert_frame_equal(result, expected.reset_index(drop=True), check_categorical=False)
+
+
+def test_streaming_accepts_chunk_iterable(tmp_path):
+    df_ctas, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=50)
+    expected = process_data(df_ctas.copy(), df_cartera.copy(), df_cobranza.copy(), fecha_corte=CORTE)
+
+    raw_chunks = (df_ctas.iloc[i:i + 20] for i in range(0, len(df_ctas), 20))
+    info = process_data_streaming(raw_chunks, df_cartera, df_cobranza, str(tmp_path), chunk_size=10, fecha_corte=CORTE)
+
+    result = load_streaming_result(info['path'])
+    assert result['COMPROBANTE'].tolist() == expected['COMPROBANTE'].tolist()
+    assert result['SALDO REAL'].tolist() == expected['SALDO REAL'].tolist()
+
+
+def test_chunks_do_not_split_clients():
+    df_ctas, _, _ = create_synthetic_raw_inputs(num_docs=80)
+    df_ctas = normalize_ctas(df_ctas)
+
+    chunks = list(iter_client_chunks(df_ctas, chunk_size=6))
+    assert sum(len(c) for c in chunks) == len(df_ctas)
+    seen = set()
+    for chunk in chunks:
+        clients = set(chunk['codcli_key'])
+        assert not clients & seen, "Un cliente aparece en más de un bloque"
+        seen |= clients
+
+
+def test_rerun_replaces_previous_dataset(tmp_path):
+    df_ctas, df_cartera, df_cobranza = create_synthetic_raw_inputs(num_docs=40)
+    out = str(tmp_path / "out")
+    process_data_streaming(df_ctas, df_cartera, df_cobranza, out, chunk_size=5)
+    info = process_data_streaming(df_ctas.head(10), df_cartera, df_cobranza, out, chunk_size=1000)
+
+    assert info['parts'] == 1
+    assert len(load_streaming_result(out)) == info['rows']
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v", "--tb=short"])
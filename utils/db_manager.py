@@ -1,13 +1,196 @@
 import sqlite3
+import threading
 import pandas as pd
 import os
 import hashlib
-from datetime import datetime
+import json
+from datetime import date, datetime, time, timedelta, timezone
 
 DB_NAME = "email_ledger.db"
 
+# --- Conexiones del ledger (app, envío y consultas) ---
+# Una conexión por hilo y por archivo, reutilizada por las llamadas del mismo hilo: las consultas de un
+# rerun y todo un envío masivo. Streamlit ejecuta cada rerun en un hilo nuevo, así que entre reruns se
+# abre otra conexión (con el esquema ya migrado solo cuesta leer schema_version); no es un pool entre
+# sesiones. WAL: los lectores (estado de envío en cada rerun) no bloquean al envío y viceversa;
+# synchronous=NORMAL es seguro con WAL (un corte de luz puede perder la última transacción, no corromper).
+# Con busy_timeout, un escritor concurrente espera en lugar de fallar con "database is locked".
+JOURNAL_MODE = "WAL"
+BUSY_TIMEOUT_MS = 5000
+# Sentencias preparadas que conserva cada conexión (las consultas usan SQL fijo: se preparan una vez)
+STATEMENT_CACHE_SIZE = 128
+
+_local = threading.local()
+
+# --- Fechas del ledger ---
+# El envío guarda el texto de timestamp/last_sent_at en UTC sin zona (formato de datetime.utcnow()).
+# Desde la migración 3 cada fila expone además su instante en milisegundos epoch (columna calculada
+# desde ese texto e indexada): las consultas por día o sesión filtran por rango de enteros.
+# Las fechas de la app (el "hoy" del operador, el inicio de sesión, la hora que se muestra) son hora
+# local de LOCAL_TZ (None = zona del equipo); se convierten a epoch antes de consultar.
+LOCAL_TZ = None
+_EPOCH_MS_SQL = "CAST(ROUND((julianday({column}) - 2440587.5) * 86400000.0) AS INTEGER)"
+_MAX_EPOCH_MS = 2 ** 63 - 1
+
+# --- Migraciones del esquema del ledger ---
+# (versión, descripción, sentencias). Se aplican en orden y una sola vez por archivo; la versión
+# aplicada queda en schema_version. Para cambiar el esquema se agrega una migración al final
+# (nunca se edita una ya publicada).
+LEDGER_MIGRATIONS = [
+    (1, "Tablas base: estado anti-duplicado (TTL) + historial de intentos", [
+        '''CREATE TABLE IF NOT EXISTS ledger_last_send
+           (ledger_key TEXT PRIMARY KEY, last_sent_at TIMESTAMP, last_msg_id TEXT, send_count INTEGER)''',
+        # RC-FEAT-011: supervisor copies are logged in 'reason'/status (schema kept compatible)
+        '''CREATE TABLE IF NOT EXISTS send_attempts
+           (id TEXT PRIMARY KEY, ledger_key TEXT, recipient TEXT, status TEXT, reason TEXT, timestamp TIMESTAMP, run_id TEXT)''',
+    ]),
+    (2, "Índices de consulta: estado por destinatario, intentos por clave, estadísticas del día", [
+        "CREATE INDEX IF NOT EXISTS idx_send_attempts_recipient_ts ON send_attempts (recipient, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_send_attempts_ledger_key ON send_attempts (ledger_key)",
+        "CREATE INDEX IF NOT EXISTS idx_send_attempts_timestamp ON send_attempts (timestamp)",
+    ]),
+    (3, "Instante epoch (ms) indexado: consultas por día/sesión como rangos en lugar de LIKE sobre texto", [
+        # Columnas calculadas VIRTUAL: no cambian los INSERT posicionales existentes y se llenan solas
+        # también para filas anteriores y para escritores que solo conocen el texto
+        "ALTER TABLE send_attempts ADD COLUMN ts_epoch_ms INTEGER GENERATED ALWAYS AS "
+        f"({_EPOCH_MS_SQL.format(column='timestamp')}) VIRTUAL",
+        "ALTER TABLE ledger_last_send ADD COLUMN last_sent_epoch_ms INTEGER GENERATED ALWAYS AS "
+        f"({_EPOCH_MS_SQL.format(column='last_sent_at')}) VIRTUAL",
+        "CREATE INDEX IF NOT EXISTS idx_send_attempts_recipient_epoch ON send_attempts (recipient, ts_epoch_ms)",
+        "CREATE INDEX IF NOT EXISTS idx_send_attempts_epoch ON send_attempts (ts_epoch_ms)",
+        "CREATE INDEX IF NOT EXISTS idx_ledger_last_send_epoch ON ledger_last_send (last_sent_epoch_ms)",
+        # Reemplazados por los índices epoch (ninguna consulta filtra ya por el texto)
+        "DROP INDEX IF EXISTS idx_send_attempts_recipient_ts",
+        "DROP INDEX IF EXISTS idx_send_attempts_timestamp",
+    ]),
+]
+LEDGER_SCHEMA_VERSION = LEDGER_MIGRATIONS[-1][0]
+
+def schema_version(conn):
+    """Última migración aplicada (0 si el archivo no tiene schema_version)."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='schema_version'"
+    ).fetchone()
+    if not exists:
+        return 0
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+def migrate_ledger(conn=None, target_version=None):
+    """
+    Lleva el ledger a target_version (por defecto, la última). Cada migración corre en su propia
+    transacción con el lock de escritura tomado (BEGIN IMMEDIATE): si dos procesos migran a la vez,
+    el segundo ve la versión ya aplicada; si una sentencia falla, la migración completa se revierte.
+    Returns: versión final.
+    """
+    conn = conn or get_connection()
+    target_version = LEDGER_SCHEMA_VERSION if target_version is None else target_version
+    if schema_version(conn) >= target_version:
+        return schema_version(conn)
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                    (version INTEGER PRIMARY KEY, description TEXT, applied_at TEXT)''')
+    conn.commit()
+    for version, description, statements in LEDGER_MIGRATIONS:
+        if version > target_version:
+            break
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if schema_version(conn) >= version:
+                conn.rollback()
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute("INSERT INTO schema_version VALUES (?, ?, ?)",
+                         (version, description, datetime.now().isoformat(timespec='seconds')))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return schema_version(conn)
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, cached_statements=STATEMENT_CACHE_SIZE)
+    conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    migrate_ledger(conn)
+    return conn
+
+def _file_id(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_dev, stat.st_ino)
+
 def get_connection():
-    return sqlite3.connect(DB_NAME)
+    """
+    Conexión al ledger del hilo actual (se reutiliza mientras viva el hilo; no cerrarla).
+    Al abrirse aplica las migraciones pendientes (tablas e índices). Se reabre si el archivo fue borrado o reemplazado (reset manual, tests) o si alguien la cerró.
+    """
+    path = os.path.abspath(DB_NAME)
+    pool = _local.__dict__.setdefault('connections', {})
+    conn, file_id = pool.get(path, (None, None))
+    if conn is not None:
+        try:
+            conn.total_changes  # ProgrammingError si fue cerrada
+            if file_id is not None and _file_id(path) == file_id:
+                return conn
+        except sqlite3.ProgrammingError:
+            pass
+        _close_quietly(conn)
+    conn = _connect(path)
+    pool[path] = (conn, _file_id(path))
+    return conn
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+def close_connections():
+    """Cierra las conexiones del hilo actual (p. ej. antes de borrar o reemplazar el archivo del ledger)."""
+    for conn, _ in getattr(_local, 'connections', {}).values():
+        _close_quietly(conn)
+    _local.__dict__['connections'] = {}
+
+def to_epoch_ms(value):
+    """
+    Instante en ms epoch de un datetime, date o texto ISO ('YYYY-MM-DD HH:MM:SS').
+    Sin zona horaria se interpreta como hora local del operador (LOCAL_TZ).
+    """
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip())
+    elif not isinstance(value, datetime):
+        value = datetime.combine(value, time.min)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=LOCAL_TZ) if LOCAL_TZ else value.astimezone()
+    return round(value.timestamp() * 1000)
+
+def from_epoch_ms(epoch_ms):
+    """datetime en la zona del operador (LOCAL_TZ) de un instante en ms epoch."""
+    return datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc).astimezone(LOCAL_TZ)
+
+def day_range_ms(day=None):
+    """[inicio, fin) en ms epoch del día local `day` (date o 'YYYY-MM-DD'; por defecto hoy)."""
+    if day is None:
+        day = datetime.now(LOCAL_TZ).date()
+    elif isinstance(day, str):
+        day = date.fromisoformat(day.strip()[:10])
+    start = datetime.combine(day, time.min)
+    return to_epoch_ms(start), to_epoch_ms(start + timedelta(days=1))
+
+# Consultas de estado por lista de correos: la lista viaja como un solo parámetro JSON, así el SQL
+# es fijo (sentencia preparada reutilizada) y no hay límite de variables con listas grandes.
+# Día y sesión son el mismo rango [desde, hasta) sobre el índice (recipient, ts_epoch_ms).
+_STATUS_RANGE_SQL = """
+    SELECT recipient, status, timestamp, ts_epoch_ms
+    FROM send_attempts
+    WHERE recipient IN (SELECT value FROM json_each(?))
+    AND ts_epoch_ms >= ? AND ts_epoch_ms < ?
+    ORDER BY ts_epoch_ms ASC
+"""
 
 def get_full_ledger_df():
     """
@@ -17,7 +200,6 @@ def get_full_ledger_df():
         conn = get_connection()
         query = "SELECT * FROM ledger_last_send"
         df = pd.read_sql_query(query, conn)
-        conn.close()
         return df
     except Exception as e:
         print(f"DB Error: {e}")
@@ -25,74 +207,47 @@ def get_full_ledger_df():
 
 def get_status_map(email_list, target_date_str=None, min_timestamp=None):
     """
-    Returns a dictionary {email: {'status': 'SENT'|'FAILED', 'time': 'HH:MM', 'ts_raw': ...}}
+    Returns a dictionary {email: {'status': 'SENT'|'FAILED', 'time': 'HH:MM', 'ts_raw': ..., 'ts_local': ...}}
     for the given emails.
+    'time' y 'ts_local' ('YYYY-MM-DD HH:MM:SS') son hora local del operador; 'ts_raw' es el texto
+    guardado (UTC).
     
     Args:
         email_list (list): List of emails to check.
-        target_date_str (str): Optional. Filter by date string (YYYY-MM-DD). Default to Today if no min_timestamp provided.
-        min_timestamp (str/datetime): Optional. Only include records triggered AFTER this time.
-                                      Overrides target_date_str if provided.
+        target_date_str (str): Optional. Día local (YYYY-MM-DD). Default to Today if no min_timestamp provided.
+        min_timestamp (str/datetime): Optional. Only include records triggered AFTER this time
+                                      (sin zona = hora local). Overrides target_date_str if provided.
     """
     try:
         conn = get_connection()
-        
-        # Build Query dynamically
-        # Standard: Filter by day using string comparison
-        date_filter = ""
-        params = email_list.copy()
+        emails_json = json.dumps([str(e) for e in email_list])
         
         if min_timestamp:
             # Session-Based Scoping: Everything after this TS
-            date_filter = "AND timestamp >= ?"
-            params.append(str(min_timestamp))
+            start_ms, end_ms = to_epoch_ms(min_timestamp), _MAX_EPOCH_MS
         else:
-            # Default: Today
-            if not target_date_str:
-                target_date_str = datetime.now().strftime("%Y-%m-%d")
-            date_filter = "AND timestamp LIKE ?"
-            params.append(f"{target_date_str}%")
-
-        query = f"""
-            SELECT recipient, status, timestamp
-            FROM send_attempts
-            WHERE recipient IN ({','.join(['?']*len(email_list))})
-            {date_filter}
-            ORDER BY timestamp ASC
-        """
-        
-        df = pd.read_sql_query(query, conn, params=params)
-        conn.close()
+            # Default: Today (día local del operador)
+            start_ms, end_ms = day_range_ms(target_date_str)
+        rows = conn.execute(_STATUS_RANGE_SQL, (emails_json, start_ms, end_ms)).fetchall()
         
+        # Priority: SENT > BLOCKED > FAILED > PENDING
+        priority_map = {'SENT': 3, 'BLOCKED': 2, 'FAILED': 1, 'PENDING': 0}
         status_map = {}
-        for _, row in df.iterrows():
+        for email, status, ts, epoch_ms in rows:
             # Last write wins usually, but we want to show 'SENT' if at least one was sent
-            email = row['recipient']
-            status = row['status']
-            ts = row['timestamp']
-            
-            # Formato hora
-            try:
-                time_str = datetime.strptime(str(ts).split('.')[0], "%Y-%m-%d %H:%M:%S").strftime("%H:%M")
-            except:
-                time_str = str(ts)[11:16]
-
             # Logic: If already SENT, keep it. If FAILED, can be overwritten by SENT.
             current = status_map.get(email, {'status': 'PENDING'})
             
-            # --- Rich Data Upgrade (Phase 4) ---
-            # We store the raw timestamp logic to expose it later
-            
-            # Priority: SENT > BLOCKED > FAILED > PENDING
-            priority_map = {'SENT': 3, 'BLOCKED': 2, 'FAILED': 1, 'PENDING': 0}
             curr_prio = priority_map.get(current.get('status', 'PENDING'), 0)
             new_prio = priority_map.get(status, 0)
             
             if new_prio >= curr_prio:
+                sent_local = from_epoch_ms(epoch_ms)
                 status_map[email] = {
                     'status': status, 
-                    'time': time_str,
-                    'ts_raw': ts # RAW Timestamp for Report
+                    'time': sent_local.strftime("%H:%M"),
+                    'ts_raw': ts, # RAW Timestamp (texto UTC del ledger)
+                    'ts_local': sent_local.strftime("%Y-%m-%d %H:%M:%S"),  # Para el Reporte
                 }
 
         return status_map
@@ -102,19 +257,17 @@ def get_status_map(email_list, target_date_str=None, min_timestamp=None):
 
 def get_today_stats():
     """
-    Returns counts of Sent vs Failed for today.
+    Returns counts of Sent vs Failed for today (día local del operador).
     """
     try:
         conn = get_connection()
-        today_start = datetime.now().strftime("%Y-%m-%d 00:00:00")
         query = """
             SELECT status, COUNT(*) as count 
             FROM send_attempts 
-            WHERE timestamp >= ? 
+            WHERE ts_epoch_ms >= ? AND ts_epoch_ms < ?
             GROUP BY status
         """
-        df = pd.read_sql_query(query, conn, params=(today_start,))
-        conn.close()
+        df = pd.read_sql_query(query, conn, params=day_range_ms())
         
         stats = {
             'SENT': df[df['status']=='SENT']['count'].sum(),
@@ -122,23 +275,20 @@ def get_today_stats():
             'BLOCKED': df[df['status']=='BLOCKED']['count'].sum()
         }
         return stats
-        return stats
     except:
         return {'SENT': 0, 'FAILED': 0, 'BLOCKED': 0}
 
 def reset_today_stats():
     """
-    Deletes all records from send_attempts for the current day.
+    Deletes all records from send_attempts for the current day (día local del operador).
     Useful for testing or manual reset by user.
     """
     try:
         conn = get_connection()
         c = conn.cursor()
-        today_start = datetime.now().strftime("%Y-%m-%d")
+        today_range = day_range_ms()
         
-        # Delete using LIKE 'YYYY-MM-DD%' pattern
-        query = "DELETE FROM send_attempts WHERE timestamp LIKE ?"
-        c.execute(query, (f"{today_start}%",))
+        c.execute("DELETE FROM send_attempts WHERE ts_epoch_ms >= ? AND ts_epoch_ms < ?", today_range)
         rows = c.rowcount
         
         # Also clean ledger_last_send? No, business logic usually keeps last send forever.
@@ -147,10 +297,9 @@ def reset_today_stats():
         # The TTL block is separate. Ideally we should allow clearing that too if 'reset'.
         # Let's clean TTL entries for today too just in case.
         
-        c.execute("DELETE FROM ledger_last_send WHERE last_sent_at LIKE ?", (f"{today_start}%",))
+        c.execute("DELETE FROM ledger_last_send WHERE last_sent_epoch_ms >= ? AND last_sent_epoch_ms < ?", today_range)
         
         conn.commit()
-        conn.close()
         return True, f"Se eliminaron {rows} registros del historial de hoy."
     except Exception as e:
         print(f"DB Reset Error: {e}")
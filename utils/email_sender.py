@@ -3,16 +3,16 @@ import html
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
-from datetime import datetime
+from datetime import datetime, timezone
 from email.utils import make_msgid, formatdate
 import pandas as pd
 import uuid
 import utils.helpers as helpers
+import utils.db_manager as dbm
 import hashlib
 import time
 import threading
 import os
-import sqlite3
 import traceback
 
 # Colores Branding
@@ -617,20 +617,10 @@ def send_email_batch(smtp_config, messages, progress_callback=None, logo_path=No
     TTL_MINUTES = 10
     
     try:
-        conn = sqlite3.connect('email_ledger.db')
+        # Conexión compartida del hilo (WAL + busy timeout): las consultas de estado de la app no
+        # bloquean el envío. Las tablas e índices los crean las migraciones de db_manager al conectar.
+        conn = dbm.get_connection()
         c = conn.cursor()
-        
-        # State Table (Anti-Duplicado)
-        c.execute('''CREATE TABLE IF NOT EXISTS ledger_last_send
-                     (ledger_key TEXT PRIMARY KEY, last_sent_at TIMESTAMP, last_msg_id TEXT, send_count INTEGER)''')
-        
-        # History Table (Auditoría)
-        # RC-FEAT-011: Added supervisor_copied column logic could be in 'status' or metadata. 
-        # For now we keep schema compatible and log 'SUPERVISOR_COPY' in log or new column if we wanted migration.
-        # We will log it in 'reason' or append to status if needed, but lets keep it simple to avoid schema migration risks on hotfix.
-        c.execute('''CREATE TABLE IF NOT EXISTS send_attempts
-                     (id TEXT PRIMARY KEY, ledger_key TEXT, recipient TEXT, status TEXT, reason TEXT, timestamp TIMESTAMP, run_id TEXT)''')
-        conn.commit()
     except Exception as e_db:
         stats['log'].append(f"⚠️ [RunID:{run_id}] Error initializing DB: {e_db}")
         return stats # Abort safety
@@ -667,26 +657,19 @@ def send_email_batch(smtp_config, messages, progress_callback=None, logo_path=No
                 ledger_src = f"{cycle_id}|{recipient_ledger}|{notif_key}"  # NUEVO: Incluir cycle_id
             
             ledger_key = hashlib.sha256(ledger_src.encode()).hexdigest()
-            now_ts = datetime.utcnow()
+            now_utc = datetime.now(timezone.utc)
+            now_ts = now_utc.replace(tzinfo=None)  # Texto del ledger: UTC sin zona (ver db_manager)
+            now_ms = dbm.to_epoch_ms(now_utc)
             
             # 3. Check TTL (Anti-Duplicado Accidental)
             if not force_resend:
                 try:
-                    c.execute("SELECT last_sent_at FROM ledger_last_send WHERE ledger_key=?", (ledger_key,))
+                    # Instante epoch (columna indexada del ledger): sin parsear texto por mensaje
+                    c.execute("SELECT last_sent_epoch_ms FROM ledger_last_send WHERE ledger_key=?", (ledger_key,))
                     existing = c.fetchone()
                     
-                    if existing:
-                        last_sent_str = existing[0]
-                        # Python sqlite adapter might return str or datetime depending on detection
-                        try:
-                            last_sent = datetime.strptime(last_sent_str, "%Y-%m-%d %H:%M:%S.%f")
-                        except:
-                            try:
-                                last_sent = datetime.strptime(last_sent_str, "%Y-%m-%d %H:%M:%S")
-                            except:
-                                last_sent = datetime.min
-                                
-                        elapsed = (now_ts - last_sent).total_seconds() / 60.0
+                    if existing and existing[0] is not None:
+                        elapsed = (now_ms - existing[0]) / 60000.0
                         
                         if elapsed < TTL_MINUTES:
                             msg_dup = f"🔒 [RunID:{run_id}] BLOCKED by TTL ({elapsed:.1f}m < {TTL_MINUTES}m). Recipient:{recipient_ledger}"
@@ -695,9 +678,9 @@ def send_email_batch(smtp_config, messages, progress_callback=None, logo_path=No
                             
                             # Audit Block
                             att_id = str(uuid.uuid4())
-                            c.execute("INSERT INTO send_attempts VALUES(?,?,?,?,?,?,?)", 
-                                      (att_id, ledger_key, recipient_ledger, 'BLOCKED', 'TTL_BLOCK', now_ts, run_id))
-                            conn.commit()
+                            with conn:  # commit, o rollback si falla (la conexión es compartida)
+                                c.execute("INSERT INTO send_attempts VALUES(?,?,?,?,?,?,?)", 
+                                          (att_id, ledger_key, recipient_ledger, 'BLOCKED', 'TTL_BLOCK', now_ts, run_id))
                             
                             duplicates_count += 1
                             stats['blocked'] += 1
@@ -849,16 +832,17 @@ def send_email_batch(smtp_config, messages, progress_callback=None, logo_path=No
                     reason += "_wCOPIES"
                 
                 try:
-                    # Update State
-                    c.execute("INSERT OR REPLACE INTO ledger_last_send (ledger_key, last_sent_at, last_msg_id, send_count) VALUES (?, ?, ?, COALESCE((SELECT send_count FROM ledger_last_send WHERE ledger_key=?)+1, 1))", 
-                              (ledger_key, now_ts, msg_id, ledger_key))
-                    
-                    # Audit Entry
-                    att_id = str(uuid.uuid4())
-                    c.execute("INSERT INTO send_attempts VALUES(?,?,?,?,?,?,?)", 
-                              (att_id, ledger_key, recipient_ledger, 'SENT', reason, now_ts, run_id))
-                    
-                    conn.commit()
+                    # Estado + auditoría en una transacción: commit, o rollback si falla
+                    # (no queda una transacción abierta con el lock de escritura en la conexión compartida)
+                    with conn:
+                        # Update State
+                        c.execute("INSERT OR REPLACE INTO ledger_last_send (ledger_key, last_sent_at, last_msg_id, send_count) VALUES (?, ?, ?, COALESCE((SELECT send_count FROM ledger_last_send WHERE ledger_key=?)+1, 1))", 
+                                  (ledger_key, now_ts, msg_id, ledger_key))
+                        
+                        # Audit Entry
+                        att_id = str(uuid.uuid4())
+                        c.execute("INSERT INTO send_attempts VALUES(?,?,?,?,?,?,?)", 
+                                  (att_id, ledger_key, recipient_ledger, 'SENT', reason, now_ts, run_id))
                 except Exception as e_ins:
                      stats['log'].append(f"⚠️ [RunID:{run_id}] Ledger Write Error: {e_ins}")
                 
@@ -883,9 +867,9 @@ def send_email_batch(smtp_config, messages, progress_callback=None, logo_path=No
                 # Audit Failure
                 try:
                      att_id = str(uuid.uuid4())
-                     c.execute("INSERT INTO send_attempts VALUES(?,?,?,?,?,?,?)", 
-                              (att_id, ledger_key, recipient_ledger, 'FAILED', str(e)[:50], now_ts, run_id))
-                     conn.commit()
+                     with conn:
+                         c.execute("INSERT INTO send_attempts VALUES(?,?,?,?,?,?,?)", 
+                                   (att_id, ledger_key, recipient_ledger, 'FAILED', str(e)[:50], now_ts, run_id))
                 except:
                      pass
 
@@ -901,7 +885,6 @@ def send_email_batch(smtp_config, messages, progress_callback=None, logo_path=No
                     'RunID': run_id
                 })
         
-        conn.close() # Close DB
         server.quit()
         
     except smtplib.SMTPAuthenticationError:
@@ -911,5 +894,9 @@ def send_email_batch(smtp_config, messages, progress_callback=None, logo_path=No
     except Exception as e:
         stats['log'].append(f"❌ Error de Conexión SMTP: {str(e)}")
         stats['failed'] = len(messages)
+    finally:
+        # La conexión es compartida por el hilo: nunca devolverla con una transacción abierta
+        if conn.in_transaction:
+            conn.rollback()
         
     return stats
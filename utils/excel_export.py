@@ -71,6 +71,8 @@ def generate_excel(df: pd.DataFrame) -> bytes:
                 current_currency = "$"
 
         for c_idx, value in enumerate(row, 1):
+            if value is pd.NA:
+                value = None  # Nulos Arrow (fechas date32) no son aceptados por openpyxl
             cell = ws.cell(row=r_idx, column=c_idx, value=value)
             
             # Columnas clave (Upper para coincidir con headers)
@@ -0,0 +1,250 @@
+"""
+Procesamiento Incremental del Pipeline de Cobranzas
+Persiste los estados intermedios identificados por el hash del contenido de su archivo fuente
+(ctas y cartera en la caché LRU de utils/parse_cache.py, el resto en .cache/pipeline):
+- ctas: CtasxCobrar normalizado (codcli_key, COMPROBANTE, MATCH_KEY)
+- cartera: dimensión de clientes (teléfono, email, nota, enviar email)
+- cobranza: agregados DT/amortizaciones por MATCH_KEY + firma de pagos por MATCH_KEY
+- result: último df_final calculado para la combinación de los 3 archivos
+
+Caso diario típico: Ctas y Cartera no cambian y llega una Cobranza nueva.
+Solo se recalculan los MATCH_KEY cuyos pagos cambiaron (nuevos, modificados o eliminados).
+"""
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+import utils.processing as proc
+from utils import parse_cache
+from utils.stage_report import stage
+
+PIPELINE_DIR = os.path.join(".cache", "pipeline")
+STATE_FILE = os.path.join(PIPELINE_DIR, "state.json")
+
+STAGES = ('ctas', 'cartera', 'cobranza')
+
+# Se incrementa cuando cambia la forma de leer/normalizar: invalida los estados guardados
+PIPELINE_VERSION = 2
+
+# Etapas DataFrame por archivo: se guardan en la caché LRU (varias versiones de cada archivo),
+# así un archivo ya visto antes salta directo al cruce aunque entre medio se subiera otro
+LRU_STAGES = ('ctas', 'cartera')
+
+
+def file_content_hash(file):
+    """SHA-256 del contenido de un archivo (ruta, bytes o archivo subido en Streamlit)."""
+    return hashlib.sha256(proc.read_file_bytes(file)).hexdigest()
+
+
+def _stage_path(stage, content_hash):
+    return os.path.join(PIPELINE_DIR, f"{stage}_v{PIPELINE_VERSION}_{content_hash[:16]}.pkl")
+
+
+def _load_stage(stage, content_hash):
+    """Devuelve el estado guardado para (etapa, hash) o None si no existe / no se puede leer."""
+    if not content_hash:
+        return None
+    if stage in LRU_STAGES:
+        return parse_cache.load(f"stage_{stage}_p{PIPELINE_VERSION}", content_hash)
+    path = _stage_path(stage, content_hash)
+    if not os.path.exists(path):
+        return None
+    try:
+        return pd.read_pickle(path)
+    except Exception as e:
+        print(f"Pipeline cache read error ({stage}): {e}")
+        return None
+
+
+def _save_stage(stage, content_hash, obj):
+    """
+    Guarda el estado de una etapa (se conserva solo la última generación por etapa).
+    Se usa pickle porque preserva los tipos mixtos de columnas Excel que Parquet no admite.
+    """
+    if stage in LRU_STAGES:
+        parse_cache.store(f"stage_{stage}_p{PIPELINE_VERSION}", content_hash, obj)
+        return
+    os.makedirs(PIPELINE_DIR, exist_ok=True)
+    path = _stage_path(stage, content_hash)
+    tmp_path = path + ".tmp"
+    pd.to_pickle(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+    for name in os.listdir(PIPELINE_DIR):
+        old = os.path.join(PIPELINE_DIR, name)
+        if name.startswith(f"{stage}_") and name.endswith(".pkl") and old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def _load_state():
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(hashes):
+    os.makedirs(PIPELINE_DIR, exist_ok=True)
+    tmp_path = STATE_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(hashes, f)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def _result_hash(hashes):
+    """Hash combinado de los 3 archivos (identifica un df_final)."""
+    return hashlib.sha256("|".join(hashes.get(s, '') for s in STAGES).encode('utf-8')).hexdigest()
+
+
+def payment_signatures(df_cobranza, match_keys=None):
+    """
+    Firma por MATCH_KEY: tupla ordenada de hashes de sus filas de pago.
+    Dos firmas distintas para el mismo MATCH_KEY implican que su detalle DT/amortización debe recalcularse.
+    """
+    if df_cobranza.empty:
+        return pd.Series(dtype=object)
+    if match_keys is None:
+        match_keys = proc.build_match_key_cobranza(df_cobranza)
+    row_hash = pd.util.hash_pandas_object(df_cobranza, index=False)
+    return pd.Series(row_hash.values).groupby(match_keys.values, sort=False).agg(tuple)
+
+
+def touched_match_keys(old_signatures, new_signatures):
+    """MATCH_KEY con pagos nuevos, modificados o eliminados entre dos versiones de Cobranza."""
+    keys = old_signatures.index.union(new_signatures.index)
+    old = old_signatures.reindex(keys)
+    new = new_signatures.reindex(keys)
+    return [k for k, o, n in zip(keys, old, new) if o != n]
+
+
+def process_files_incremental(file_ctas, file_cartera, file_cobranza, fecha_corte=None, report=None):
+    """
+    Ejecuta el pipeline reutilizando las etapas cuyo archivo fuente no cambió.
+    fecha_corte: fecha para DÍAS MORA / ESTADO DEUDA (por defecto, hoy).
+    report: StageReport opcional (solo registra las etapas efectivamente ejecutadas).
+
+    Returns:
+        (df_final, info) donde info = {
+            'mode': 'full' | 'incremental' | 'cached',
+            'reused': etapas reutilizadas desde caché,
+            'touched_keys': cantidad de MATCH_KEY recalculados (None si fue completo)
+        }
+    """
+    previous = _load_state()
+    hashes = {
+        'ctas': file_content_hash(file_ctas),
+        'cartera': file_content_hash(file_cartera),
+        'cobranza': file_content_hash(file_cobranza),
+    }
+    reused = []
+    files = {'ctas': file_ctas, 'cartera': file_cartera, 'cobranza': file_cobranza}
+    cached = {s: _load_stage(s, hashes[s]) for s in STAGES}
+
+    # 0. Parseo (en paralelo) solo de los archivos sin estado guardado
+    to_read = {s: files[s] for s in STAGES if cached[s] is None}
+    raw = {}
+    if to_read:
+        with stage(report, "parse_archivos") as st:
+            raw = proc.read_input_files(to_read)
+            st['rows_out'] = sum(len(df) for df in raw.values())
+
+    # 1. CtasxCobrar normalizado
+    df_ctas = cached['ctas']
+    if df_ctas is None:
+        df_ctas = raw['ctas']
+        with stage(report, "normalizar_claves", len(df_ctas)) as st:
+            df_ctas = proc.normalize_ctas(df_ctas)
+            st['rows_out'] = len(df_ctas)
+        _save_stage('ctas', hashes['ctas'], df_ctas)
+    else:
+        reused.append('ctas')
+
+    # 2. Dimensión Cartera
+    df_cartera_dim = cached['cartera']
+    if df_cartera_dim is None:
+        df_cartera = raw['cartera']
+        with stage(report, "dimension_cartera", len(df_cartera)) as st:
+            df_cartera_dim = proc.build_cartera_dimension(df_cartera)
+            st['rows_out'] = len(df_cartera_dim)
+        _save_stage('cartera', hashes['cartera'], df_cartera_dim)
+    else:
+        reused.append('cartera')
+
+    # 3. Agregados de Cobranza por MATCH_KEY
+    touched = None  # None = recalcular todo
+    cobranza_state = cached['cobranza']
+    if cobranza_state is not None:
+        reused.append('cobranza')
+        if previous.get('cobranza') == hashes['cobranza']:
+            touched = []
+    else:
+        df_cobranza = raw['cobranza']
+        with stage(report, "agrupar_cobranza", len(df_cobranza)) as st:
+            match_keys = proc.build_match_key_cobranza(df_cobranza) if not df_cobranza.empty else None
+            signatures = payment_signatures(df_cobranza, match_keys)
+
+            previous_state = _load_stage('cobranza', previous.get('cobranza'))
+            if previous_state is not None and match_keys is not None:
+                touched = touched_match_keys(previous_state['signatures'], signatures)
+                partial = proc.build_cobranza_lookups(df_cobranza[match_keys.isin(touched).values])
+                lookups = pd.concat([
+                    previous_state['lookups'].drop(index=touched, errors='ignore'),
+                    partial,
+                ])
+            else:
+                lookups = proc.build_cobranza_lookups(df_cobranza)
+            st['rows_out'] = len(lookups)
+
+        cobranza_state = {'lookups': lookups, 'signatures': signatures}
+        _save_stage('cobranza', hashes['cobranza'], cobranza_state)
+
+    lookups = cobranza_state['lookups']
+
+    # 4. Resultado: reutilizar el df_final anterior si Ctas y Cartera no cambiaron
+    with stage(report, "merge_cartera", len(df_ctas)) as st:
+        df_merged = proc.merge_ctas_cartera(df_ctas, df_cartera_dim)
+        st['rows_out'] = len(df_merged)
+    previous_result = None
+    if touched is not None and all(previous.get(s) == hashes[s] for s in ('ctas', 'cartera')):
+        previous_result = _load_stage('result', _result_hash(previous))
+        if previous_result is not None and not previous_result.index.equals(df_merged.index):
+            previous_result = None
+
+    if previous_result is None:
+        with stage(report, "enriquecer_documentos", len(df_merged)) as st:
+            df_final = proc.enrich_documents(df_merged, lookups, fecha_corte, report)
+            st['rows_out'] = len(df_final)
+        mode = 'full'
+        touched = None
+    else:
+        mask = previous_result['MATCH_KEY'].isin(touched)
+        if mask.any():
+            with stage(report, "enriquecer_documentos", int(mask.sum())) as st:
+                updated = proc.enrich_documents(df_merged[mask.values], lookups, fecha_corte, report)
+                # concat de categorías distintas degrada a object: se restituye el esquema
+                df_final = proc.apply_output_schema(pd.concat([previous_result[~mask], updated]).sort_index())
+                st['rows_out'] = len(updated)
+        else:
+            df_final = previous_result
+        # La mora depende de la fecha de corte: se refresca siempre (vectorizado)
+        with stage(report, "aging", len(df_final)) as st:
+            df_final = proc.refresh_aging(df_final, fecha_corte)
+            st['rows_out'] = len(df_final)
+        mode = 'incremental' if touched else 'cached'
+
+    _save_stage('result', _result_hash(hashes), df_final)
+    _save_state(hashes)
+
+    info = {
+        'mode': mode,
+        'reused': reused,
+        'touched_keys': None if touched is None else len(touched),
+    }
+    return df_final, info
@@ -0,0 +1,79 @@
+"""
+Ejecución Paralela del Pipeline de Cobranzas (multi-núcleo)
+Los documentos de CtasxCobrar se particionan por hash de codcli_key. El cruce con Cartera
+(por cliente) y con los agregados de Cobranza (por MATCH_KEY, un documento) es local a cada
+partición, así que normalización, cruce y enriquecimiento corren en un pool de procesos.
+Los resultados se unen en el orden original de CtasxCobrar: la salida es idéntica a process_data.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import utils.processing as proc
+import utils.schema_resolver as schema_resolver
+
+# Por debajo de este tamaño el costo de lanzar procesos supera la ganancia
+MIN_ROWS_PARALLEL = 20_000
+
+# Estado por proceso (se envía una sola vez por worker en el initializer, no por partición)
+_worker_state = {}
+
+
+def partition_ids(codcli_key, n_partitions):
+    """Número de partición estable por cliente (hash de codcli_key módulo n_partitions)."""
+    hashes = pd.util.hash_array(codcli_key.to_numpy(dtype=object))
+    return (hashes % np.uint64(n_partitions)).astype('int64')
+
+
+def _init_worker(df_cartera_dim, cobranza_lookups, fecha_corte):
+    _worker_state['cartera'] = df_cartera_dim
+    _worker_state['lookups'] = cobranza_lookups
+    _worker_state['fecha_corte'] = fecha_corte
+
+
+def _run_partition(df_ctas_part):
+    df_ctas_part = proc.normalize_ctas(df_ctas_part)
+    return proc.process_partition(
+        df_ctas_part,
+        _worker_state['cartera'],
+        _worker_state['lookups'],
+        _worker_state['fecha_corte'],
+    )
+
+
+def process_data_parallel(df_ctas, df_cartera, df_cobranza, workers=None, fecha_corte=None,
+                          min_rows=MIN_ROWS_PARALLEL):
+    """
+    Versión multi-núcleo de process_data (mismo resultado, mismo orden de filas).
+
+    Args:
+        workers: procesos del pool (por defecto, os.cpu_count()).
+        min_rows: con menos documentos (o workers=1) se ejecuta en el proceso actual.
+    """
+    workers = workers or os.cpu_count() or 1
+    # Misma resolución de encabezado que normalize_ctas (alias, mayúsculas/espacios)
+    col_codcli = schema_resolver.column_for(df_ctas, 'ctas', 'codcli')
+    if col_codcli is None:
+        raise ValueError("Columna 'codcli' no encontrada en CtasxCobrar")
+
+    df_cartera_dim = proc.build_cartera_dimension(df_cartera)
+    lookups = proc.build_cobranza_lookups(df_cobranza)
+
+    df_ctas = df_ctas.reset_index(drop=True)
+    if workers <= 1 or len(df_ctas) < min_rows:
+        parts = [proc.process_partition(proc.normalize_ctas(df_ctas), df_cartera_dim, lookups, fecha_corte)]
+    else:
+        # Partición por cliente (la clave normalizada es memoizada por valor único: barata en el proceso principal)
+        part_ids = partition_ids(proc.format_client_code_series(df_ctas[col_codcli]), workers)
+        partitions = [df_ctas[part_ids == p] for p in range(workers)]
+        partitions = [p for p in partitions if not p.empty]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(df_cartera_dim, lookups, fecha_corte)) as pool:
+            parts = list(pool.map(_run_partition, partitions))
+
+    # Unión determinista: orden original de CtasxCobrar (estable ante clientes duplicados en Cartera)
+    df_final = pd.concat(parts).sort_index(kind='stable').reset_index(drop=True)
+    return proc.apply_output_schema(df_final)
@@ -0,0 +1,129 @@
+"""
+Caché de Archivos Parseados (direccionado por contenido, LRU con presupuesto de disco)
+Cada DataFrame se guarda en .cache/parsed con clave = espacio + versión + SHA-256 del archivo
+de origen. Volver a subir el mismo archivo (Cartera casi nunca cambia, reintentos tras un error)
+carga el DataFrame en milisegundos en lugar de repetir el parseo xlsx.
+
+Formato: Parquet cuando todas las columnas de texto son str (caso normal con el esquema resuelto);
+pickle como respaldo si hay columnas con tipos mixtos que Arrow no representa sin pérdida.
+Expulsión: por último acceso (mtime) hasta quedar dentro de MAX_CACHE_BYTES.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+CACHE_DIR = os.path.join(".cache", "parsed")
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+# Se incrementa cuando cambia la forma de parsear: invalida las entradas anteriores
+CACHE_VERSION = 1
+
+_FORMATS = ('.parquet', '.pkl')
+
+
+def _entry_base(namespace, content_hash):
+    return os.path.join(CACHE_DIR, f"{namespace}_v{CACHE_VERSION}_{content_hash[:32]}")
+
+
+def _parquet_safe(df):
+    """True si Parquet conserva el frame tal cual (columnas object solo con texto o nulos)."""
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True) not in ('string', 'empty'):
+            return False
+    return df.columns.map(type).isin([str]).all()
+
+
+def load(namespace, content_hash):
+    """DataFrame guardado para (namespace, hash) o None. Un acierto lo marca como recién usado."""
+    if not content_hash:
+        return None
+    base = _entry_base(namespace, content_hash)
+    for ext in _FORMATS:
+        path = base + ext
+        if not os.path.exists(path):
+            continue
+        try:
+            if ext == '.parquet':
+                df = pd.read_parquet(path)
+                # Parquet devuelve None en los nulos de texto; el parseo Excel produce NaN
+                for col in df.columns[df.dtypes == object]:
+                    df[col] = df[col].where(df[col].notna(), np.nan)
+            else:
+                df = pd.read_pickle(path)
+        except Exception as e:
+            print(f"Parse cache read error ({namespace}): {e}")
+            return None
+        os.utime(path)
+        return df
+    return None
+
+
+def store(namespace, content_hash, df):
+    """Guarda el DataFrame (escritura atómica) y aplica el presupuesto de disco."""
+    if not content_hash:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    base = _entry_base(namespace, content_hash)
+    ext = '.parquet' if _parquet_safe(df) else '.pkl'
+    path = base + ext
+    tmp_path = path + ".tmp"
+    try:
+        if ext == '.parquet':
+            df.to_parquet(tmp_path)
+        else:
+            pd.to_pickle(df, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Parse cache write error ({namespace}): {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    evict(keep=path)
+
+
+def _entries():
+    if not os.path.isdir(CACHE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith(_FORMATS):
+            path = os.path.join(CACHE_DIR, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def evict(max_bytes=None, keep=None):
+    """Elimina las entradas usadas hace más tiempo hasta respetar max_bytes (por defecto MAX_CACHE_BYTES)."""
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+    entries = sorted(_entries())
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    return total
+
+
+def cache_size():
+    """Bytes ocupados por la caché."""
+    return sum(size for _, size, _ in _entries())
+
+
+def clear():
+    for _, _, path in _entries():
+        try:
+            os.remove(path)
+        except OSError:
+            pass
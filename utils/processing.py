@@ -1,6 +1,17 @@
 import pandas as pd
 import numpy as np
+import hashlib
+import importlib.util
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
+from functools import lru_cache
+from io import BytesIO
+
+from utils.stage_report import stage
+from utils import schema_resolver
+from utils import parse_cache
 
 def format_phone(phone):
     """
@@ -44,59 +55,789 @@ def format_client_code(code):
     except:
         return str(code).zfill(6)
 
-def load_data(file_ctas, file_cartera, file_cobranza):
+def clean_numsun(val):
+    """Número SUNAT a 8 dígitos (para COMPROBANTE)."""
+    try:
+        return str(int(float(val))).zfill(8)
+    except:
+        return str(val).zfill(8)
+
+def clean_key_part(val):
+    """Normalización robusta: Quitar espacios y guiones para evitar desfases."""
+    return str(val).strip().replace("-", "").replace(" ", "")
+
+def pad_numsun(val):
+    """Asegura 8 dígitos para el número en MATCH_KEY."""
+    try:
+        return str(int(float(val))).zfill(8)
+    except:
+        # Si no es numérico, intentamos limpiar y rellenar si es corto, o dejar tal cual
+        s = str(val).strip()
+        if len(s) < 8 and s.isdigit():
+            return s.zfill(8)
+        return s
+
+def _column_or_default(df, col, default=""):
+    """Devuelve la columna si existe, o una Serie constante (equivale a row.get(col, default))."""
+    if col in df.columns:
+        return df[col]
+    return pd.Series(default, index=df.index, dtype=object)
+
+# --- NORMALIZADORES POR SERIE (Memoización por valor único) ---
+# Códigos de cliente, teléfonos y números de documento se repiten mucho entre filas:
+# se normaliza cada valor único UNA vez y se mapea el resultado de vuelta con los códigos de factorize.
+
+def map_unique_values(series, func):
+    """
+    Aplica `func` una sola vez por valor único de la Serie y devuelve una Serie alineada al índice original.
+    """
+    if series.dtype == object:
+        # Columnas mixtas de Excel: 1, 1.0 y True colisionan en el hash pero str() los distingue,
+        # y None/NaN son nulos distintos para las funciones escalares. Se factoriza por (tipo, valor).
+        values = series.tolist()
+        codes, uniques = pd.factorize(pd.Series([(type(v), v) for v in values], dtype=object))
+        results = [func(v) for _, v in uniques]
+    else:
+        codes, uniques = pd.factorize(series, use_na_sentinel=False)
+        results = [func(v) for v in uniques]
+
+    mapped = np.empty(len(results), dtype=object)
+    mapped[:] = results
+    return pd.Series(mapped[codes], index=series.index, dtype=object)
+
+def format_client_code_series(codes):
+    """Versión por Serie de format_client_code."""
+    return map_unique_values(codes, format_client_code)
+
+def format_phone_series(phones):
+    """Versión por Serie de format_phone."""
+    return map_unique_values(phones, format_phone)
+
+def clean_numsun_series(numsun):
+    """Versión por Serie de clean_numsun."""
+    return map_unique_values(numsun, clean_numsun)
+
+def pad_numsun_series(numsun):
+    """Versión por Serie de pad_numsun."""
+    return map_unique_values(numsun, pad_numsun)
+
+def clean_key_part_series(values):
+    """Versión por Serie de clean_key_part."""
+    return map_unique_values(values, clean_key_part)
+
+def calc_saldo_real(saldo, detraccion, estado_dt, moneda, tipo_cambio):
+    """
+    Calcula SALDO REAL sobre columnas completas.
+    - Sin detracción (<= 0): Saldo Real = Saldo
+    - Detracción Pendiente en US$: Saldo - (Detracción / Tipo Cambio) (si TC > 0)
+    - Detracción Pendiente en Soles: Saldo - Detracción
+    - Detracción ya aplicada en Cobranza: Saldo
+    """
+    saldo = saldo.astype(float)
+    detraccion = detraccion.astype(float)
+    tc = tipo_cambio.astype(float)
+    es_pendiente = estado_dt == "Pendiente"
+    es_dolares = moneda.astype(str).str.strip().str.upper() == 'US$'
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        saldo_menos_usd = saldo - (detraccion / tc)
+
+    return pd.Series(np.select(
+        [
+            detraccion <= 0,
+            es_pendiente & es_dolares & (tc > 0),
+            es_pendiente & es_dolares,  # Evitar div0
+            es_pendiente,
+        ],
+        [saldo, saldo_menos_usd, saldo, saldo - detraccion],
+        default=saldo
+    ), index=saldo.index)
+
+# --- AGING (Semaforización por Fecha de Corte) ---
+# Depende solo de FECH VENC y de la fecha de corte: se puede recalcular sobre un df_final
+# existente sin repetir los cruces (cambio de fecha de corte o sesión abierta tras medianoche).
+AGING_BUCKETS = [
+    "Indeterminado",
+    "🟢 Por Vencer",
+    "🟡 Gestión Preventiva",
+    "🟠 Gestión Administrativa",
+    "🔴 Gestión Pre-Legal",
+]
+
+def calc_aging(fech_venc, fecha_corte):
+    """
+    Calcula DÍAS MORA y ESTADO DEUDA (Semáforo Textual) sobre la columna FECH VENC.
+    fecha_corte: fecha contra la que se mide la mora (por defecto, hoy).
+    Returns: (dias_mora, estado_deuda) como Series.
+    """
+    venc = pd.to_datetime(fech_venc, errors='coerce')
+    delta = (pd.Timestamp(fecha_corte) - venc).dt.days
+
+    estado = np.select(
+        [
+            delta.isna(),
+            delta < 0,
+            delta <= 8,
+            delta <= 30,
+        ],
+        AGING_BUCKETS[:4],
+        default=AGING_BUCKETS[4]
+    )
+    dias_mora = delta.fillna(0).astype('int64')
+    return dias_mora, pd.Series(estado, index=fech_venc.index, dtype=object)
+
+def refresh_aging(df_final, fecha_corte=None):
+    """
+    Recalcula DÍAS MORA y ESTADO DEUDA de un df_final existente para la fecha de corte dada.
+    La fecha usada queda en df_final.attrs['fecha_corte'] (ISO) para detectar cuándo refrescar.
+    """
+    fecha_corte = fecha_corte or date.today()
+    df_final = df_final.copy()
+    if 'FECH VENC' not in df_final.columns:
+        return df_final
+    dias_mora, estado = calc_aging(df_final['FECH VENC'], fecha_corte)
+    df_final['DÍAS MORA'] = dias_mora
+    df_final['ESTADO DEUDA'] = estado.astype(pd.CategoricalDtype(AGING_BUCKETS))
+    df_final.attrs['fecha_corte'] = _fecha_corte_key(fecha_corte)
+    return df_final
+
+def aging_is_stale(df_final, fecha_corte=None):
+    """True si la mora de df_final no fue calculada para la fecha de corte dada."""
+    return df_final.attrs.get('fecha_corte') != _fecha_corte_key(fecha_corte or date.today())
+
+def _fecha_corte_key(fecha_corte):
+    """Fecha de corte en ISO (serializable en los metadatos Parquet de la sesión)."""
+    return pd.Timestamp(fecha_corte).date().isoformat()
+
+# --- CAPA DE PRESENTACIÓN (Formato Moneda bajo demanda) ---
+# Los montos se guardan numéricos en df_final (SSOT); el texto "S/ 1,234.50" se genera
+# solo para las filas que se muestran o exportan.
+DISPLAY_CURRENCY_COLS = ['MONT EMIT', 'DETRACCIÓN', 'SALDO', 'SALDO REAL']
+
+def _currency_symbol(moneda):
+    """Símbolo a partir de MONEDA: 'S/' si empieza con S (SOL, S/, S/.), '$' en otro caso."""
+    return "S/" if str(moneda).strip().upper().startswith('S') else "$"
+
+@lru_cache(maxsize=65536)
+def _format_amount(amount):
+    """Monto con separador de miles y 2 decimales (memoizado entre renders)."""
+    return f"{amount:,.2f}"
+
+def format_currency_column(amounts, moneda, force_soles=False):
+    """
+    Formato Moneda Integrado (Pegar símbolo al valor): "S/ 1,234.50" | "$ 1,234.50" | "-" si es 0.
+    force_soles: La Detracción SIEMPRE es en Soles.
+    """
+    values = pd.to_numeric(amounts, errors='coerce')
+    if force_soles:
+        symbol = pd.Series("S/", index=amounts.index)
+    else:
+        symbol = map_unique_values(moneda, _currency_symbol)
+    formatted = symbol + " " + map_unique_values(values, _format_amount)
+    formatted = formatted.where(values != 0, "-")
+    # Valores no numéricos se muestran tal cual (mismo fallback que el formato por celda)
+    return formatted.where(values.notna() | amounts.isna(), amounts.astype(str))
+
+def format_display_columns(df, cols=None):
+    """
+    Devuelve una copia de df con las columnas monetarias formateadas como texto para visualización.
+    Aplicar solo sobre las filas a renderizar o exportar (no sobre el SSOT completo).
+    """
+    df_display = df.copy()
+    if 'MONEDA' not in df_display.columns:
+        return df_display
+    for col in (cols or DISPLAY_CURRENCY_COLS):
+        if col in df_display.columns:
+            df_display[col] = format_currency_column(
+                df_display[col],
+                df_display['MONEDA'],
+                force_soles=(col == 'DETRACCIÓN')  # REGLA DE NEGOCIO: La Detracción SIEMPRE es en Soles
+            )
+    return df_display
+
+# --- ESQUEMA TIPADO DE df_final ---
+# Texto en Arrow (con NaN como nulo, igual que object), columnas de baja cardinalidad como
+# category, montos en float64 y fechas en date32. Reduce memoria y el tamaño de la sesión Parquet.
+try:
+    import pyarrow as pa
+    try:
+        TEXT_DTYPE = pd.StringDtype("pyarrow", na_value=np.nan)
+    except TypeError:
+        TEXT_DTYPE = "string[pyarrow_numpy]"  # pandas < 2.3
+    DATE_DTYPE = pd.ArrowDtype(pa.date32())
+except ImportError:
+    TEXT_DTYPE = object
+    DATE_DTYPE = object
+
+OUTPUT_SCHEMA = {
+    'COD CLIENTE': 'text',
+    'EMPRESA': 'text',
+    'Enviar Email': 'category',
+    'NOTA': 'text',
+    'CORREO': 'text',
+    'TELÉFONO': 'text',
+    'TIPO PEDIDO': 'category',
+    'COMPROBANTE': 'text',
+    'FECH EMIS': 'date',
+    'FECH VENC': 'date',
+    'DÍAS MORA': 'int',
+    'ESTADO DEUDA': 'aging',
+    'MONEDA': 'category',
+    'TIPO CAMBIO': 'float',
+    'MONT EMIT': 'float',
+    'SALDO REAL': 'float',
+    'SALDO': 'float',
+    'DETRACCIÓN': 'float',
+    'ESTADO DETRACCION': 'text',  # Texto libre de la DT por documento
+    'AMORTIZACIONES': 'text',
+    'MATCH_KEY': 'text',
+    'EMAIL_FINAL': 'text',
+    # Texto: la app escribe "ENVIADO (hh:mm)", "BLOQUEADO (..)", "SIN DATOS" o "" además de los estados base
+    'ESTADO_EMAIL': 'text',
+    'FECHA_ULTIMO_ENVIO': 'text',
+}
+
+def _cast_column(series, kind):
+    if kind == 'text':
+        if series.dtype == TEXT_DTYPE:
+            return series
+        # Se conservan los nulos; el resto se guarda como texto (códigos numéricos incluidos)
+        return series.where(series.isna(), series.astype(str)).astype(TEXT_DTYPE)
+    if kind == 'category':
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            return series
+        return series.where(series.isna(), series.astype(str)).astype('category')
+    if kind == 'aging':
+        return series.astype(pd.CategoricalDtype(AGING_BUCKETS))
+    if kind == 'float':
+        return pd.to_numeric(series, errors='coerce').astype('float64')
+    if kind == 'int':
+        return pd.to_numeric(series, errors='coerce').fillna(0).astype('int64')
+    if kind == 'date':
+        if series.dtype == DATE_DTYPE or DATE_DTYPE is object:
+            return series
+        return pd.to_datetime(series, errors='coerce').dt.date.astype(DATE_DTYPE)
+    return series
+
+def apply_output_schema(df):
+    """
+    Aplica OUTPUT_SCHEMA a df_final (idempotente; columnas ausentes se ignoran).
+    Se invoca al final del pipeline y al cargar una sesión, ya que Parquet no conserva
+    todos los dtypes de pandas (p. ej. el texto Arrow vuelve como object).
+    """
+    df = df.copy()
+    for col, kind in OUTPUT_SCHEMA.items():
+        if col in df.columns:
+            df[col] = _cast_column(df[col], kind)
+    return df
+
+def format_payment_info(row):
+    """
+    Texto detallado de un pago de Cobranza con saltos de línea (para Excel con ajuste de texto).
+    Campos: codbco, nombco, fecpro, mondoc, monpag, forpag, nudopa
+    """
+    fec = pd.to_datetime(row.get('fecpro', '')).strftime('%d/%m/%Y') if pd.notna(row.get('fecpro')) else ''
+    
+    # Formatear montos con coma y 2 decimales para el texto (ojo: esto es texto para leer, no numero para sumar)
+    try:
+        m_doc = f"{float(row.get('mondoc', 0)):,.2f}"
+        m_pag = f"{float(row.get('monpag', 0)):,.2f}"
+    except:
+        m_doc = str(row.get('mondoc', ''))
+        m_pag = str(row.get('monpag', ''))
+
+    return (f"Banco: {row.get('nombco', '')} ({row.get('codbco', '')})\n"
+            f"Fecha: {fec}\n"
+            f"Doc: {m_doc}\n"
+            f"Pag: {m_pag}\n"
+            f"Forma: {row.get('forpag', '')}\n"
+            f"Oper: {row.get('nudopa', '')}")
+
+def _payment_date_text(value):
+    """Fecha de pago dd/mm/aaaa ('' si es nula); misma conversión que format_payment_info."""
+    return pd.to_datetime(value).strftime('%d/%m/%Y') if pd.notna(value) else ''
+
+def _payment_amount_text(value):
+    """Monto con separador de miles y 2 decimales, o None si no es convertible a float."""
+    try:
+        return f"{float(value):,.2f}"
+    except:
+        return None
+
+def format_payment_info_series(df):
+    """
+    Versión por columnas de format_payment_info (mismo texto, fila a fila).
+    Fechas y montos se convierten una vez por valor único; el texto se arma concatenando columnas.
+    """
+    def text_col(col, default=''):
+        if col not in df.columns:
+            return pd.Series(str(default), index=df.index, dtype=object)
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=False) == 'string':
+            return df[col]  # Ya es texto (caso típico: banco, operación)
+        return map_unique_values(df[col], str)
+
+    # Fecha: pocas fechas distintas por archivo -> se formatea una vez por fecha única
+    if 'fecpro' in df.columns:
+        fec = map_unique_values(df['fecpro'], _payment_date_text)
+    else:
+        fec = pd.Series('', index=df.index, dtype=object)
+
+    # Montos: si alguno de los dos no es numérico, ambos se muestran tal cual (mismo fallback)
+    m_doc = map_unique_values(_column_or_default(df, 'mondoc', 0), _payment_amount_text)
+    m_pag = map_unique_values(_column_or_default(df, 'monpag', 0), _payment_amount_text)
+    numeric = m_doc.notna() & m_pag.notna()
+    m_doc = m_doc.where(numeric, text_col('mondoc'))
+    m_pag = m_pag.where(numeric, text_col('monpag'))
+
+    return (
+        "Banco: " + text_col('nombco') + " (" + text_col('codbco') + ")\n"
+        + "Fecha: " + fec + "\n"
+        + "Doc: " + m_doc + "\n"
+        + "Pag: " + m_pag + "\n"
+        + "Forma: " + text_col('forpag') + "\n"
+        + "Oper: " + text_col('nudopa')
+    )
+
+def build_match_key_cobranza(df):
+    """MATCH_KEY de Cobranza: coddoc + numsun (concatenación robusta)."""
+    return clean_key_part_series(_column_or_default(df, 'coddoc')).str.cat(
+        clean_key_part_series(_column_or_default(df, 'numsun'))
+    )
+
+def build_cobranza_lookups(df_cobranza):
+    """
+    Agrega Cobranza por MATCH_KEY (una fila por documento) para cruzar con un solo join.
+    Columnas:
+    - DT_MONTO: suma de monpag de pagos DT (por si hubo pagos parciales, aunque raro en detracción)
+    - DT_INFO: detalle legible de pagos DT, unidos con "\n---\n"
+    - AMORT_INFO: detalle de amortizaciones (todo lo que NO sea DT ni DET)
+    """
+    lookups = pd.DataFrame(columns=['DT_MONTO', 'DT_INFO', 'AMORT_INFO'])
+    lookups.index.name = 'MATCH_KEY'
+
+    # Preparar tabla de Cobranzas DT
+    # Filtrar solo 'DT' (si no hay columna forpag, no hay DTs)
+    col_forpag = schema_resolver.column_for(df_cobranza, 'cobranza', 'forpag')
+    if not df_cobranza.empty and col_forpag is None:
+        raise ValueError("Columna 'forpag' no encontrada en Cobranza")
+    if col_forpag is not None:
+        df_dt = df_cobranza[df_cobranza[col_forpag] == 'DT'].copy()
+    else:
+        df_dt = pd.DataFrame()
+
+    if not df_dt.empty:
+        df_dt['MATCH_KEY'] = build_match_key_cobranza(df_dt)
+        df_dt['info_dt'] = format_payment_info_series(df_dt)
+        dt_agg = df_dt.groupby('MATCH_KEY').agg(
+            DT_MONTO=('monpag', 'sum'),
+            DT_INFO=('info_dt', "\n---\n".join),
+        )
+    else:
+        dt_agg = lookups[['DT_MONTO', 'DT_INFO']]
+
+    # --- AMORTIZACIONES (todo lo que NO sea DT) ---
+    if not df_cobranza.empty:
+        df_amort = df_cobranza[~df_cobranza[col_forpag].isin(['DT', 'DET'])].copy()
+    else:
+        df_amort = pd.DataFrame()
+
+    if not df_amort.empty:
+        df_amort['MATCH_KEY'] = build_match_key_cobranza(df_amort)
+        df_amort['info_amort'] = format_payment_info_series(df_amort)
+        amort_agg = df_amort.groupby('MATCH_KEY').agg(
+            AMORT_INFO=('info_amort', "\n---\n".join),
+        )
+    else:
+        amort_agg = lookups[['AMORT_INFO']]
+
+    return dt_agg.join(amort_agg, how='outer')
+
+# --- LECTURA DE ARCHIVOS DE ENTRADA ---
+# Motor xlsx: None = automático (calamine si python-calamine está instalado, si no openpyxl)
+EXCEL_ENGINE = None
+
+# Por debajo de este tamaño total, lanzar procesos cuesta más que leer en secuencia
+PARALLEL_READ_MIN_BYTES = 2 * 1024 * 1024
+
+# Filas por bloque en la lectura streaming de CSV / Parquet
+CSV_CHUNK_ROWS = 100_000
+
+def preferred_excel_engine():
+    """Motor de lectura xlsx a usar (EXCEL_ENGINE o el más rápido instalado)."""
+    if EXCEL_ENGINE:
+        return EXCEL_ENGINE
+    if importlib.util.find_spec("python_calamine") is not None:
+        return "calamine"
+    return None
+
+def read_file_bytes(file):
+    """Contenido de un archivo de entrada (ruta, bytes, archivo subido en Streamlit o buffer)."""
+    if isinstance(file, (bytes, bytearray)):
+        return bytes(file)
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            return f.read()
+    if hasattr(file, 'getvalue'):
+        return file.getvalue()
+    pos = file.tell()
+    file.seek(0)
+    data = file.read()
+    file.seek(pos)
+    return data
+
+def _rewind(file):
+    """Deja el archivo subido / buffer al inicio para volver a leerlo."""
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return file
+
+def _peek_bytes(file, n=65536):
+    """Primeros n bytes del archivo sin consumirlo (para detectar formato, separador y codificación)."""
+    if isinstance(file, (bytes, bytearray)):
+        return bytes(file[:n])
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'rb') as f:
+            return f.read(n)
+    head = _rewind(file).read(n)
+    _rewind(file)
+    return head
+
+def detect_input_format(head):
+    """Formato de entrada por firma de bytes: 'xlsx' (zip/OLE de Excel), 'parquet' o 'csv'."""
+    if head[:4] == b'PAR1':
+        return 'parquet'
+    if head[:2] == b'PK' or head[:4] == b'\xd0\xcf\x11\xe0':
+        return 'xlsx'
+    return 'csv'
+
+def _csv_options(head):
+    """Separador y codificación de un CSV exportado por el ERP (coma o punto y coma; UTF-8 o Latin-1)."""
+    try:
+        text = head.decode('utf-8-sig')
+        encoding = 'utf-8-sig'
+    except UnicodeDecodeError as e:
+        # Un carácter multibyte cortado al final de la muestra no invalida UTF-8
+        if e.start >= len(head) - 3:
+            text, encoding = head[:e.start].decode('utf-8-sig'), 'utf-8-sig'
+        else:
+            text, encoding = head.decode('latin-1'), 'latin-1'
+    first_line = text.splitlines()[0] if text else ''
+    counts = {sep: first_line.count(sep) for sep in (',', ';', '\t', '|')}
+    sep = max(counts, key=counts.get) if any(counts.values()) else ','
+    return {'sep': sep, 'encoding': encoding}
+
+def _parse_text_dates(series):
+    """Fechas en texto (CSV): ISO tal cual, el resto día primero (dd/mm/aaaa, como exporta el ERP)."""
+    if series.dtype != object:
+        return series
+    first = series.dropna()
+    dayfirst = not (len(first) and str(first.iloc[0])[:4].isdigit() and str(first.iloc[0])[4:5] == '-')
+    with warnings.catch_warnings():
+        # Valores que no son fecha (se vuelven NaT): pandas avisa que no pudo inferir el formato
+        warnings.filterwarnings("ignore", message="Could not infer format", category=UserWarning)
+        return pd.to_datetime(series, dayfirst=dayfirst, errors='coerce')
+
+def _as_text(series):
+    """Columna de texto como str (igual que dtype=str en la lectura xlsx/CSV), nulos como NaN."""
+    if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+        # Parquet devuelve None en los nulos; el resto del pipeline espera NaN
+        return series.where(series.notna(), np.nan)
+    mask = series.notna()
+    text = pd.Series(np.nan, index=series.index, dtype=object)
+    text[mask] = series[mask].astype(str)
+    return text
+
+def _read_header(file, fmt, engine=None, csv_options=None):
+    if fmt == 'csv':
+        return pd.read_csv(_rewind(file), nrows=0, **csv_options).columns
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pd.Index(pq.read_schema(_rewind(file)).names)
+    return pd.read_excel(_rewind(file), nrows=0, engine=engine).columns
+
+def _finish_chunk(df, schema):
+    """Renombra a nombres canónicos y ajusta texto/fechas en formatos sin tipos de Excel."""
+    fields = schema_resolver.FILE_SCHEMAS[schema.kind]['fields']
+    df = df.rename(columns={actual: canonical for canonical, actual in schema.mapping.items()})
+    for canonical in df.columns:
+        if fields[canonical].dtype == 'text':
+            df[canonical] = _as_text(df[canonical])
+        elif fields[canonical].dtype == 'date':
+            df[canonical] = _parse_text_dates(df[canonical])
+    return df
+
+def iter_input_chunks(file, kind, chunksize=CSV_CHUNK_ROWS, engine=None):
+    """
+    Lee un archivo de entrada por bloques de ~chunksize filas (CSV y Parquet en streaming;
+    xlsx no admite lectura parcial y se entrega en un solo bloque).
+    Cada bloque sale validado, podado y con nombres canónicos, con un índice de fila único
+    en todo el archivo (apto para process_data_streaming).
+    """
+    if isinstance(file, (bytes, bytearray)):
+        file = BytesIO(file)
+    head = _peek_bytes(file)
+    fmt = detect_input_format(head)
+    engine = engine or preferred_excel_engine()
+    csv_options = _csv_options(head) if fmt == 'csv' else None
+
+    schema = schema_resolver.resolve_columns(kind, _read_header(file, fmt, engine, csv_options))
+    schema_resolver.check_required(schema)
+    if not schema.mapping:
+        yield pd.DataFrame()
+        return
+    usecols = list(schema.mapping.values())
+    dtypes = schema_resolver.read_dtypes(schema)
+
+    if fmt == 'csv':
+        for chunk in pd.read_csv(_rewind(file), usecols=usecols, dtype=dtypes, chunksize=chunksize, **csv_options):
+            yield _finish_chunk(chunk, schema)
+    elif fmt == 'parquet':
+        import pyarrow.parquet as pq
+        offset = 0
+        for batch in pq.ParquetFile(_rewind(file)).iter_batches(batch_size=chunksize, columns=usecols):
+            chunk = batch.to_pandas()
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            offset += len(chunk)
+            yield _finish_chunk(chunk, schema)
+    else:
+        df = pd.read_excel(_rewind(file), usecols=usecols, dtype=dtypes, engine=engine)
+        yield df.rename(columns={actual: canonical for canonical, actual in schema.mapping.items()})
+
+# Filas de muestra que lee la validación previa (además del encabezado)
+PREFLIGHT_SAMPLE_ROWS = 50
+
+def _read_sample(file, nrows):
+    """
+    Encabezado + primeras nrows filas, sin parsear el archivo completo.
+    xlsx se lee con openpyxl (modo streaming: se detiene en nrows); calamine carga la hoja entera.
+    """
+    head = _peek_bytes(file)
+    fmt = detect_input_format(head)
+    if fmt == 'csv':
+        return pd.read_csv(_rewind(file), nrows=nrows, dtype=str, **_csv_options(head))
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(_rewind(file))
+        batch = next(parquet_file.iter_batches(batch_size=max(nrows, 1)), None)
+        table = batch if batch is not None else parquet_file.schema_arrow.empty_table()
+        return table.to_pandas()
+    engine = 'openpyxl' if head[:2] == b'PK' else None
+    return pd.read_excel(_rewind(file), nrows=nrows, engine=engine)
+
+def _sample_type_problems(sample, schema):
+    """Columnas 'number' / 'date' cuya muestra no tiene ni un valor interpretable como tal."""
+    fields = schema_resolver.FILE_SCHEMAS[schema.kind]['fields']
+    problems = []
+    for canonical, actual in schema.mapping.items():
+        expected = fields[canonical].dtype
+        values = sample[actual].dropna()
+        if expected not in ('number', 'date') or values.empty:
+            continue
+        if expected == 'number':
+            parsed = pd.to_numeric(values, errors='coerce')
+            label = 'numérica'
+        else:
+            parsed = _parse_text_dates(values.astype(object))
+            label = 'de fechas'
+        if parsed.isna().all():
+            problems.append(f"la columna '{actual}' no parece {label} (ej. '{values.iloc[0]}')")
+    return problems
+
+def preflight_check(files, sample_rows=PREFLIGHT_SAMPLE_ROWS):
+    """
+    Validación previa de los archivos de entrada {kind: archivo}: lee solo el encabezado y una
+    muestra de filas de cada uno (no el archivo completo) y devuelve TODOS los problemas encontrados
+    como lista de mensajes (vacía si todo está bien):
+    - archivo ilegible o vacío
+    - columnas obligatorias ausentes (indicando si parece ser otro de los reportes)
+    - columnas numéricas / de fecha con contenido de otro tipo
+    - el mismo archivo subido en dos casilleros
+    """
+    problems = []
+    seen = {}
+    for kind, file in files.items():
+        label = schema_resolver.FILE_SCHEMAS[kind]['label']
+        if file is None:
+            problems.append(f"{label}: falta el archivo")
+            continue
+        data = read_file_bytes(file)
+        digest = hashlib.sha256(data).hexdigest()
+        if digest in seen:
+            problems.append(f"{label}: es el mismo archivo subido como {seen[digest]}")
+            continue
+        seen[digest] = label
+
+        try:
+            sample = _read_sample(BytesIO(data), sample_rows)
+        except Exception as e:
+            problems.append(f"{label}: no se pudo leer el archivo ({e})")
+            continue
+
+        schema = schema_resolver.resolve_columns(kind, sample.columns)
+        guessed = schema_resolver.guess_kind(sample.columns)
+        if guessed and guessed != kind:
+            other = schema_resolver.FILE_SCHEMAS[guessed]['label']
+            problems.append(f"{label}: el archivo parece ser {other}")
+            continue
+        if schema.missing and not (schema_resolver.FILE_SCHEMAS[kind]['allow_empty'] and sample.columns.empty):
+            missing = ", ".join(f"'{c}'" for c in schema.missing)
+            problems.append(f"{label}: faltan las columnas {missing}")
+            continue
+        if sample.empty and not schema_resolver.FILE_SCHEMAS[kind]['allow_empty']:
+            problems.append(f"{label}: el archivo no tiene filas")
+            continue
+        problems.extend(f"{label}: {p}" for p in _sample_type_problems(sample, schema))
+    return problems
+
+def read_input_file(file, kind=None, engine=None):
+    """
+    Lee un archivo de entrada (ruta, bytes en memoria o archivo subido en Streamlit) como DataFrame.
+    Formatos: xlsx, CSV (separador y codificación detectados) y Parquet, según la firma del contenido.
+    kind ('ctas' | 'cartera' | 'cobranza'): valida el encabezado antes del parseo completo
+    (SchemaError si faltan columnas obligatorias) y lee solo las columnas mapeadas,
+    con dtype explícito y renombradas a su nombre canónico.
+    engine: motor xlsx (por defecto, preferred_excel_engine()).
+    """
+    if isinstance(file, (bytes, bytearray)):
+        file = BytesIO(file)
+    engine = engine or preferred_excel_engine()
+    if kind is None:
+        head = _peek_bytes(file)
+        fmt = detect_input_format(head)
+        if fmt == 'csv':
+            return pd.read_csv(_rewind(file), **_csv_options(head))
+        if fmt == 'parquet':
+            return pd.read_parquet(_rewind(file))
+        return pd.read_excel(file, engine=engine)
+
+    chunks = list(iter_input_chunks(file, kind, engine=engine))
+    if len(chunks) == 1:
+        return chunks[0]
+    return pd.concat(chunks) if chunks else pd.DataFrame()
+
+def _read_input_worker(data, kind, engine):
+    """Lectura en un proceso del pool (recibe bytes: los archivos subidos no se pueden enviar)."""
+    return read_input_file(data, kind, engine)
+
+def read_input_files(files, parallel=None, use_cache=True):
+    """
+    Lee varios archivos de entrada {kind: archivo} y devuelve {kind: DataFrame}.
+    parallel: None = automático (en paralelo si hay más de un archivo y superan PARALLEL_READ_MIN_BYTES).
+    El parseo xlsx es Python puro (GIL), por eso se usa un pool de procesos y no de hilos
+    (CSV y Parquet son baratos de leer y suelen quedar por debajo del umbral).
+    use_cache: reutiliza el parseo de un archivo con el mismo contenido (ver utils/parse_cache.py).
+    """
+    if not files:
+        return {}
+    contents = {kind: read_file_bytes(f) for kind, f in files.items()}
+    hashes = {kind: hashlib.sha256(data).hexdigest() for kind, data in contents.items()}
+
+    frames = {}
+    if use_cache:
+        for kind in contents:
+            df = parse_cache.load(f"parsed_{kind}", hashes[kind])
+            if df is not None:
+                frames[kind] = df
+    pending = {kind: data for kind, data in contents.items() if kind not in frames}
+
+    if parallel is None:
+        parallel = len(pending) > 1 and sum(len(d) for d in pending.values()) >= PARALLEL_READ_MIN_BYTES
+    engine = preferred_excel_engine()
+    if parallel and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=len(pending)) as pool:
+            futures = {kind: pool.submit(_read_input_worker, data, kind, engine) for kind, data in pending.items()}
+            parsed = {kind: future.result() for kind, future in futures.items()}
+    else:
+        parsed = {kind: read_input_file(data, kind, engine) for kind, data in pending.items()}
+
+    for kind, df in parsed.items():
+        if use_cache:
+            parse_cache.store(f"parsed_{kind}", hashes[kind], df)
+        frames[kind] = df
+    return {kind: frames[kind] for kind in files}
+
+def load_data(file_ctas, file_cartera, file_cobranza, report=None, parallel=None):
     """
     Carga los 3 DataFrames desde los archivos subidos.
     Maneja excepciones de carga.
+    Los 3 archivos se leen en paralelo (ver read_input_files) y solo con las columnas que usa el pipeline.
+    report: StageReport opcional (registra el parseo).
     """
     try:
-        df_ctas = pd.read_excel(file_ctas)
-        df_cartera = pd.read_excel(file_cartera)
-        df_cobranza = pd.read_excel(file_cobranza)
-        return df_ctas, df_cartera, df_cobranza, None
+        with stage(report, "parse_archivos") as st:
+            frames = read_input_files(
+                {'ctas': file_ctas, 'cartera': file_cartera, 'cobranza': file_cobranza},
+                parallel=parallel,
+            )
+            st['rows_out'] = sum(len(df) for df in frames.values())
+        return frames['ctas'], frames['cartera'], frames['cobranza'], None
     except Exception as e:
         return None, None, None, str(e)
 
-def process_data(df_ctas, df_cartera, df_cobranza):
+def normalize_ctas(df_ctas):
     """
-    Aplica la lógica de negocio para fusionar y calcular campos.
+    Etapa 1 (CtasxCobrar): claves de cruce por documento.
+    Agrega codcli_key (6 dígitos), COMPROBANTE (sersun-numsun) y MATCH_KEY (coddoc + sersun + numsun).
     """
-    # 1. Estandarizar claves de cruce
     # CtasxCobrar: codcli
-    # Cartera: codigo_cliente
-    
     # Asegurar tipos string para cruce
-    if 'codcli' in df_ctas.columns:
-        df_ctas['codcli_key'] = df_ctas['codcli'].apply(format_client_code)
-    else:
+    col_codcli = schema_resolver.column_for(df_ctas, 'ctas', 'codcli')
+    if col_codcli is None:
         raise ValueError("Columna 'codcli' no encontrada en CtasxCobrar")
+    df_ctas['codcli_key'] = format_client_code_series(df_ctas[col_codcli])
     
     # --- FILTRO 1: Remover 'tipped' == 'PAV' (ELIMINADO v4.2 - Control en Frontend) ---
     # if 'tipped' in df_ctas.columns:
     #     df_ctas = df_ctas[df_ctas['tipped'].astype(str).str.strip().str.upper() != 'PAV'].copy()
-    pass
 
-    # Buscar columna en Cartera (codigo_cliente o codcli)
-    col_cartera_key = 'codigo_cliente'
-    if 'codcli' in df_cartera.columns:
-        col_cartera_key = 'codcli'
-    elif 'codigo_cliente' not in df_cartera.columns:
+    # Construir Comprobante SUNAT (Relación con Cobranza)
+    # Regla: sersun + "-" + numsun (padding 8)
+    # Se ignora "Documento Referencia" del excel para automatizar desde ERP
+    # Motor columnar: se opera sobre columnas completas en lugar de apply(axis=1)
+    sersun = _column_or_default(df_ctas, 'sersun')
+    numsun = _column_or_default(df_ctas, 'numsun')
+    coddoc = _column_or_default(df_ctas, 'coddoc')
+
+    df_ctas['COMPROBANTE'] = (
+        sersun.astype(str).str.strip()
+        .str.cat(clean_numsun_series(numsun), sep="-")
+    )
+    
+    # --- PROCESAMIENTO CLAVE DE CRUCE (MATCH_KEY) ---
+    # Ctas: coddoc + sersun + numsun(8)
+    # Cobranza: coddoc + numsun
+    # Objetivo: Match perfecto
+    df_ctas['MATCH_KEY'] = (
+        clean_key_part_series(coddoc)
+        .str.cat(clean_key_part_series(sersun))
+        .str.cat(pad_numsun_series(numsun))
+    )
+
+    return df_ctas
+
+def build_cartera_dimension(df_cartera):
+    """
+    Etapa 2 (Cartera): dimensión de clientes con una columna por dato de contacto.
+    Returns: DataFrame [codcli_key, telefono, EMAIL_FINAL, NOTA, Enviar Email]
+    """
+    # Resolución de columnas por encabezado (alias y mayúsculas; cacheada por firma del archivo)
+    cols = schema_resolver.resolve_columns('cartera', df_cartera.columns).mapping
+
+    # Buscar columna en Cartera (codcli o codigo_cliente)
+    col_cartera_key = cols.get('codigo_cliente')
+    if col_cartera_key is None:
         raise ValueError("Columna 'codigo_cliente' no encontrada en Cartera")
         
-    df_cartera['codcli_key'] = df_cartera[col_cartera_key].apply(format_client_code)
+    df_cartera['codcli_key'] = format_client_code_series(df_cartera[col_cartera_key])
     
-    # 2. Cruce Ctas con Cartera (Left Join para mantener todas las cuentas)
     # Traer telefono
-    if 'telefono' not in df_cartera.columns:
+    if 'telefono' in cols:
+        df_cartera['telefono'] = df_cartera[cols['telefono']]
+    else:
         df_cartera['telefono'] = ""
     
     # Validar Columna EMAIL (Flexible)
-    col_email = None
-    for c in df_cartera.columns:
-        if str(c).upper().strip() in ['EMAIL', 'CORREO', 'E-MAIL', 'CORREO_ELECTRONICO', 'MAIL']:
-            col_email = c
-            break
-            
+    col_email = cols.get('email')
     if col_email:
         df_cartera['EMAIL_FINAL'] = df_cartera[col_email].astype(str).str.strip().str.lower()
         # Limpiar 'nan' strings
@@ -105,12 +846,7 @@ def process_data(df_ctas, df_cartera, df_cobranza):
         df_cartera['EMAIL_FINAL'] = ""
 
     # Validar Columna NOTA
-    col_nota = None
-    for c in df_cartera.columns:
-        if str(c).upper().strip() == 'NOTA':
-            col_nota = c
-            break
-            
+    col_nota = cols.get('nota')
     if col_nota:
         df_cartera['NOTA'] = df_cartera[col_nota].astype(str)
         # Limpiar 'nan' strings
@@ -119,12 +855,7 @@ def process_data(df_ctas, df_cartera, df_cobranza):
         df_cartera['NOTA'] = ""
 
     # Validar Columna ENVIAR EMAIL (RC-FEAT-EMAIL-FILTER)
-    col_enviar_email = None
-    for c in df_cartera.columns:
-        if str(c).strip() == 'Enviar Email':
-            col_enviar_email = c
-            break
-            
+    col_enviar_email = cols.get('enviar_email')
     if col_enviar_email:
         df_cartera['Enviar Email'] = df_cartera[col_enviar_email].astype(str)
         # Limpiar 'nan' strings
@@ -133,134 +864,35 @@ def process_data(df_ctas, df_cartera, df_cobranza):
         # Si no existe la columna, crear con valor por defecto
         df_cartera['Enviar Email'] = "SIN CONFIGURAR"
 
+    return df_cartera[['codcli_key', 'telefono', 'EMAIL_FINAL', 'NOTA', 'Enviar Email']]
+
+def merge_ctas_cartera(df_ctas, df_cartera_dim):
+    """
+    Cruce Ctas con Cartera (Left Join para mantener todas las cuentas) y formato de teléfono.
+    """
     df_merged = pd.merge(
         df_ctas, 
-        df_cartera[['codcli_key', 'telefono', 'EMAIL_FINAL', 'NOTA', 'Enviar Email']], 
+        df_cartera_dim, 
         on='codcli_key', 
         how='left'
     )
     
     # Formatear teléfono
-    df_merged['TELÉFONO'] = df_merged['telefono'].apply(format_phone)
-    
-    # 3. Construir Comprobante SUNAT (Relación con Cobranza)
-    # Regla: Preferir Ctas["Documento Referencia"], si no sersun + "-" + numsun (padding 8)
-    def clean_numsun(val):
-        try:
-            return str(int(float(val))).zfill(8)
-        except:
-            return str(val).zfill(8)
-
-    def build_comprobante(row):
-        # Regla: sersun + "-" + numsun (padding 8)
-        # Se ignora "Documento Referencia" del excel para automatizar desde ERP
-        sersun = str(row.get("sersun", "")).strip()
-        numsun = clean_numsun(row.get("numsun", ""))
-        return f"{sersun}-{numsun}"
-
-    df_merged['COMPROBANTE'] = df_merged.apply(build_comprobante, axis=1)
-    
-    # --- PROCESAMIENTO CLAVE DE CRUCE (MATCH_KEY) ---
-    # Usuario solicita: 
-    # Ctas: coddoc + sersun + numsun
-    # Cobranza: coddoc + numsun
-    # Objetivo: Match perfecto
-    
-    def clean_key_part(val):
-        # Normalización robusta: Quitar espacios y guiones para evitar desfases
-        return str(val).strip().replace("-", "").replace(" ", "")
-
-    def pad_numsun(val):
-        # Asegurar 8 dígitos para el número
-        try:
-            return str(int(float(val))).zfill(8)
-        except:
-            # Si no es numérico, intentamos limpiar y rellenar si es corto, o dejar tal cual
-            s = str(val).strip()
-            if len(s) < 8 and s.isdigit():
-                return s.zfill(8)
-            return s
-    
-    def build_match_key_ctas(row):
-        # Concatenación robusta con padding en el número
-        # Cod + Serie + Num(8)
-        return clean_key_part(row.get('coddoc', '')) + clean_key_part(row.get('sersun', '')) + pad_numsun(row.get('numsun', ''))
-        
-    df_merged['MATCH_KEY'] = df_merged.apply(build_match_key_ctas, axis=1)
+    df_merged['TELÉFONO'] = format_phone_series(df_merged['telefono'])
+    return df_merged
 
+def enrich_documents(df_merged, cobranza_lookups, fecha_corte=None, report=None):
+    """
+    Etapa final: cruce con Cobranza (por MATCH_KEY) y cálculo de campos de negocio.
+    Cada documento se calcula de forma independiente, por lo que puede aplicarse sobre un subconjunto de filas.
+    fecha_corte: fecha para DÍAS MORA / ESTADO DEUDA (por defecto, hoy).
+    report: StageReport opcional (registra la etapa de aging).
+    Returns: DataFrame con las columnas finales (final_cols), mismo índice que df_merged.
+    """
     # 4. Calcular Detracción y Estado (Cruce con Cobranza)
-    # En Cobranza, clave ahora será MATCH_KEY (coddoc + numsun)
-    
-    def build_match_key_cobranza(row):
-        # Concatenación robusta
-        return clean_key_part(row.get('coddoc', '')) + clean_key_part(row.get('numsun', ''))
-    
-    if 'numsun' not in df_cobranza.columns:
-         # Intentar normalizar si se llama diferente, pero prompt dice numsun
-         pass
-    
-    # Preparar tabla de Cobranzas DT
-    # Filtrar solo 'DT'
-    if 'forpag' in df_cobranza.columns:
-        df_dt = df_cobranza[df_cobranza['forpag'] == 'DT'].copy()
-    else:
-        df_dt = pd.DataFrame() # Si no hay columna forpag, no hay DTs
-        
-    # Agrupar por numsun para evitar duplicados si hubo pagos parciales DT (aunque raro en detracción)
-    # Regla: "Si SÍ existe registro DT -> mostrar cadena legible"
-    # Tomamos el último pago DT si hubiera varios
-    
-    if not df_dt.empty:
-        # Asegurar formato de clave en Cobranza
-        df_dt['MATCH_KEY'] = df_dt.apply(build_match_key_cobranza, axis=1)
-        
-        # Crear texto formateado detallado con saltos de línea (para Excel con ajuste de texto)
-        # Campos: codbco, nombco, fecpro, mondoc, monpag, forpag, nudopa
-        def format_dt_info(row):
-            fec = pd.to_datetime(row.get('fecpro', '')).strftime('%d/%m/%Y') if pd.notna(row.get('fecpro')) else ''
-            
-            # Formatear montos con coma y 2 decimales para el texto (ojo: esto es texto para leer, no numero para sumar)
-            try:
-                m_doc = f"{float(row.get('mondoc', 0)):,.2f}"
-                m_pag = f"{float(row.get('monpag', 0)):,.2f}"
-            except:
-                m_doc = str(row.get('mondoc', ''))
-                m_pag = str(row.get('monpag', ''))
-
-            return (f"Banco: {row.get('nombco', '')} ({row.get('codbco', '')})\n"
-                    f"Fecha: {fec}\n"
-                    f"Doc: {m_doc}\n"
-                    f"Pag: {m_pag}\n"
-                    f"Forma: {row.get('forpag', '')}\n"
-                    f"Oper: {row.get('nudopa', '')}")
-
-        df_dt['info_dt'] = df_dt.apply(format_dt_info, axis=1)
-        
-        # Deduplicar por MATCH_KEY
-        dt_lookup = df_dt.groupby('MATCH_KEY')['info_dt'].apply(lambda x: "\n---\n".join(x))
-        # Lookup de Monto pagado (Suma por si acaso, aunque debería ser único)
-        dt_amount_lookup = df_dt.groupby('MATCH_KEY')['monpag'].sum()
-    else:
-        dt_lookup = pd.Series(dtype='object')
-        dt_amount_lookup = pd.Series(dtype='float')
+    # Cobranza se agrega UNA vez por MATCH_KEY (coddoc + numsun) y se une a Ctas con un left join
+    df_merged = df_merged.join(cobranza_lookups, on='MATCH_KEY')
 
-    # --- NUEVA LÓGICA: AMORTIZACIONES (todo lo que NO sea DT) ---
-    if not df_cobranza.empty:
-        # Filtrar NO DT y NO DET
-        df_amort = df_cobranza[~df_cobranza['forpag'].isin(['DT', 'DET'])].copy()
-    else:
-        df_amort = pd.DataFrame()
-        
-    if not df_amort.empty:
-        # Usar MATCH_KEY también para amortizaciones
-        df_amort['MATCH_KEY'] = df_amort.apply(build_match_key_cobranza, axis=1)
-        # Usar la misma función de formato
-        df_amort['info_amort'] = df_amort.apply(format_dt_info, axis=1)
-        # Agrupar concatenando
-        amort_lookup = df_amort.groupby('MATCH_KEY')['info_amort'].apply(lambda x: "\n---\n".join(x))
-    else:
-        amort_lookup = pd.Series(dtype='object')
-        
     # 5. Cálculos Finales en Merged
     
     # Importe Referencial (S/) - antes mondoc
@@ -271,57 +903,39 @@ def process_data(df_ctas, df_cartera, df_cobranza):
         # Fallback si no existe, aunque debería
         df_merged['Importe Referencial (S/)'] = 0.0
     
-    # Helper detracción (Nueva Lógica con Prioridad Lookup)
-    def calc_detraccion_final(row):
-        match_key = row['MATCH_KEY']
-        
-        # 1. Prioridad: Si existe en Cobranza (DT), usar ese monto exacto
-        if match_key in dt_amount_lookup.index:
-            try:
-                # Usar el valor encontrado
-                val_dt = float(dt_amount_lookup[match_key])
-                return round(val_dt, 0)
-            except:
-                pass # Fallback a cálculo si falla conversión
-        
-        # 2. Respaldo: Regla de Negocio (> 700 -> 12%)
-        try:
-            monto = float(row.get("Importe Referencial (S/)", 0))
-            if monto > 700.00:
-                return round(monto * 0.12, 0)
-            return 0.00
-        except:
-            return 0.00
-
-    df_merged['DETRACCIÓN'] = df_merged.apply(calc_detraccion_final, axis=1)
+    # Detracción (Prioridad Lookup)
+    # 1. Prioridad: Si existe en Cobranza (DT), usar ese monto exacto
+    # 2. Respaldo: Regla de Negocio (> 700 -> 12%)
+    in_dt = df_merged['DT_INFO'].notna()
+    monto_dt = pd.to_numeric(df_merged['DT_MONTO'], errors='coerce')
+    monto_ref = pd.to_numeric(df_merged['Importe Referencial (S/)'], errors='coerce')
+
+    detraccion_regla = np.where(monto_ref > 700.00, np.round(monto_ref * 0.12, 0), 0.00)
+    df_merged['DETRACCIÓN'] = np.where(
+        in_dt & monto_dt.notna(),
+        np.round(monto_dt, 0),
+        detraccion_regla
+    ).astype(float)
     
     # Estado Detracción
-    def get_estado_dt(row):
-        if row['DETRACCIÓN'] == 0:
-            return "No Aplica" 
-        
-        if row['DETRACCIÓN'] <= 0:
-            return "-"
-
-        comprobante = row['COMPROBANTE'] # Visual
-        match_key = row['MATCH_KEY'] # Internal key
-        
-        if match_key in dt_lookup.index:
-            return dt_lookup[match_key]
-        else:
-            return "Pendiente"
-
-    df_merged['ESTADO DETRACCION'] = df_merged.apply(get_estado_dt, axis=1)
+    # 0 -> "No Aplica" | negativo -> "-" | pagado en Cobranza -> detalle DT | resto -> "Pendiente"
+    detraccion = df_merged['DETRACCIÓN']
+    df_merged['ESTADO DETRACCION'] = np.select(
+        [
+            detraccion == 0,
+            detraccion <= 0,
+            in_dt,
+        ],
+        [
+            "No Aplica",
+            "-",
+            df_merged['DT_INFO'].astype(object),
+        ],
+        default="Pendiente"
+    ).astype(object)
 
     # Columna AMORTIZACIONES
-    def get_amortizaciones(row):
-        match_key = row['MATCH_KEY']
-        # Buscar en amort_lookup
-        if match_key in amort_lookup.index:
-            return amort_lookup[match_key]
-        return "-" # O vacío
-    
-    df_merged['AMORTIZACIONES'] = df_merged.apply(get_amortizaciones, axis=1)
+    df_merged['AMORTIZACIONES'] = df_merged['AMORT_INFO'].fillna("-")
 
     # 6. Selección y Ordenamiento de Columnas Finales
     # COD CLIENTE (6 dígitos, texto)
@@ -345,7 +959,6 @@ def process_data(df_ctas, df_cartera, df_cobranza):
     df_merged['MONEDA'] = df_merged['codmnd']
     df_merged['TIPO CAMBIO'] = df_merged['tipcam']
     df_merged['MONT EMIT'] = df_merged['mododo']
-    df_merged['MONT EMIT'] = df_merged['mododo']
     df_merged['SALDO'] = df_merged['sldacl']
     
     # Campo Nuevo v3.5
@@ -359,108 +972,24 @@ def process_data(df_ctas, df_cartera, df_cobranza):
     # Si ESTADO DETRACCION != "Pendiente" (es decir, ya se pagó/aplicó): Saldo Real = Saldo
     # Si ESTADO DETRACCION == "Pendiente":
     #    Si Moneda == 'SOL': Saldo Real = Saldo - Detracción
-    #    Si Moneda == 'USD': Saldo Real = Saldo - (Detracción / Tipo Cambio)
-    
-    def calc_saldo_real(row):
-        saldo = float(row.get('SALDO', 0.0))
-        detraccion = float(row.get('DETRACCIÓN', 0.0))
-        estado_dt = row.get('ESTADO DETRACCION', '')
-        moneda = str(row.get('MONEDA', '')).strip().upper()
-        tc = float(row.get('TIPO CAMBIO', 1.0))
-        
-        # Si no aplica detracción (ej. monto bajo), el saldo real es el saldo
-        if detraccion <= 0:
-            return saldo
-
-        # Si ya se aplicó la detracción (encontrado en cobranza), el saldo ya considera eso?
-        # El usuario dijo: "si en el archivo de cobranza ya se aplico la detracción... no debe afectar el saldo... significa que es un saldo real"
-        # "si no existira la aplicación... el saldo real... sera el monto del saldo menos el importe de la detracción"
-        
-        if estado_dt == "Pendiente":
-            # Restar la detracción
-            if moneda == 'US$': # Caso Dolares
-                 # Detraccion esta en soles, convertir a dolares para restar
-                 if tc > 0:
-                     deduccion_usd = detraccion / tc
-                     return saldo - deduccion_usd
-                 else:
-                     return saldo # Evitar div0
-            else:
-                # Caso Soles
-                return saldo - detraccion
-        else:
-            # Estado != Pendiente (Pagado, o info de banco) -> Saldo se mantiene
-            return saldo
-
-    df_merged['SALDO REAL'] = df_merged.apply(calc_saldo_real, axis=1)
+    #    Si Moneda == 'US$': Saldo Real = Saldo - (Detracción / Tipo Cambio)
+    df_merged['SALDO REAL'] = calc_saldo_real(
+        df_merged['SALDO'],
+        df_merged['DETRACCIÓN'],
+        df_merged['ESTADO DETRACCION'],
+        df_merged['MONEDA'],
+        df_merged['TIPO CAMBIO'],
+    )
 
     # --- EXPERT REFINEMENTS v4.0: Aging & Formatting ---
     
-    # 1. DÍAS MORA & ESTADO (Semaforización)
-    today = date.today()
-    
-    def calc_aging(row):
-        try:
-            venc = row['FECH VENC']
-            if pd.isna(venc): return 0, "Indeterminado"
-            
-            # Ensure venc is date object
-            if isinstance(venc, pd.Timestamp): venc = venc.date()
-            
-            delta = (today - venc).days
-            
-            # Estado (Semáforo Textual)
-            if delta < 0:
-                status = "🟢 Por Vencer"
-            elif delta <= 8:
-                status = "🟡 Gestión Preventiva"
-            elif delta <= 30:
-                status = "🟠 Gestión Administrativa"
-            else:
-                status = "🔴 Gestión Pre-Legal"
-                
-            return delta, status
-        except:
-            return 0, "Error"
-
-    # Apply aging
-    aging_results = df_merged.apply(calc_aging, axis=1, result_type='expand')
-    df_merged['DÍAS MORA'] = aging_results[0]
-    df_merged['ESTADO DEUDA'] = aging_results[1]
-
-    # 2. Formato Moneda Integrado (Pegar símbolo al valor)
-    # Columnas a formatear: MONT EMIT, DETRACCIÓN, SALDO, SALDO REAL
-    
-    def format_currency_cell(row, col_name):
-        try:
-            amount = float(row.get(col_name, 0))
-            if amount == 0: return "-" # Limpieza visual
-            
-            # Obtener símbolo
-            mon = str(row.get('MONEDA', '')).strip().upper()
-            
-            # REGLA DE NEGOCIO: La Detracción SIEMPRE es en Soles
-            if col_name == 'DETRACCIÓN':
-                symbol = "S/"
-            else:
-                symbol = "S/" if mon.startswith('S') else "$"
-            
-            return f"{symbol} {amount:,.2f}"
-        except:
-            return str(row.get(col_name, ""))
-
-    # Crear columnas formateadas para Display (Las numéricas se quedan para cálculos si hicieran falta)
-    # Sobreescribimos las columnas para el reporte final directo? 
-    # El usuario pidió "pegar como parte de la celda". 
-    # Si sobreescribimos, perdemos la capacidad de sumar en Excel numéricamente fácil? 
-    # El usuario dijo "el cuadro resultante", implicando lo que ve.
-    # Para Excel export, mejor tener strings visuales. 
-    
-    cols_to_format = ['MONT EMIT', 'DETRACCIÓN', 'SALDO', 'SALDO REAL']
-    for col in cols_to_format:
-        # Crear columna _DISPLAY para visualización, mantener original numérica para cálculos
-        display_col = f"{col}_DISPLAY"
-        df_merged[display_col] = df_merged.apply(lambda r: format_currency_cell(r, col), axis=1)
+    # 1. DÍAS MORA & ESTADO (Semaforización) a la fecha de corte
+    fecha_corte = fecha_corte or date.today()
+    with stage(report, "aging", len(df_merged)) as st:
+        df_merged['DÍAS MORA'], df_merged['ESTADO DEUDA'] = calc_aging(df_merged['FECH VENC'], fecha_corte)
+        st['rows_out'] = len(df_merged)
+
+    # 2. Formato Moneda: NO se materializa en df_final (ver format_display_columns)
 
     # Alias Visual (RC-REQ: Mostrar Correo en Reporte)
     # Se usa EMAIL_FINAL como fuente (limpia), pero se expone como CORREO
@@ -478,10 +1007,10 @@ def process_data(df_ctas, df_cartera, df_cobranza):
         'DÍAS MORA', 'ESTADO DEUDA',
         'MONEDA',
         'TIPO CAMBIO', # AGREGADO v4.3.2
-        'MONT EMIT', 'MONT EMIT_DISPLAY',
-        'SALDO REAL', 'SALDO REAL_DISPLAY',
-        'SALDO', 'SALDO_DISPLAY',
-        'DETRACCIÓN', 'DETRACCIÓN_DISPLAY',
+        'MONT EMIT',
+        'SALDO REAL',
+        'SALDO',
+        'DETRACCIÓN',
         'ESTADO DETRACCION', 
         'AMORTIZACIONES',
         'MATCH_KEY',
@@ -493,4 +1022,48 @@ def process_data(df_ctas, df_cartera, df_cobranza):
     # Filtrar solo columnas existentes (por seguridad, aunque deberian estar todas)
     final_cols = [c for c in final_cols if c in df_merged.columns]
     
-    return df_merged[final_cols]
+    df_final = apply_output_schema(df_merged[final_cols])
+    df_final.attrs['fecha_corte'] = _fecha_corte_key(fecha_corte)
+    return df_final
+
+def process_partition(df_ctas, df_cartera_dim, cobranza_lookups, fecha_corte=None):
+    """
+    Cruce y enriquecimiento de un subconjunto de CtasxCobrar ya normalizado (bloque o partición).
+    El índice de salida es el índice de fila original en CtasxCobrar, para poder unir
+    los resultados parciales de forma determinista (concat + sort_index).
+    """
+    df_ctas = df_ctas.assign(_row_id=df_ctas.index)
+    df_merged = merge_ctas_cartera(df_ctas, df_cartera_dim)
+    row_ids = df_merged['_row_id'].to_numpy()
+    df_part = enrich_documents(df_merged, cobranza_lookups, fecha_corte)
+    df_part.index = pd.Index(row_ids)
+    return df_part
+
+def process_data(df_ctas, df_cartera, df_cobranza, fecha_corte=None, report=None):
+    """
+    Aplica la lógica de negocio para fusionar y calcular campos.
+    fecha_corte: fecha para el cálculo de mora (por defecto, hoy).
+    report: StageReport opcional; registra tiempo, CPU, filas y memoria por etapa.
+    """
+    # 1. Estandarizar claves de cruce
+    with stage(report, "normalizar_claves", len(df_ctas)) as st:
+        df_ctas = normalize_ctas(df_ctas)
+        st['rows_out'] = len(df_ctas)
+    with stage(report, "dimension_cartera", len(df_cartera)) as st:
+        df_cartera_dim = build_cartera_dimension(df_cartera)
+        st['rows_out'] = len(df_cartera_dim)
+
+    # 2. Cruce Ctas con Cartera (rows_out > rows_in indica clientes duplicados en Cartera)
+    with stage(report, "merge_cartera", len(df_ctas)) as st:
+        df_merged = merge_ctas_cartera(df_ctas, df_cartera_dim)
+        st['rows_out'] = len(df_merged)
+
+    # 3. Cruce con Cobranza y campos finales
+    with stage(report, "agrupar_cobranza", len(df_cobranza)) as st:
+        lookups = build_cobranza_lookups(df_cobranza)
+        st['rows_out'] = len(lookups)
+    with stage(report, "enriquecer_documentos", len(df_merged)) as st:
+        df_final = enrich_documents(df_merged, lookups, fecha_corte, report)
+        st['rows_out'] = len(df_final)
+    return df_final
+
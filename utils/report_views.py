@@ -0,0 +1,143 @@
+"""
+Vistas Derivadas de df_final (Reporte General)
+Filtros, listas de opciones de los filtros y KPIs por moneda, separados de los widgets de la app.
+ViewCache memoiza estas vistas por sesión: Streamlit re-ejecuta app.py en cada interacción y,
+sin caché, cada clic volvía a copiar y filtrar df_final completo y a recalcular los KPIs.
+"""
+
+import weakref
+from collections import OrderedDict
+
+from utils.processing import DISPLAY_CURRENCY_COLS, format_display_columns
+
+# Vistas memoizadas por sesión (combinaciones de filtros recientes)
+VIEW_CACHE_ENTRIES = 8
+
+# Columnas con lista de opciones en los filtros
+OPTION_COLUMNS = ['EMPRESA', 'ESTADO DETRACCION', 'MONEDA', 'TIPO PEDIDO', 'Enviar Email']
+
+_SALDO_OPS = {
+    "Mayor que": lambda s, ref: s > ref,
+    "Mayor o igual que": lambda s, ref: s >= ref,
+    "Menor que": lambda s, ref: s < ref,
+    "Menor o igual que": lambda s, ref: s <= ref,
+    "Igual a": lambda s, ref: s == ref,
+}
+
+
+class ViewCache:
+    """
+    Caché LRU de vistas de un df_final. Las entradas valen mientras df_final sea el mismo objeto
+    (referencia débil: un df_final nuevo, p. ej. otro ciclo o la mora recalculada, invalida todo).
+    Si df_final se modifica en el lugar (tracking tras un envío) hay que llamar a invalidate().
+    Las vistas devueltas se comparten entre reruns: no modificarlas en el lugar.
+    """
+
+    def __init__(self, max_entries=VIEW_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._source = None
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, df_source, key, compute):
+        """Vista `key` de df_source; compute() solo se ejecuta si no está en caché."""
+        if self._source is None or self._source() is not df_source:
+            self._entries.clear()
+            self._source = weakref.ref(df_source)
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        value = compute()
+        self._entries[key] = value
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        self._entries.clear()
+
+
+def filter_options(df_final):
+    """Valores ordenados de cada columna con filtro de lista: {columna: [valores]}."""
+    return {
+        col: sorted(df_final[col].astype(str).unique().tolist())
+        for col in OPTION_COLUMNS if col in df_final.columns
+    }
+
+
+def filters_key(filters):
+    """Clave hashable del estado de los filtros (listas -> tuplas)."""
+    return tuple(sorted((k, tuple(v) if isinstance(v, (list, tuple)) else v) for k, v in filters.items()))
+
+
+def apply_filters(df_final, filters):
+    """
+    Aplica los filtros del Reporte General (todos se combinan con AND sobre las filas).
+    filters: empresas, estado, moneda, search, has_email, has_phone, tipos_pedido,
+             saldo_op / saldo_ref, enviar_email (valores vacíos, None o "Todos" no filtran).
+    La búsqueda de texto va al final: formatea los montos solo de las filas que quedan.
+    """
+    df = df_final
+    if filters.get('empresas'):
+        df = df[df['EMPRESA'].astype(str).isin(filters['empresas'])]
+    if filters.get('estado', "Todos") != "Todos":
+        df = df[df['ESTADO DETRACCION'].astype(str) == filters['estado']]
+    if filters.get('moneda', "Todos") != "Todos":
+        df = df[df['MONEDA'].astype(str) == filters['moneda']]
+    if filters.get('has_email'):
+        df = df[df['CORREO'].notna() & (df['CORREO'].str.strip() != '')]
+    if filters.get('has_phone'):
+        df = df[df['TELÉFONO'].notna() & (df['TELÉFONO'].astype(str).str.strip() != '')]
+    if filters.get('tipos_pedido'):
+        df = df[df['TIPO PEDIDO'].astype(str).isin(filters['tipos_pedido'])]
+    if filters.get('saldo_op') in _SALDO_OPS:
+        # Redondeo a 2 decimales para consistencia con Excel
+        df = df[_SALDO_OPS[filters['saldo_op']](df['SALDO REAL'].round(2), filters.get('saldo_ref', 0.0))]
+    if filters.get('enviar_email') and 'Enviar Email' in df.columns:
+        df = df[df['Enviar Email'].astype(str).isin(filters['enviar_email'])]
+    if filters.get('search'):
+        # Buscar sobre los montos formateados ("S/ 1,234.50") y también sobre el número sin formato ("1234.5")
+        def matches(frame):
+            return frame.astype(str).apply(lambda x: x.str.contains(filters['search'], case=False, na=False)).any(axis=1)
+        amount_cols = [c for c in DISPLAY_CURRENCY_COLS if c in df.columns]
+        df = df[matches(format_display_columns(df)) | matches(df[amount_cols])]
+    # Siempre una copia propia: df_final (SSOT) no se comparte con la vista
+    return df.copy() if df is df_final else df
+
+
+def kpi_totals(df_filtered):
+    """
+    Totales del tablero por moneda. 'S' al inicio = Soles (startswith: 'US$' no cae en Soles).
+    REGLA DE NEGOCIO: la Detracción siempre suma en Soles, sin importar la moneda del documento.
+    """
+    def safe_sum(df, col):
+        return df[col].sum() if col in df.columns else 0.0
+
+    is_soles = df_filtered['MONEDA'].astype(str).str.startswith('S', na=False)
+    df_sol, df_dol = df_filtered[is_soles], df_filtered[~is_soles]
+    return {
+        't_sal_s': safe_sum(df_sol, 'SALDO'),
+        't_detru_global_s': safe_sum(df_filtered, 'DETRACCIÓN'),
+        't_real_s': safe_sum(df_sol, 'SALDO REAL'),
+        'count_s': len(df_sol),
+        't_sal_d': safe_sum(df_dol, 'SALDO'),
+        't_real_d': safe_sum(df_dol, 'SALDO REAL'),
+        'count_d': len(df_dol),
+    }
+
+
+def currency_totals_text(docs_cli):
+    """
+    Total por moneda de los documentos de un cliente para el mensaje de WhatsApp:
+    "S/ 138.08 (03 documentos) y $ 50.00 (01 documentos)". Solo las monedas presentes
+    (MONEDA es categórica: observed=True evita filas en cero de las demás).
+    """
+    currency_stats = docs_cli.groupby('MONEDA', observed=True)['SALDO REAL'].agg(['count', 'sum'])
+    total_parts = []
+    for curr, stats in currency_stats.iterrows():
+        symbol = "S/" if str(curr).upper().startswith("S") else "$"
+        total_parts.append(f"{symbol} {stats['sum']:,.2f} ({int(stats['count']):02d} documentos)")
+    return " y ".join(total_parts) if total_parts else "0.00"
@@ -0,0 +1,146 @@
+"""
+Resolución de Esquema de Archivos de Entrada (CtasxCobrar, Cartera, Cobranza; xlsx, CSV o Parquet)
+Mapea los encabezados de un archivo a las columnas canónicas que usa el pipeline
+(alias, mayúsculas/espacios) y declara el dtype de lectura de cada una.
+El mapeo se cachea por firma de encabezado: los archivos diarios del ERP repiten
+siempre las mismas columnas, así que la resolución se hace una sola vez.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+
+# Campo canónico:
+# - aliases: nombres aceptados (se comparan con el encabezado en mayúsculas y sin espacios laterales)
+# - required: el archivo se rechaza si falta
+# - dtype: 'text' se lee como str (códigos, series, nombres); 'date' se interpreta como fecha cuando
+#   el formato no la tipa (CSV); 'number' debe ser numérica (lo verifica la validación previa);
+#   None deja que pandas infiera
+# - alias_priority: si hay varias columnas candidatas gana el primer alias (si no, la primera columna)
+Field = namedtuple('Field', ['aliases', 'required', 'dtype', 'alias_priority'], defaults=(False, None, False))
+
+ResolvedSchema = namedtuple('ResolvedSchema', ['kind', 'mapping', 'missing', 'signature'])
+
+FILE_SCHEMAS = {
+    'ctas': {
+        'label': 'CtasxCobrar',
+        'allow_empty': False,
+        'fields': {
+            'codcli': Field(('CODCLI',), required=True, dtype='text'),
+            'nomcli': Field(('NOMCLI',), required=True, dtype='text'),
+            'coddoc': Field(('CODDOC',), dtype='text'),
+            'sersun': Field(('SERSUN',), dtype='text'),
+            'numsun': Field(('NUMSUN',), dtype='text'),
+            'fecdoc': Field(('FECDOC',), required=True, dtype='date'),
+            'fecvct': Field(('FECVCT',), required=True, dtype='date'),
+            'codmnd': Field(('CODMND',), required=True, dtype='text'),
+            'tipcam': Field(('TIPCAM',), required=True, dtype='number'),
+            'mododo': Field(('MODODO',), required=True, dtype='number'),
+            'mondoc': Field(('MONDOC',)),
+            'sldacl': Field(('SLDACL',), required=True, dtype='number'),
+            'tipped': Field(('TIPPED',), dtype='text'),
+        },
+    },
+    'cartera': {
+        'label': 'Cartera',
+        'allow_empty': False,
+        'fields': {
+            'codigo_cliente': Field(('CODCLI', 'CODIGO_CLIENTE'), required=True, dtype='text', alias_priority=True),
+            'telefono': Field(('TELEFONO',), dtype='text'),
+            'email': Field(('EMAIL', 'CORREO', 'E-MAIL', 'CORREO_ELECTRONICO', 'MAIL'), dtype='text'),
+            'nota': Field(('NOTA',), dtype='text'),
+            'enviar_email': Field(('ENVIAR EMAIL', 'ENVIAR_EMAIL'), dtype='text'),
+        },
+    },
+    'cobranza': {
+        'label': 'Cobranza',
+        'allow_empty': True,  # Un día sin pagos puede venir como hoja vacía
+        'fields': {
+            'coddoc': Field(('CODDOC',), dtype='text'),
+            'numsun': Field(('NUMSUN',), required=True, dtype='text'),
+            'forpag': Field(('FORPAG',), required=True, dtype='text'),
+            'monpag': Field(('MONPAG',)),
+            'mondoc': Field(('MONDOC',)),
+            'fecpro': Field(('FECPRO',), dtype='date'),
+            'nombco': Field(('NOMBCO',), dtype='text'),
+            'codbco': Field(('CODBCO',), dtype='text'),
+            'nudopa': Field(('NUDOPA',), dtype='text'),
+        },
+    },
+}
+
+
+class SchemaError(ValueError):
+    """Archivo de entrada sin columnas obligatorias (se detecta antes del parseo completo)."""
+
+
+def header_signature(columns):
+    """Firma del encabezado (nombres en orden), clave del caché de resolución."""
+    return "|".join(str(c) for c in columns)
+
+
+def _normalize_header(name):
+    return str(name).strip().upper()
+
+
+@lru_cache(maxsize=256)
+def _resolve_cached(kind, columns):
+    fields = FILE_SCHEMAS[kind]['fields']
+    normalized = [_normalize_header(c) for c in columns]
+    mapping, missing = {}, []
+
+    for canonical, field in fields.items():
+        candidates = [i for i, name in enumerate(normalized) if name in field.aliases]
+        if field.alias_priority:
+            candidates.sort(key=lambda i: field.aliases.index(normalized[i]))
+        if candidates:
+            mapping[canonical] = columns[candidates[0]]
+        elif field.required:
+            missing.append(canonical)
+
+    return ResolvedSchema(kind, mapping, tuple(missing), header_signature(columns))
+
+
+def resolve_columns(kind, columns):
+    """
+    Resuelve el encabezado de un archivo ('ctas' | 'cartera' | 'cobranza').
+    Returns: ResolvedSchema(kind, mapping {canónica: columna real}, missing (obligatorias ausentes), signature)
+    """
+    if kind not in FILE_SCHEMAS:
+        raise KeyError(f"Tipo de archivo desconocido: {kind}")
+    return _resolve_cached(kind, tuple(columns))
+
+
+def check_required(schema):
+    """Lanza SchemaError si faltan columnas obligatorias (mismo mensaje que el pipeline)."""
+    if schema.missing and not (FILE_SCHEMAS[schema.kind]['allow_empty'] and not schema.signature):
+        label = FILE_SCHEMAS[schema.kind]['label']
+        missing = ", ".join(f"'{c}'" for c in schema.missing)
+        raise SchemaError(f"Columna {missing} no encontrada en {label}")
+
+
+def guess_kind(columns):
+    """
+    Tipo de archivo más probable para un encabezado: entre los que tienen todas sus columnas
+    obligatorias, el más específico (más obligatorias). None si no encaja con ninguno.
+    """
+    best, best_required = None, 0
+    for kind, spec in FILE_SCHEMAS.items():
+        n_required = sum(1 for f in spec['fields'].values() if f.required)
+        if not resolve_columns(kind, columns).missing and n_required > best_required:
+            best, best_required = kind, n_required
+    return best
+
+
+def read_dtypes(schema):
+    """dtype de lectura por columna real (solo columnas de texto; el resto se infiere)."""
+    fields = FILE_SCHEMAS[schema.kind]['fields']
+    return {actual: str for canonical, actual in schema.mapping.items() if fields[canonical].dtype == 'text'}
+
+
+def column_for(df, kind, canonical):
+    """Nombre real de la columna canónica en df (None si el archivo no la trae)."""
+    return resolve_columns(kind, df.columns).mapping.get(canonical)
+
+
+def cache_info():
+    return _resolve_cached.cache_info()
@@ -0,0 +1,116 @@
+"""
+Instrumentación por Etapa del Pipeline (tiempos, filas y memoria)
+Cada etapa registra: tiempo de pared, tiempo de CPU, filas de entrada/salida y, si se pide
+(track_memory=True), pico de memoria asignada durante la etapa (tracemalloc). Las etapas pueden
+anidarse (p. ej. aging dentro de enriquecimiento); el pico de la etapa padre incluye el de sus hijas.
+tracemalloc intercepta cada asignación: hace el pipeline ~3x más lento y distorsiona los tiempos
+por etapa, por eso viene apagado (solo para diagnóstico, p. ej. cli.py --perfil-memoria).
+"""
+
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class StageReport:
+    """Reporte estructurado de etapas. Se pasa opcionalmente a load_data / process_data."""
+
+    def __init__(self, track_memory=False):
+        self.track_memory = track_memory
+        self.stages = []
+        self._stack = []
+        self._started_tracing = False
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Mide una etapa. El bloque recibe el registro y puede fijar record['rows_out'].
+        """
+        record = {
+            'etapa': name,
+            'nivel': len(self._stack),
+            'rows_in': rows_in,
+            'rows_out': None,
+            'wall_s': None,
+            'cpu_s': None,
+            'peak_mb': None,
+        }
+        frame = {'record': record, 'base': 0, 'peak': 0}
+        self._enter_memory(frame)
+        self._stack.append(frame)
+        self.stages.append(record)
+        wall_0, cpu_0 = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_s'] = time.perf_counter() - wall_0
+            record['cpu_s'] = time.process_time() - cpu_0
+            self._stack.pop()
+            self._exit_memory(frame)
+
+    def _enter_memory(self, frame):
+        if not self.track_memory:
+            return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        current, peak = tracemalloc.get_traced_memory()
+        if self._stack:
+            parent = self._stack[-1]
+            parent['peak'] = max(parent['peak'], peak)
+        tracemalloc.reset_peak()
+        frame['base'] = current
+        frame['peak'] = current
+
+    def _exit_memory(self, frame):
+        if not self.track_memory:
+            return
+        _, peak = tracemalloc.get_traced_memory()
+        frame['peak'] = max(frame['peak'], peak)
+        frame['record']['peak_mb'] = round((frame['peak'] - frame['base']) / 1e6, 3)
+        if self._stack:
+            parent = self._stack[-1]
+            parent['peak'] = max(parent['peak'], frame['peak'])
+            tracemalloc.reset_peak()
+        elif self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def warnings(self):
+        """Alertas de forma de datos: etapas que multiplican filas (fan-out de un merge)."""
+        alerts = []
+        for r in self.stages:
+            if r['rows_in'] and r['rows_out'] is not None and r['rows_out'] > r['rows_in']:
+                alerts.append(f"{r['etapa']}: {r['rows_in']:,} → {r['rows_out']:,} filas (fan-out)")
+        return alerts
+
+    def to_frame(self):
+        columns = ['etapa', 'nivel', 'rows_in', 'rows_out', 'wall_s', 'cpu_s', 'peak_mb']
+        return pd.DataFrame(self.stages, columns=columns)
+
+    def total_seconds(self):
+        return sum(r['wall_s'] or 0 for r in self.stages if r['nivel'] == 0)
+
+    def log(self, log=None):
+        """Escribe una línea por etapa (y las alertas de fan-out) en el logger."""
+        log = log or logger
+        for r in self.stages:
+            log.info(
+                "stage=%s%s rows_in=%s rows_out=%s wall=%.3fs cpu=%.3fs peak=%sMB",
+                "  " * r['nivel'], r['etapa'], r['rows_in'], r['rows_out'],
+                r['wall_s'] or 0, r['cpu_s'] or 0, r['peak_mb'],
+            )
+        for alert in self.warnings():
+            log.warning("stage fan-out: %s", alert)
+
+
+def stage(report, name, rows_in=None):
+    """Etapa medida si hay reporte; sin reporte no tiene costo (el registro se descarta)."""
+    if report is None:
+        return nullcontext({})
+    return report.stage(name, rows_in)
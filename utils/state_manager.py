@@ -1,60 +1,494 @@
+import csv
+import glob
+import json
 import os
 import pandas as pd
 import datetime
 import shutil
+import uuid
+from functools import lru_cache
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from utils.helpers import sanitize_filename
+from utils.processing import apply_output_schema, TEXT_DTYPE
 
 # Define cache directory
 CACHE_DIR = ".cache"
+
+# Snapshots versionados por operador y ciclo: .cache/sessions/<operador>/<cycle_id>/session-<timestamp>.parquet
+# (se conservan las últimas N generaciones de cada ciclo). Dos cobradores o un ciclo nuevo no se pisan.
+SESSION_SUBDIR = "sessions"
+SESSION_GENERATIONS = 3
+DEFAULT_OPERATOR = "default"
+DEFAULT_CYCLE = "default_cycle"
+
+# Presupuesto de disco de todas las sesiones: superado, se expulsan los ciclos usados hace más tiempo
+# (último acceso = mtime del marcador LAST_USED_FILE, se toca al guardar y al abrir el ciclo)
+MAX_SESSION_BYTES = 2 * 1024 * 1024 * 1024
+LAST_USED_FILE = ".last_used"
+
+# Versión del formato de snapshot (se incrementa si cambia el esquema de df_final de forma incompatible)
+SESSION_SCHEMA_VERSION = 1
+
+# Clave de los metadatos de sesión en el footer Parquet
+SESSION_META_KEY = b"cobranzas.session"
+
+# Orden físico del snapshot y tamaño de row group: las estadísticas min/max de cada grupo
+# permiten saltar grupos completos al filtrar por empresa / cliente (ver query_session)
+SESSION_SORT_KEYS = ['EMPRESA', 'COD CLIENTE']
+SESSION_ROW_GROUP_ROWS = 65_536
+
+# Posición original de cada fila (df_final se devuelve siempre en su orden de proceso)
+ROW_ID_COLUMN = '_ROW_ID'
+
+# Log de tracking (append-only) por snapshot: session-<ts>.tracking.csv. Cada envío agrega las filas
+# actualizadas; al cargar se aplican sobre el snapshot (gana la última por documento y cliente).
+# Superadas TRACKING_COMPACT_ENTRIES líneas, el log se pliega en una nueva generación de snapshot.
+TRACKING_KEYS = ['MATCH_KEY', 'COD CLIENTE']
+TRACKING_VALUES = ['ESTADO_EMAIL', 'FECHA_ULTIMO_ENVIO']
+TRACKING_COMPACT_ENTRIES = 2000
+
+# Snapshots ya decodificados que se conservan en memoria (por proceso): cada rerun de Streamlit o
+# vista pantalla completa que reabre la misma generación (mismo archivo y mismo log) no relee el disco
+SESSION_CACHE_ENTRIES = 2
+
+# Formato anterior (un solo archivo + meta en texto): solo lectura, para no perder la sesión al actualizar
 SESSION_FILE = os.path.join(CACHE_DIR, "current_session.parquet")
 META_FILE = os.path.join(CACHE_DIR, "session_meta.txt")
 
 def ensure_cache_dir():
-    if not os.path.exists(CACHE_DIR):
-        os.makedirs(CACHE_DIR)
+    os.makedirs(_session_dir(), exist_ok=True)
+
+def _session_dir():
+    return os.path.join(CACHE_DIR, SESSION_SUBDIR)
+
+def new_cycle_id():
+    """ID único de ciclo de carga: <AAAAMMDD_HHMMSS>_<uuid corto>."""
+    return f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}"
+
+def _path_component(name, fallback):
+    """
+    Nombre de directorio para operador / ciclo. Vienen de texto libre (sidebar, ?operador=, ?ciclo=):
+    vacíos, '.', '..' o nombres que empiezan con punto usan el fallback.
+    """
+    cleaned = sanitize_filename(name, fallback) if isinstance(name, str) else fallback
+    return fallback if cleaned.startswith('.') else cleaned
+
+def _inside_sessions(path):
+    """Verifica que path quede dentro de sessions/ (nunca el directorio raíz ni fuera de él)."""
+    root = os.path.realpath(_session_dir())
+    resolved = os.path.realpath(path)
+    if resolved == root or os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"Ruta de sesión fuera de {root}: {path}")
+    return path
+
+def _operator_dir(operator=None):
+    return _inside_sessions(os.path.join(_session_dir(), _path_component(operator, DEFAULT_OPERATOR)))
+
+def _cycle_dir(cycle_id, operator=None):
+    return _inside_sessions(os.path.join(_operator_dir(operator), _path_component(cycle_id, DEFAULT_CYCLE)))
+
+def _migrate_flat_layout():
+    """Snapshots del formato sin ciclos (directo en sessions/) -> ciclo por defecto del operador por defecto."""
+    flat = glob.glob(os.path.join(glob.escape(_session_dir()), "session-*"))
+    if not flat:
+        return
+    target = _cycle_dir(DEFAULT_CYCLE)
+    os.makedirs(target, exist_ok=True)
+    for path in flat:
+        try:
+            os.replace(path, os.path.join(target, os.path.basename(path)))
+        except OSError:
+            pass
+
+def _last_used(cycle_dir):
+    try:
+        return os.path.getmtime(os.path.join(cycle_dir, LAST_USED_FILE))
+    except OSError:
+        return 0.0
+
+def _touch_cycle(cycle_dir):
+    marker = os.path.join(cycle_dir, LAST_USED_FILE)
+    try:
+        with open(marker, 'a'):
+            pass
+        os.utime(marker)
+    except OSError:
+        pass
+
+def _cycle_dirs(operator=None):
+    """Directorios de ciclo (todos los operadores si operator es None), del usado más recientemente al más antiguo."""
+    _migrate_flat_layout()
+    pattern = glob.escape(_operator_dir(operator)) if operator is not None else os.path.join(glob.escape(_session_dir()), "*")
+    dirs = [d for d in glob.glob(os.path.join(pattern, "*")) if os.path.isdir(d)]
+    return sorted(dirs, key=_last_used, reverse=True)
+
+def _resolve_cycle_dir(cycle_id=None, operator=None):
+    """Ciclo pedido, o el último usado por el operador (None si no tiene ninguno)."""
+    if cycle_id is not None:
+        return _cycle_dir(cycle_id, operator)
+    dirs = _cycle_dirs(operator or DEFAULT_OPERATOR)
+    return dirs[0] if dirs else None
+
+def current_cycle(operator=None):
+    """cycle_id del ciclo usado más recientemente por el operador (None si no hay)."""
+    cycle_dir = _resolve_cycle_dir(operator=operator)
+    return os.path.basename(cycle_dir) if cycle_dir else None
+
+def _snapshot_paths(cycle_id=None, operator=None):
+    """Snapshots del ciclo, del más reciente al más antiguo (el nombre lleva el timestamp)."""
+    cycle_dir = _resolve_cycle_dir(cycle_id, operator)
+    if cycle_dir is None:
+        return []
+    return sorted(glob.glob(os.path.join(glob.escape(cycle_dir), "session-*.parquet")), reverse=True)
+
+def _read_session_meta(path):
+    """Metadatos de sesión del footer Parquet (sin leer los datos; memoizado por archivo, mtime y tamaño)."""
+    stat = os.stat(path)
+    return dict(_read_session_meta_cached(path, stat.st_mtime_ns, stat.st_size))
+
+@lru_cache(maxsize=32)
+def _read_session_meta_cached(path, mtime_ns, size):
+    schema_meta = pq.read_schema(path, memory_map=True).metadata or {}
+    meta = json.loads(schema_meta[SESSION_META_KEY])
+    if meta.get('schema_version') != SESSION_SCHEMA_VERSION:
+        raise ValueError(f"Versión de snapshot no soportada: {meta.get('schema_version')}")
+    return meta
+
+def _tracking_log_path(snapshot_path):
+    return snapshot_path[:-len(".parquet")] + ".tracking.csv"
+
+def _prune_generations(cycle_id=None, operator=None, keep=None):
+    keep = SESSION_GENERATIONS if keep is None else keep
+    for path in _snapshot_paths(cycle_id, operator)[max(keep, 1):]:
+        for old in (path, _tracking_log_path(path)):
+            try:
+                if os.path.exists(old):
+                    os.remove(old)
+            except OSError:
+                pass  # En uso (Windows): se elimina en el próximo guardado
+
+def _dir_size(path):
+    total = 0
+    for entry in os.scandir(path):
+        try:
+            total += entry.stat().st_size if entry.is_file() else 0
+        except OSError:
+            pass
+    return total
+
+def evict_cycles(max_bytes=None, keep=None):
+    """
+    Elimina los ciclos usados hace más tiempo (de cualquier operador) hasta respetar max_bytes
+    (por defecto MAX_SESSION_BYTES). keep: directorio de ciclo que no se expulsa (el recién guardado).
+    Returns: bytes ocupados al terminar.
+    """
+    max_bytes = MAX_SESSION_BYTES if max_bytes is None else max_bytes
+    cycles = [(d, _dir_size(d)) for d in reversed(_cycle_dirs())]
+    total = sum(size for _, size in cycles)
+    for cycle_dir, size in cycles:
+        if total <= max_bytes:
+            break
+        if keep and os.path.abspath(cycle_dir) == os.path.abspath(keep):
+            continue
+        try:
+            shutil.rmtree(cycle_dir)
+            total -= size
+        except OSError:
+            pass  # En uso (Windows): se reintenta en el próximo guardado
+    return total
 
-def save_session(df, metadata_str=""):
+def save_session(df, metadata_str="", saved_at=None, cycle_id=None, operator=None):
     """
     Saves the main DataFrame and metadata to a local cache.
+    Escritura atómica (archivo temporal + rename): un corte a mitad de guardado no daña
+    el snapshot anterior. Los metadatos (versión, fecha, texto, ciclo) van en el footer Parquet.
+    saved_at: inicio de la sesión a registrar (la compactación conserva el original).
+    cycle_id / operator: ciclo y operador dueños de la sesión (por defecto, DEFAULT_CYCLE / DEFAULT_OPERATOR).
     """
     try:
-        ensure_cache_dir()
-        # Use parquet for speed and efficient type preservation
-        df.to_parquet(SESSION_FILE, index=False)
-        
-        with open(META_FILE, 'w', encoding='utf-8') as f:
-            f.write(f"{datetime.datetime.now().isoformat()}|{metadata_str}")
-            
+        cycle_dir = _cycle_dir(cycle_id, operator)
+        os.makedirs(cycle_dir, exist_ok=True)
+        written_at = datetime.datetime.now()
+        saved_at = saved_at or written_at
+        sort_keys = [c for c in SESSION_SORT_KEYS if c in df.columns]
+        df_sorted = df.assign(**{ROW_ID_COLUMN: range(len(df))})
+        if sort_keys:
+            df_sorted = df_sorted.sort_values(sort_keys, kind='stable')
+        table = pa.Table.from_pandas(df_sorted, preserve_index=False)
+        session_meta = {
+            'schema_version': SESSION_SCHEMA_VERSION,
+            'saved_at': saved_at.isoformat(),
+            'meta': metadata_str,
+            'rows': len(df),
+            'cycle_id': os.path.basename(cycle_dir),
+            'operator': os.path.basename(os.path.dirname(cycle_dir)),
+        }
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            SESSION_META_KEY: json.dumps(session_meta).encode('utf-8'),
+        })
+
+        path = os.path.join(cycle_dir, f"session-{written_at.strftime('%Y%m%dT%H%M%S%f')}.parquet")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            # Use parquet for speed and efficient type preservation
+            pq.write_table(table, tmp_path, row_group_size=SESSION_ROW_GROUP_ROWS)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        _touch_cycle(cycle_dir)
+        _prune_generations(cycle_id, operator)
+        evict_cycles(keep=cycle_dir)
         return True, "Sesión guardada exitosamente."
     except Exception as e:
         return False, f"Error guardando sesión: {str(e)}"
 
-def load_session():
+def _filter_expression(filters):
+    """{columna: valor o lista de valores} -> expresión Arrow (AND entre columnas, IN dentro de cada una)."""
+    expression = None
+    for col, values in (filters or {}).items():
+        values = list(values) if isinstance(values, (list, tuple, set)) else [values]
+        condition = pc.field(col).isin(values)
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def _read_snapshot(path, columns=None, filters=None):
     """
-    Loads the DataFrame and metadata from cache.
-    Returns: (df, metadata_str, load_time) or (None, None, None)
+    Lee un snapshot con memory map, solo las columnas pedidas y solo los row groups cuyas
+    estadísticas pueden cumplir el filtro. El texto se mantiene en buffers Arrow (sin crear
+    objetos str de Python), que es lo que domina el tiempo de restauración.
     """
+    read_columns = None
+    if columns is not None:
+        available = pq.read_schema(path, memory_map=True).names
+        read_columns = [c for c in columns if c in available]
+        if ROW_ID_COLUMN in available:
+            read_columns.append(ROW_ID_COLUMN)
+    table = pq.read_table(path, columns=read_columns, filters=_filter_expression(filters), memory_map=True)
+    if ROW_ID_COLUMN in table.column_names:
+        table = table.take(pc.sort_indices(table[ROW_ID_COLUMN])).drop_columns([ROW_ID_COLUMN])
+    text_types = {pa.string(): TEXT_DTYPE, pa.large_string(): TEXT_DTYPE}
+    return table.to_pandas(types_mapper=text_types.get)
+
+def _filter_frame(df, columns=None, filters=None):
+    """Proyección y filtro en memoria (sesiones en formato anterior, sin row groups ordenados)."""
+    for col, values in (filters or {}).items():
+        values = list(values) if isinstance(values, (list, tuple, set)) else [values]
+        df = df[df[col].isin(values)]
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df.reset_index(drop=True)
+
+def _load_legacy_session():
     if not os.path.exists(SESSION_FILE) or not os.path.exists(META_FILE):
         return None, None, None
-        
+    df = pd.read_parquet(SESSION_FILE)
+    with open(META_FILE, 'r', encoding='utf-8') as f:
+        content = f.read().split('|')
+        timestamp_str = content[0]
+        meta = content[1] if len(content) > 1 else ""
+    return apply_output_schema(df), meta, datetime.datetime.fromisoformat(timestamp_str)
+
+def _read_tracking_log(snapshot_path):
+    """Entradas del log de tracking del snapshot (una línea incompleta por un corte se descarta)."""
+    columns = TRACKING_KEYS + TRACKING_VALUES
+    log_path = _tracking_log_path(snapshot_path)
+    if not os.path.exists(log_path):
+        return pd.DataFrame(columns=columns)
+    with open(log_path, 'r', encoding='utf-8', newline='') as f:
+        rows = [row for row in csv.reader(f) if len(row) == len(columns)]
+    return pd.DataFrame(rows[1:] if rows and rows[0] == columns else rows, columns=columns)
+
+def _apply_tracking(df, entries):
+    """Aplica el log sobre df: por (MATCH_KEY, COD CLIENTE) gana la última entrada."""
+    if entries.empty or not set(TRACKING_KEYS) <= set(df.columns):
+        return df
+    latest = entries.drop_duplicates(TRACKING_KEYS, keep='last').set_index(TRACKING_KEYS)
+    positions = latest.index.get_indexer(pd.MultiIndex.from_frame(df[TRACKING_KEYS].astype(object)))
+    hit = positions >= 0
+    if not hit.any():
+        return df
+    df = df.copy()
+    for col in TRACKING_VALUES:
+        if col in df.columns:
+            values = latest[col].to_numpy()[positions[hit]]
+            df[col] = df[col].astype(object)
+            df.loc[hit, col] = [v if v != "" else None for v in values]
+    return apply_output_schema(df)
+
+def append_tracking(updates, cycle_id=None, operator=None):
+    """
+    Agrega al log del snapshot vigente del ciclo las filas de tracking actualizadas tras un envío
+    (sin reescribir el snapshot). updates: DataFrame o lista de dicts con MATCH_KEY, COD CLIENTE,
+    ESTADO_EMAIL y FECHA_ULTIMO_ENVIO. Returns: cantidad de entradas escritas.
+    """
+    updates = pd.DataFrame(updates, columns=TRACKING_KEYS + TRACKING_VALUES)
+    snapshots = _snapshot_paths(cycle_id, operator)
+    if updates.empty or not snapshots:
+        return 0
+    log_path = _tracking_log_path(snapshots[0])
+    is_new = not os.path.exists(log_path)
+
+    rows = updates.astype(object).where(updates.notna(), "").astype(str).values.tolist()
+    with open(log_path, 'a', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        if is_new:
+            writer.writerow(TRACKING_KEYS + TRACKING_VALUES)
+        writer.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+
+    with open(log_path, 'r', encoding='utf-8') as f:
+        if sum(1 for _ in f) - 1 > TRACKING_COMPACT_ENTRIES:
+            compact_session(cycle_id=os.path.basename(os.path.dirname(log_path)), operator=operator)
+    return len(rows)
+
+def compact_session(cycle_id=None, operator=None):
+    """Pliega el log de tracking del ciclo en una nueva generación de snapshot (con log vacío)."""
+    snapshots = _snapshot_paths(cycle_id, operator)
+    if not snapshots or not os.path.exists(_tracking_log_path(snapshots[0])):
+        return False
+    cycle_id = os.path.basename(os.path.dirname(snapshots[0]))
+    df, meta, saved_at = query_session(cycle_id=cycle_id, operator=operator)
+    if df is None:
+        return False
+    ok, _ = save_session(df, meta, saved_at=saved_at, cycle_id=cycle_id, operator=operator)
+    return ok
+
+def _snapshot_token(path):
+    """Identidad de una generación: snapshot + estado de su log de tracking (cambia con cada envío)."""
+    stat = os.stat(path)
     try:
-        df = pd.read_parquet(SESSION_FILE)
-        
-        with open(META_FILE, 'r', encoding='utf-8') as f:
-            content = f.read().split('|')
-            timestamp_str = content[0]
-            meta = content[1] if len(content) > 1 else ""
-            
-        load_time = datetime.datetime.fromisoformat(timestamp_str)
+        log_stat = os.stat(_tracking_log_path(path))
+        log_token = (log_stat.st_mtime_ns, log_stat.st_size)
+    except OSError:
+        log_token = None
+    return (path, stat.st_mtime_ns, stat.st_size, log_token)
+
+def _filters_key(filters):
+    return tuple(
+        (col, tuple(values) if isinstance(values, (list, tuple, set)) else (values,))
+        for col, values in (filters or {}).items()
+    )
+
+@lru_cache(maxsize=SESSION_CACHE_ENTRIES)
+def _load_snapshot_cached(token, columns, filters):
+    path = token[0]
+    session_meta = _read_session_meta(path)
+    entries = _read_tracking_log(path)
+    read_columns = columns
+    if columns is not None and not entries.empty:
+        read_columns = list(columns) + [c for c in TRACKING_KEYS if c not in columns]
+    # Parquet no conserva todos los dtypes (categorías fijas, fechas): se reaplica el esquema
+    df = apply_output_schema(_read_snapshot(path, read_columns, dict(filters)))
+    df = _apply_tracking(df, entries)
+    if read_columns is not columns:
+        df = df[[c for c in columns if c in df.columns]]
+    return df, session_meta['meta'], datetime.datetime.fromisoformat(session_meta['saved_at'])
+
+def query_session(columns=None, filters=None, generation=0, cycle_id=None, operator=None):
+    """
+    Lee solo parte de la sesión guardada (vistas que no necesitan df_final completo).
+    columns: columnas a leer (None = todas).
+    filters: {columna: valor o lista}, p. ej. {'EMPRESA': ['ACME SAC']}; los row groups que no
+             pueden contener esos valores no se leen.
+    generation / cycle_id / operator / retorno: como load_session. Las filas conservan el orden
+    original de df_final.
+    """
+    snapshots = _snapshot_paths(cycle_id, operator)
+    if snapshots:
+        _touch_cycle(os.path.dirname(snapshots[0]))
+    for path in snapshots[generation:]:
+        try:
+            columns_key = tuple(columns) if columns is not None else None
+            df, meta, saved_at = _load_snapshot_cached(_snapshot_token(path), columns_key, _filters_key(filters))
+            # Copia propia para el llamador (la app modifica df_final en el lugar tras cada envío)
+            return df.copy(), meta, saved_at
+        except Exception as e:
+            print(f"Cache load error ({os.path.basename(path)}): {e}")
+
+    if cycle_id is not None:
+        return None, None, None
+    try:
+        df, meta, load_time = _load_legacy_session()
+        if df is not None:
+            df = _filter_frame(df, columns, filters)
         return df, meta, load_time
     except Exception as e:
         print(f"Cache load error: {e}")
         return None, None, None
 
-def clear_session():
+def load_session(generation=0, cycle_id=None, operator=None):
+    """
+    Loads the DataFrame and metadata from cache.
+    generation: 0 = último snapshot, 1 = el anterior, ... Si un snapshot está dañado
+    se usa el siguiente más antiguo.
+    cycle_id: ciclo a abrir (None = el último usado por el operador; sin ciclos, el formato anterior).
+    Returns: (df, metadata_str, load_time) or (None, None, None)
+    """
+    return query_session(generation=generation, cycle_id=cycle_id, operator=operator)
+
+def list_sessions(cycle_id=None, operator=None):
+    """Snapshots del ciclo (más reciente primero): [{'path', 'saved_at', 'meta', 'rows'}]"""
+    sessions = []
+    for path in _snapshot_paths(cycle_id, operator):
+        try:
+            session_meta = _read_session_meta(path)
+        except Exception:
+            continue
+        sessions.append({
+            'path': path,
+            'saved_at': datetime.datetime.fromisoformat(session_meta['saved_at']),
+            'meta': session_meta['meta'],
+            'rows': session_meta['rows'],
+        })
+    return sessions
+
+def list_cycles(operator=None):
+    """
+    Índice de ciclos guardados (usado más recientemente primero), sin leer los datos: solo el
+    footer del último snapshot válido de cada ciclo. operator=None lista todos los operadores.
+    Returns: [{'cycle_id', 'operator', 'saved_at', 'meta', 'rows', 'bytes', 'last_used'}]
+    """
+    cycles = []
+    for cycle_dir in _cycle_dirs(operator):
+        for path in sorted(glob.glob(os.path.join(glob.escape(cycle_dir), "session-*.parquet")), reverse=True):
+            try:
+                session_meta = _read_session_meta(path)
+            except Exception:
+                continue
+            cycles.append({
+                'cycle_id': os.path.basename(cycle_dir),
+                'operator': os.path.basename(os.path.dirname(cycle_dir)),
+                'saved_at': datetime.datetime.fromisoformat(session_meta['saved_at']),
+                'meta': session_meta['meta'],
+                'rows': session_meta['rows'],
+                'bytes': _dir_size(cycle_dir),
+                'last_used': datetime.datetime.fromtimestamp(_last_used(cycle_dir)),
+            })
+            break
+    return cycles
+
+def clear_session(cycle_id=None, operator=None):
     """
     Clears the cache files.
+    Con cycle_id / operator se elimina solo ese ciclo / los ciclos de ese operador.
     """
+    _load_snapshot_cached.cache_clear()
     try:
+        if cycle_id is not None or operator is not None:
+            target = _cycle_dir(cycle_id, operator) if cycle_id is not None else _operator_dir(operator)
+            if os.path.isdir(target):
+                shutil.rmtree(target)
+            return True
+        if os.path.isdir(_session_dir()):
+            shutil.rmtree(_session_dir())
         if os.path.exists(SESSION_FILE):
             os.remove(SESSION_FILE)
         if os.path.exists(META_FILE):
@@ -63,17 +497,25 @@ def clear_session():
     except:
         return False
 
-def has_valid_session():
+def has_valid_session(cycle_id=None, operator=None):
     """
-    Checks if a valid session exists without loading the full data.
+    Checks if a valid session exists without loading the full data (solo lee el footer
+    del snapshot más reciente que sea válido del ciclo; por defecto, el último usado por el operador).
     """
-    if os.path.exists(SESSION_FILE) and os.path.exists(META_FILE):
+    for path in _snapshot_paths(cycle_id, operator):
+        try:
+            session_meta = _read_session_meta(path)
+        except Exception:
+            continue
+        return True, datetime.datetime.fromisoformat(session_meta['saved_at']), session_meta['meta']
+
+    if cycle_id is None and os.path.exists(SESSION_FILE) and os.path.exists(META_FILE):
         try:
             with open(META_FILE, 'r', encoding='utf-8') as f:
                 content = f.read().split('|')
                 timestamp_str = content[0]
                 meta = content[1] if len(content) > 1 else ""
-            
+
             dt = datetime.datetime.fromisoformat(timestamp_str)
             return True, dt, meta
         except:
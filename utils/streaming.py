@@ -0,0 +1,92 @@
+"""
+Modo Streaming del Pipeline de Cobranzas (cierre anual / cartera completa)
+CtasxCobrar se procesa en bloques particionados por cliente: cada bloque se cruza contra
+la dimensión Cartera y los agregados de Cobranza (pequeños, en memoria) y se escribe
+de inmediato como un archivo del dataset Parquet de salida.
+El pico de memoria queda acotado por el tamaño de bloque y no por el total de documentos.
+"""
+
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+import utils.processing as proc
+
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def iter_client_chunks(df_ctas, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Parte CtasxCobrar normalizado en bloques de ~chunk_size filas sin separar los documentos
+    de un mismo cliente (un bloque puede exceder chunk_size si un cliente queda en el borde).
+    """
+    if df_ctas.empty:
+        return
+    order = np.argsort(df_ctas['codcli_key'].to_numpy(dtype=object), kind='stable')
+    df_sorted = df_ctas.iloc[order]
+    keys = df_sorted['codcli_key'].to_numpy(dtype=object)
+
+    start, n = 0, len(df_sorted)
+    while start < n:
+        end = min(start + chunk_size, n)
+        if end < n:
+            # Extender hasta el último documento del cliente en el borde
+            end = int(np.searchsorted(keys, keys[end - 1], side='right'))
+        yield df_sorted.iloc[start:end]
+        start = end
+
+
+def _reset_dataset(output_dir):
+    """Crea el directorio del dataset y elimina archivos de una corrida anterior."""
+    os.makedirs(output_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(output_dir, "part-*.parquet")):
+        os.remove(path)
+
+
+def process_data_streaming(ctas_chunks, df_cartera, df_cobranza, output_dir,
+                           chunk_size=DEFAULT_CHUNK_SIZE, fecha_corte=None):
+    """
+    Versión streaming de process_data: escribe df_final como dataset Parquet en output_dir.
+
+    Args:
+        ctas_chunks: DataFrame de CtasxCobrar o iterable de bloques crudos
+                     (p. ej. proc.iter_input_chunks sobre un CSV/Parquet), con índice único de fila.
+        df_cartera, df_cobranza: archivos crudos (se reducen a dimensión / agregados por MATCH_KEY).
+        chunk_size: filas aproximadas por bloque (respetando el corte por cliente).
+
+    Returns:
+        dict {'path', 'parts', 'rows'}
+    """
+    df_cartera_dim = proc.build_cartera_dimension(df_cartera)
+    lookups = proc.build_cobranza_lookups(df_cobranza)
+    if isinstance(ctas_chunks, pd.DataFrame):
+        ctas_chunks = [ctas_chunks]
+
+    _reset_dataset(output_dir)
+    parts, rows = 0, 0
+    for raw_chunk in ctas_chunks:
+        df_ctas = proc.normalize_ctas(raw_chunk.copy())
+        for df_chunk in iter_client_chunks(df_ctas, chunk_size):
+            df_part = proc.process_partition(df_chunk, df_cartera_dim, lookups, fecha_corte)
+            df_part.to_parquet(os.path.join(output_dir, f"part-{parts:05d}.parquet"))
+            parts += 1
+            rows += len(df_part)
+            del df_part
+
+    return {'path': output_dir, 'parts': parts, 'rows': rows}
+
+
+def load_streaming_result(output_dir, columns=None):
+    """
+    Lee el dataset generado por process_data_streaming como un único df_final,
+    en el orden original de CtasxCobrar y con el esquema tipado aplicado.
+    """
+    files = sorted(glob.glob(os.path.join(output_dir, "part-*.parquet")))
+    if not files:
+        return pd.DataFrame(columns=columns or list(proc.OUTPUT_SCHEMA))
+    # Se lee archivo por archivo: las categorías de cada bloque difieren y el esquema se unifica al final
+    df_final = pd.concat([pd.read_parquet(f, columns=columns) for f in files])
+    df_final = df_final.sort_index(kind='stable').reset_index(drop=True)
+    return proc.apply_output_schema(df_final)
@@ -1,6 +1,9 @@
 import streamlit as st
 import pandas as pd
+import html
+import urllib.parse
 import utils.ui.styles as styles
+from utils.processing import format_display_columns
 
 # --- COLUMN DEFINITIONS ---
 # Vista Ejecutiva: Simple, operativa, "1 vistazo" (NO muestra tracking)
@@ -58,12 +61,22 @@ def highlight_status(val):
         color = f'background-color: #F8D7DA; color: {styles.COLORS["danger"]}; font-weight: 500'
     return color
 
-def render_report(df_filtered):
+def fullscreen_link(empresas=None, cycle_id=None, operator=None):
+    """
+    URL de la vista pantalla completa; las empresas filtradas viajan como ?empresa=... (se leen de disco
+    solo esas). Ciclo y operador viajan como ?ciclo=...&operador=... (la vista abre esa misma sesión).
+    """
+    params = [("view", "full_table")] + [("empresa", e) for e in (empresas or [])]
+    params += [(k, v) for k, v in (("ciclo", cycle_id), ("operador", operator)) if v]
+    return "?" + urllib.parse.urlencode(params)
+
+def render_report(df_filtered, empresas=None):
     """
     Renders the Main Report Table with Simplified Enterprise UX.
     - View Toggle (Executive vs Complete)
     - Executive view: NO tracking columns (clean business view)
     - Complete view: ALL columns including 2 tracking columns
+    empresas: filtro de empresa activo (se conserva al abrir la pantalla completa)
     """
     
     # --- 1. VIEW CONTROLS ---
@@ -83,26 +96,15 @@ def render_report(df_filtered):
         cols_to_show = parse_full_columns(df_filtered.columns)
 
     # --- 3. PREPARE DISPLAY DATA ---
-    df_display = df_filtered[cols_to_show].copy()
-
-    # Swap _DISPLAY columns for clean names
-    for c in cols_to_show:
-        if c == 'SALDO REAL' and 'SALDO REAL_DISPLAY' in df_filtered.columns:
-             df_display['SALDO REAL'] = df_filtered['SALDO REAL_DISPLAY']
-        elif c == 'SALDO' and 'SALDO_DISPLAY' in df_filtered.columns:
-             df_display['SALDO'] = df_filtered['SALDO_DISPLAY']
-        elif c == 'MONT EMIT' and 'MONT EMIT_DISPLAY' in df_filtered.columns:
-             df_display['MONT EMIT'] = df_filtered['MONT EMIT_DISPLAY']
-        elif c == 'DETRACCIÓN' and 'DETRACCIÓN_DISPLAY' in df_filtered.columns:
-             df_display['DETRACCIÓN'] = df_filtered['DETRACCIÓN_DISPLAY']
+    df_display = prepare_display_frame(df_filtered, cols_to_show)
 
     # --- 4. FULLSCREEN BUTTON (Solo en Vista Completa) ---
     if view_mode == "Completa":
         # Link para abrir en la MISMA pestaña (preserva session_state)
         # FIX: target="_self" en lugar de "_blank" para mantener sesión
-        st.markdown("""
+        st.markdown(f"""
         <div style="text-align: right; margin-bottom: 10px;">
-            <a href="?view=full_table" target="_self" style="
+            <a href="{html.escape(fullscreen_link(empresas, st.session_state.get('cycle_id'), st.session_state.get('operator')))}" target="_self" style="
                 display: inline-block;
                 padding: 8px 16px;
                 background-color: #2E86AB;
@@ -140,6 +142,15 @@ def render_report(df_filtered):
              pass
 
 
+def prepare_display_frame(df_filtered, cols_to_show):
+    """
+    Construye la tabla a renderizar: solo las columnas visibles, con montos formateados
+    ("S/ 1,234.50") generados en este momento para las filas mostradas.
+    """
+    # MONEDA define el símbolo aunque no sea una columna visible (ej. Vista Ejecutiva)
+    cols_needed = cols_to_show + (['MONEDA'] if 'MONEDA' in df_filtered.columns and 'MONEDA' not in cols_to_show else [])
+    return format_display_columns(df_filtered[cols_needed])[cols_to_show]
+
 def parse_full_columns(all_cols):
     """Helper to order columns nicely in Full View."""
     priority = [
@@ -166,18 +177,7 @@ def render_report_fullscreen(df_filtered):
     cols_to_show = parse_full_columns(df_filtered.columns)
     
     # Preparar datos para display
-    df_display = df_filtered[cols_to_show].copy()
-    
-    # Swap _DISPLAY columns for clean names
-    for c in cols_to_show:
-        if c == 'SALDO REAL' and 'SALDO REAL_DISPLAY' in df_filtered.columns:
-             df_display['SALDO REAL'] = df_filtered['SALDO REAL_DISPLAY']
-        elif c == 'SALDO' and 'SALDO_DISPLAY' in df_filtered.columns:
-             df_display['SALDO'] = df_filtered['SALDO_DISPLAY']
-        elif c == 'MONT EMIT' and 'MONT EMIT_DISPLAY' in df_filtered.columns:
-             df_display['MONT EMIT'] = df_filtered['MONT EMIT_DISPLAY']
-        elif c == 'DETRACCIÓN' and 'DETRACCIÓN_DISPLAY' in df_filtered.columns:
-             df_display['DETRACCIÓN'] = df_filtered['DETRACCIÓN_DISPLAY']
+    df_display = prepare_display_frame(df_filtered, cols_to_show)
     
     # Aplicar estilos
     styler = df_display.style.map(highlight_status, subset=['ESTADO DEUDA']) if 'ESTADO DEUDA' in df_display.columns else df_display.style
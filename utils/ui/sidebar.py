@@ -1,6 +1,20 @@
 import streamlit as st
 from datetime import datetime, date
 
+from utils.processing import preflight_check
+
+def _preflight(uploaded_files):
+    """Problemas de la validación previa, recalculados solo cuando cambian los archivos subidos."""
+    signature = tuple(
+        (kind, getattr(f, 'file_id', None) or getattr(f, 'name', None), getattr(f, 'size', None))
+        for kind, f in uploaded_files.items()
+    )
+    cached = st.session_state.get('preflight_result')
+    if not cached or cached[0] != signature:
+        cached = (signature, preflight_check(uploaded_files))
+        st.session_state['preflight_result'] = cached
+    return cached[1]
+
 def render_sidebar():
     """Renders the Enterprise Sidebar with Wizard Flow and No Sorpresas confirmation."""
     with st.sidebar:
@@ -69,26 +83,32 @@ def render_sidebar():
             
             # Step 1: Upload
             with st.expander("📂 1. Carga de Archivos", expanded=True):
-                st.info("Sube los 3 reportes base para iniciar.")
+                st.info("Sube los 3 reportes base para iniciar (xlsx, CSV o Parquet).")
                 
                 # Init Files
                 if 'uploaded_files' not in st.session_state:
                     st.session_state['uploaded_files'] = {'ctas': None, 'cobranza': None, 'cartera': None}
 
-                f_ctas = st.file_uploader("CtasxCobrar", type=["xlsx"], key="u_ctas")
+                f_ctas = st.file_uploader("CtasxCobrar", type=["xlsx", "csv", "parquet"], key="u_ctas")
                 if f_ctas: st.session_state['uploaded_files']['ctas'] = f_ctas
                 
-                f_cob = st.file_uploader("Cobranza", type=["xlsx"], key="u_cob")
+                f_cob = st.file_uploader("Cobranza", type=["xlsx", "csv", "parquet"], key="u_cob")
                 if f_cob: st.session_state['uploaded_files']['cobranza'] = f_cob
 
-                f_cart = st.file_uploader("Cartera", type=["xlsx"], key="u_cart")
+                f_cart = st.file_uploader("Cartera", type=["xlsx", "csv", "parquet"], key="u_cart")
                 if f_cart: st.session_state['uploaded_files']['cartera'] = f_cart
                 
                 # Check Status
                 files_ok = all(st.session_state['uploaded_files'].values())
                 if files_ok:
-                    st.success("✅ Archivos listos")
-                    step_1_done = True
+                    # Validación previa (encabezado + muestra): todos los problemas antes de la carga completa
+                    problems = _preflight(st.session_state['uploaded_files'])
+                    if problems:
+                        for problem in problems:
+                            st.error(f"❌ {problem}")
+                    else:
+                        st.success("✅ Archivos listos")
+                        step_1_done = True
             
             # Step 2: Parametros (Solo si step 1 ok)
             if step_1_done:
@@ -71,6 +71,16 @@ def normalize_phone(phone):
 
     return phone
 
+def normalize_phone_series(phones):
+    """
+    Versión por lote de normalize_phone: normaliza cada teléfono único una sola vez.
+    Acepta una lista o Serie y devuelve una lista en el mismo orden.
+    """
+    import pandas as pd
+    from utils.processing import map_unique_values
+
+    return map_unique_values(pd.Series(list(phones), dtype=object), normalize_phone).tolist()
+
 def replace_variables(message, client_data):
     """
     Reemplaza todas las variables en el mensaje con datos del cliente.
@@ -567,10 +577,13 @@ def send_whatsapp_messages_direct(
     processed_contacts = []
     temp_files_to_cleanup = []  # Track de archivos temporales para limpieza
     
-    for contact in contacts:
+    # Normalizar teléfonos en lote (un cálculo por número único)
+    normalized_phones = normalize_phone_series(c.get('telefono', '') for c in contacts)
+
+    for contact, telefono in zip(contacts, normalized_phones):
         # Aseguramos que 'nombre' exista para el log, aunque sea duplicado de 'nombre_cliente'
         contact_copy = contact.copy()
-        contact_copy['telefono'] = normalize_phone(contact.get('telefono', ''))
+        contact_copy['telefono'] = telefono
         # Reemplazamos variables AQUI para que el mensaje final ya esté listo
         contact_copy['mensaje'] = replace_variables(message, contact_copy)
         if 'nombre' not in contact_copy: